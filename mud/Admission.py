@@ -0,0 +1,184 @@
+import collections
+import json
+import threading
+import time
+
+"""
+Admission control for new connections, shared by Server and AsyncServer. Thread-safe.
+
+* Connections are accepted at a limited rate (a token bucket), so a reconnect storm is spread out instead of creating
+  every client at once.
+* Each IP address can only have so many connections, counting those waiting.
+* Once the server is full, new connections wait in a queue, and are told their position whenever it changes. They get in
+  as others leave. Connections are refused when the queue is full too.
+
+Waiting connections don't have a client yet, so they are told their position (and refused connections the reason) in
+plain JSON messages, see make_message.
+
+Attributes:
+    num_connections: Number of connections admitted and not yet released
+    connections_by_ip: Number of connections admitted or waiting for each IP address
+    waiting: The waiting connections, first in line first, as (IP, on_admitted, on_position) tuples
+    num_admitted: Number of connections admitted in total
+    num_waited: Number of connections that had to wait
+    num_refused: Number of connections refused
+"""
+
+
+class AdmissionControl:
+    # Results of admit
+    ADMITTED = 0
+    WAITING = 1
+    REFUSED = 2
+
+    def __init__(self, max_connections, max_connections_per_ip, accept_rate, accept_burst, max_waiting):
+        self.max_connections = max_connections
+        self.max_connections_per_ip = max_connections_per_ip
+        self.accept_rate = accept_rate
+        self.accept_burst = accept_burst
+        self.max_waiting = max_waiting
+
+        self.lock = threading.Lock()
+        self.num_connections = 0
+        self.connections_by_ip = {}
+        self.waiting = collections.deque()
+
+        # Token bucket for the accept rate
+        self.tokens = float(accept_burst)
+        self.last_refill_time = time.perf_counter()
+
+        self.num_admitted = 0
+        self.num_waited = 0
+        self.num_refused = 0
+
+    """Takes a token for accepting a connection
+
+    Returns: How long to wait, in seconds, before the connection may be accepted. 0 if it can be accepted right away"""
+    def take_token(self):
+        with self.lock:
+            now = time.perf_counter()
+            self.tokens = min(self.accept_burst, self.tokens + (now - self.last_refill_time) * self.accept_rate)
+            self.last_refill_time = now
+
+            # The token is taken either way, so connections arriving later wait behind this one
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0.0
+
+            return -self.tokens / self.accept_rate
+
+    """Decides whether a new connection can join the game
+
+    Attributes:
+        ip: The IP address of the connection
+        on_admitted: Function called when the connection is admitted, if it has to wait. Called from whichever thread
+                     releases a connection
+        on_position: Function called with the connection's place in the queue (1 is next) whenever it changes, without
+                     the lock held. Returns False if the connection has gone, to take it out of the queue
+    Returns: A (result, reason or queue position) tuple. The result is ADMITTED, WAITING or REFUSED"""
+    def admit(self, ip, on_admitted, on_position):
+        with self.lock:
+            if self.connections_by_ip.get(ip, 0) >= self.max_connections_per_ip:
+                self.num_refused += 1
+                return AdmissionControl.REFUSED, "Too many connections from your address."
+
+            if self.num_connections < self.max_connections:
+                self.add_connection(ip)
+                return AdmissionControl.ADMITTED, None
+
+            if len(self.waiting) >= self.max_waiting:
+                self.num_refused += 1
+                return AdmissionControl.REFUSED, "The server is full. Please try again later."
+
+            self.connections_by_ip[ip] = self.connections_by_ip.get(ip, 0) + 1
+            self.waiting.append((ip, on_admitted, on_position))
+            self.num_waited += 1
+
+            return AdmissionControl.WAITING, len(self.waiting)
+
+    """Frees a connection's place when it leaves, letting in the next waiting connection
+
+    Attributes:
+        ip: The IP address of the connection
+    """
+    def release(self, ip):
+        with self.lock:
+            self.num_connections -= 1
+            self.remove_ip(ip)
+
+            # Let the next waiting connections in
+            admitted = []
+            while len(self.waiting) > 0 and self.num_connections < self.max_connections:
+                waiting_ip, on_admitted, on_position = self.waiting.popleft()
+
+                # The IP was already counted while waiting
+                self.remove_ip(waiting_ip)
+                self.add_connection(waiting_ip)
+                admitted.append(on_admitted)
+
+            still_waiting = list(self.waiting)
+
+        for on_admitted in admitted:
+            on_admitted()
+
+        # Tell everyone still waiting their new place in the queue, dropping anyone who has left. Sending can take a
+        # while, so it's done outside the lock
+        for position, (waiting_ip, on_admitted, on_position) in enumerate(still_waiting, 1):
+            if on_position(position) is False:
+                self.cancel(waiting_ip, on_admitted)
+
+    """Takes a connection that has gone out of the queue
+
+    Attributes:
+        ip: The IP address of the connection
+        on_admitted: The on_admitted function the connection was queued with
+    Returns: Whether the connection was still waiting. If not, it has been admitted, and on_admitted has been or is
+             being called"""
+    def cancel(self, ip, on_admitted):
+        with self.lock:
+            for waiting in self.waiting:
+                if waiting[1] is on_admitted:
+                    self.waiting.remove(waiting)
+                    self.remove_ip(ip)
+                    return True
+
+            return False
+
+    """Counts an admitted connection. Call with the lock held"""
+    def add_connection(self, ip):
+        self.num_connections += 1
+        self.num_admitted += 1
+        self.connections_by_ip[ip] = self.connections_by_ip.get(ip, 0) + 1
+
+    """Removes a connection from an IP's count. Call with the lock held"""
+    def remove_ip(self, ip):
+        self.connections_by_ip[ip] -= 1
+
+        if self.connections_by_ip[ip] == 0:
+            del self.connections_by_ip[ip]
+
+    """Returns the admission statistics as a dictionary"""
+    def get_stats(self):
+        with self.lock:
+            return {
+                "connections": self.num_connections,
+                "waiting": len(self.waiting),
+                "addresses": len(self.connections_by_ip),
+                "admitted": self.num_admitted,
+                "waited": self.num_waited,
+                "refused": self.num_refused
+            }
+
+    """Returns a plain JSON message for a connection that isn't in the game yet
+
+    Attributes:
+        message_type: "waiting" with the queue position, or "refused" with the reason
+        value: The queue position or reason
+    Returns: The message as bytes, to be framed and sent unencrypted"""
+    @staticmethod
+    def make_message(message_type, value):
+        if message_type == "waiting":
+            return json.dumps({"type": "waiting", "position": value}).encode()
+        else:
+            return json.dumps({"type": "refused", "reason": value}).encode()
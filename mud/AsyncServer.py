@@ -0,0 +1,190 @@
+import asyncio
+import threading
+
+from Config import Config
+from Admission import AdmissionControl
+import Framing
+from Server import Server
+
+"""
+Asyncio variant of Server. One event loop, on one thread, owns the listening socket and every client stream, instead of
+each client running its own receive and send threads. Clients are fed through the same input_queue/output_queue as
+threaded clients, so the dungeon can't tell the difference.
+
+Attributes:
+    game: reference to the game; used to add players
+    game_port: the TCP port that the game will run on
+    loop: the event loop running the network
+    admission: decides which connections can join, and when
+"""
+
+
+class AsyncServer:
+    game = None
+
+    def __init__(self, game):
+        # Initialise vars
+        self.game = game
+        self.game_port = Config.game_port
+        self.loop = None
+        self.admission = Server.create_admission_control()
+        self.game.admission = self.admission
+
+        # Start the network thread
+        threading.Thread(name="network_loop_thread", target=lambda: self.loop_thread(), daemon=True).start()
+
+    """Thread running the event loop that accepts players and handles their networking"""
+    def loop_thread(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        # Setup server socket
+        try:
+            self.loop.run_until_complete(asyncio.start_server(self.handle_connection, Server.find_bind_ip(), self.game_port))
+        except OSError as err:
+            print("Could not create server socket. The server could be running already. Shutting down.")
+            return
+
+        # Inform the user of successful creation
+        print("Server creation successful! Waiting for players.")
+
+        self.loop.run_forever()
+
+    """Coroutine handling a player connection from start to end. Receives the client's packets until disconnection
+
+    Attributes:
+        reader: The asyncio stream reader for the connection
+        writer: The asyncio stream writer for the connection
+    """
+    async def handle_connection(self, reader, writer):
+        # Limit the accept rate
+        delay = self.admission.take_token()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        # Wait for a place in the game
+        ip = writer.get_extra_info("peername")[0]
+        admitted = asyncio.Event()
+
+        on_admitted = lambda: self.loop.call_soon_threadsafe(admitted.set)
+        result, value = self.admission.admit(ip, on_admitted, lambda position: self.send_position(writer, position))
+
+        if result == AdmissionControl.REFUSED:
+            print("Refused connection from %s: %s" % (ip, value))
+
+            AsyncServer.send_plain_message(writer, "refused", value)
+            writer.close()
+            return
+        elif result == AdmissionControl.WAITING:
+            print("Server full, connection from %s is waiting at position %d." % (ip, value))
+
+            AsyncServer.send_plain_message(writer, "waiting", value)
+
+            # Wait, watching the connection. It has nothing to send until it gets the security packet, so the end of
+            # the stream or any data means it has gone
+            left = self.loop.create_task(reader.read(1))
+            admitted_wait = self.loop.create_task(admitted.wait())
+            await asyncio.wait([left, admitted_wait], return_when=asyncio.FIRST_COMPLETED)
+
+            if not admitted.is_set() and self.admission.cancel(ip, on_admitted):
+                print("Waiting connection from %s left." % ip)
+
+                admitted_wait.cancel()
+                writer.close()
+                return
+
+            # Admitted, maybe just as it left. If it did, the client finds out and is removed as usual
+            await admitted_wait
+            left.cancel()
+            await asyncio.wait([left])
+
+        print("Got new connection! Adding client.")
+
+        # Create the client without networking threads, and have it wake our send loop when it has output
+        client = self.game.add_client(writer.get_extra_info("socket"), use_threads=False,
+                                      on_removed=lambda: self.admission.release(ip))
+        output_ready = asyncio.Event()
+        client.output_listener = lambda: self.loop.call_soon_threadsafe(output_ready.set)
+
+        sender = self.loop.create_task(self.send_loop(client, writer, output_ready))
+
+        # Receive messages until the client leaves
+        try:
+            while client.is_connected:
+                data_header = int.from_bytes(await reader.readexactly(2), "little")
+
+                if data_header == Framing.LONG_FRAME:
+                    data_header = int.from_bytes(await reader.readexactly(4), "little")
+
+                if data_header > Config.max_frame_size:
+                    print("Oversized message received -- removing client")
+                    break
+
+                packet = await reader.readexactly(data_header)
+
+                if not client.receive_packet(packet):
+                    print("Invalid packet received -- removing client")
+                    break
+        except asyncio.IncompleteReadError:
+            print("Partial message received -- removing client")
+        except ConnectionError:
+            print("Client error, removing client")
+
+        # Stop sending and close the connection
+        client.disconnect()
+        await sender
+
+        writer.close()
+
+    """Sends a plain JSON message (see AdmissionControl.make_message) to a connection that isn't in the game yet"""
+    @staticmethod
+    def send_plain_message(writer, message_type, value):
+        message = AdmissionControl.make_message(message_type, value)
+
+        writer.writelines([Framing.encode_header(len(message)), message])
+
+    """Tells a waiting connection its place in the queue. Called from whichever thread releases a connection
+
+    Returns: Whether the connection is still there"""
+    def send_position(self, writer, position):
+        if writer.is_closing():
+            return False
+
+        self.loop.call_soon_threadsafe(AsyncServer.send_plain_message, writer, "waiting", position)
+        return True
+
+    """Coroutine sending queued outputs to a client whenever they become available
+
+    Attributes:
+        client: The client to send outputs for
+        writer: The asyncio stream writer for the connection
+        output_ready: Event set whenever the client queues an output
+    """
+    async def send_loop(self, client, writer, output_ready):
+        # Send the encryption info and session/packet ID to the player client
+        initial_packet_packaged = client.make_security_packet()
+        writer.writelines([Framing.encode_header(len(initial_packet_packaged)), initial_packet_packaged])
+
+        try:
+            while client.is_connected:
+                # Send any existing player outputs
+                for output in client.output_queue.get_all(False):
+                    # A None output means the client has disconnected
+                    if output is None:
+                        return
+
+                    # The transport buffers whatever the socket doesn't take right away
+                    packet_packaged = client.pack_output(output)
+
+                    if packet_packaged is not None:
+                        writer.writelines([Framing.encode_header(len(packet_packaged)), packet_packaged])
+
+                await writer.drain()
+
+                # Sleep until there's more to send
+                await output_ready.wait()
+                output_ready.clear()
+        except ConnectionError:
+            print("Client error, removing client")
+            client.disconnect()
@@ -0,0 +1,121 @@
+import concurrent.futures
+import threading
+
+import bcrypt
+import sqlite3
+
+from Database import Database
+
+"""
+Pool of worker threads for the account steps of logging in and registering, which need the database and bcrypt. Clients
+submit a task and carry on with the game tick; Client.update picks up the result once the task has finished.
+
+Each worker has its own database connection. With no workers, tasks run immediately on the calling thread.
+
+Attributes:
+    executor: The pool's threads, or None if tasks run on the calling thread
+    num_tasks: Number of tasks submitted
+    num_pending_tasks: Number of tasks submitted to the workers that haven't finished yet
+"""
+
+
+class AuthPool:
+    def __init__(self, num_workers):
+        self.executor = None
+        self.local = threading.local()
+        self.num_tasks = 0
+        self.num_pending_tasks = 0
+        self.pending_lock = threading.Lock()
+
+        if num_workers > 0:
+            self.executor = concurrent.futures.ThreadPoolExecutor(num_workers, thread_name_prefix="auth")
+
+    """Runs a task in the pool
+
+    Attributes:
+        task: One of the AuthPool task functions. Called with a database connection and the arguments
+        args: The arguments for the task
+    Returns: A concurrent.futures.Future for the task's result"""
+    def submit(self, task, *args):
+        self.num_tasks += 1
+
+        if self.executor is not None:
+            with self.pending_lock:
+                self.num_pending_tasks += 1
+
+            future = self.executor.submit(self.run_task, task, args)
+            future.add_done_callback(self.on_task_done)
+            return future
+
+        # No workers: run it here
+        future = concurrent.futures.Future()
+
+        try:
+            future.set_result(task(Database.connection, *args))
+        except Exception as err:
+            future.set_exception(err)
+
+        return future
+
+    """Runs a task on a worker thread, giving it the thread's database connection"""
+    def run_task(self, task, args):
+        if not hasattr(self.local, "connection"):
+            self.local.connection = Database.connect()
+
+        return task(self.local.connection, *args)
+
+    """Counts a task submitted to the workers as finished. Called on the worker thread that ran it"""
+    def on_task_done(self, future):
+        with self.pending_lock:
+            self.num_pending_tasks -= 1
+
+    """Returns the number of tasks waiting for a worker or running"""
+    def get_queue_length(self):
+        return self.num_pending_tasks
+
+    """Waits for the running tasks to finish and stops the workers"""
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    """Task: finds an account's password salt
+
+    Returns: The account's salt, or a random salt if the account doesn't exist, so that nobody can tell"""
+    @staticmethod
+    def get_salt(connection, username):
+        account = Database.get_account(username, connection)
+
+        if account is None:
+            return bcrypt.gensalt(12)
+        else:
+            return account[1]
+
+    """Task: checks that an account name is free and makes a salt for the new account
+
+    Returns: The new account's salt, or None if the account already exists"""
+    @staticmethod
+    def check_new_account(connection, username):
+        if Database.get_account(username, connection) is not None:
+            return None
+
+        return bcrypt.gensalt(12)
+
+    """Task: creates an account
+
+    Returns: Whether the account was created. False if someone took the name in the meantime"""
+    @staticmethod
+    def add_account(connection, username, passhash, salt):
+        try:
+            Database.add_account(username, passhash, salt, connection)
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    """Task: checks an account's password
+
+    Returns: Whether the account exists and the password hash is correct"""
+    @staticmethod
+    def check_password(connection, username, passhash):
+        account = Database.get_account(username, connection)
+
+        return account is not None and account[0] == passhash
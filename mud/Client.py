@@ -5,18 +5,28 @@ import time
 import json
 import base64
 import random
+import zlib
 from Crypto.Random import get_random_bytes
 from Packet import Packet
+from Framing import FrameReader
+from Framing import FrameWriter
 from Database import Database
-from Player import Player
+from Config import Config
+from AuthPool import AuthPool
+from OutputQueue import OutputQueue
 
 import sqlite3
-import bcrypt
 
 class Client:
     # Global number of sessions (incremental, ensuring unique session for each player)
     total_num_sessions = 0
 
+    # Number of clients disconnected for not keeping up with their output
+    num_slow_disconnects = 0
+
+    # Traffic statistics kept by each client. See Dungeon.get_traffic_stats
+    TRAFFIC_STATS = ["bytes_received", "frames_received", "unpack_time", "bytes_sent", "frames_sent", "pack_time"]
+
     # Player states
     STATE_INIT = 0
     STATE_AUTHENTICATION = 1
@@ -25,7 +35,7 @@ class Client:
     STATE_LOGGING_IN = 4
     STATE_CHARACTER_CREATION = 5
 
-    def __init__(self, game, my_socket):
+    def __init__(self, game, my_socket, use_threads=True):
         # Startup!
         self.game = game
         self.is_connected = True
@@ -37,10 +47,31 @@ class Client:
         # Begin in the initialisation state
         self.state = Client.STATE_INIT
 
-        # Init networking variables
+        # Init networking variables. Clients start in the JSON wire format, and may ask for the binary format in a hello
+        self.wire_format = Packet.FORMAT_JSON
+        self.cipher = Packet.CIPHER_CBC
         self.session_id = Client.total_num_sessions
         self.encryption_key = get_random_bytes(16)
         self.packet_id = random.randint(0, 1000)
+        self.send_packet_id = self.packet_id  # In the binary format, the server counts the packets it sends separately
+        self.has_said_hello = False
+        self.accepts_batches = False  # Whether the client understands "outputs" messages. Clients opt in with the hello
+
+        # Compression stream for output, if the client asks for one, and its statistics
+        self.compressor = None
+        self.compression_bytes_in = 0
+        self.compression_bytes_out = 0
+        self.compression_time = 0.0
+
+        # Traffic statistics: packets received and sent, their size in bytes without the size headers, and the time
+        # spent unpacking and packing them in seconds. Each is only updated by the thread doing that side of the
+        # networking, so they need no lock
+        self.bytes_received = 0
+        self.frames_received = 0
+        self.unpack_time = 0.0
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.pack_time = 0.0
 
         Client.total_num_sessions += 1
 
@@ -48,24 +79,49 @@ class Client:
         self.account_salt = b""
         self.account_name = ""
 
+        # The login or registration step running in the auth pool, as a (future, function taking the result) tuple
+        self.auth_task = None
+
         # Start without a connected player. Client will gain a player once they log in
         self.player = None
         self.character_name = ""
 
         # Create the IO queues
         self.input_queue = queue.Queue()
-        self.output_queue = queue.Queue()
+        self.output_queue = OutputQueue(Config.max_output_messages, Config.max_output_size, Config.output_policies)
+
+        # Text output during the current tick. Sent as one message by flush_output at the end of the tick. The message
+        # is low priority if all of it is
+        self.pending_output = []
+        self.pending_priority = OutputQueue.PRIORITY_LOW
+
+        # Called whenever an output is queued. Used by the asyncio server to wake up its send loop
+        self.output_listener = None
+
+        # Called by the dungeon once the client has been removed. Used by the server to free the connection's place
+        self.on_removed = None
 
-        # Run the networking threads
-        self.running_input_thread = threading.Thread(daemon=True, target=lambda: self.recv_thread())
-        self.running_output_thread = threading.Thread(daemon=True, target=lambda: self.send_thread())
-        self.running_input_thread.start()
-        self.running_output_thread.start()
+        # Run the networking threads. Without them, the owner of the client (e.g. AsyncServer) does the networking
+        if use_threads:
+            self.running_input_thread = threading.Thread(daemon=True, target=lambda: self.recv_thread())
+            self.running_output_thread = threading.Thread(daemon=True, target=lambda: self.send_thread())
+            self.running_input_thread.start()
+            self.running_output_thread.start()
 
     """Flushes client inputs, sending them to the connected player if applicable. Called during a game tick"""
     def update(self):
+        self.check_output_backlog()
+
+        # Finish the login or registration step if its result is ready
+        if self.auth_task is not None:
+            if not self.auth_task[0].done():
+                # Keep the inputs until the client is in its new state
+                return
+
+            self.finish_auth_task()
+
         # Process client inputs
-        while not self.input_queue.empty():
+        while not self.input_queue.empty() and self.auth_task is None:
             input = self.input_queue.get(False)
 
             # Pass it to the input handler for this state
@@ -107,12 +163,12 @@ class Client:
 
         # Send character creation guide (hacky but we're not marked on the code, shruggie)
         if new_state == Client.STATE_CHARACTER_CREATION:
-            characters = Database.player_db.execute("SELECT (character_name) FROM players WHERE account_name IS ?", (self.account_name,)).fetchall()
+            characters = Database.get_account_characters(self.account_name)
 
             self.output_text("<+info><b>Welcome to CHARACTER SELECTION!!!</b><br>Please type an option:<br><-info>")
 
             for character in characters:
-                self.output_text("> play %s" % character[0])
+                self.output_text("> play %s" % character)
 
             self.output_text("> create &lt;character name&gt;")
 
@@ -147,7 +203,11 @@ class Client:
         self.output_text("<+info>Registering your account...<-info>")
 
         # Try to register with this password
-        if self.try_register(self.account_name, input):
+        self.try_register(self.account_name, input)
+
+    """Called with the result of registering"""
+    def on_registered(self, is_registered):
+        if is_registered:
             # We're done, enter the game!
             self.output_text("<+info>Registration complete! Welcome to the game!<-info>")
             self.set_state(Client.STATE_CHARACTER_CREATION)
@@ -160,7 +220,11 @@ class Client:
         self.output_text("<+info>Logging in...<-info>")
 
         # Try to login with this password
-        if self.try_login(self.account_name, input):
+        self.try_login(self.account_name, input)
+
+    """Called with the result of logging in"""
+    def on_logged_in(self, is_logged_in):
+        if is_logged_in:
             # We're in!
             self.output_text("<+info>Welcome back, %s!<-info>" % self.account_name)
             self.set_state(Client.STATE_CHARACTER_CREATION)
@@ -175,7 +239,7 @@ class Client:
 
         if command[0].lower() == "play":
             if len(command) > 1:
-                if len(Database.player_db.execute("SELECT (1) FROM players WHERE character_name IS ? AND account_name is ?", (command[1], self.account_name)).fetchall()) > 0:
+                if Database.get_character_account(command[1]) == self.account_name:
                     # Successful, join the game!
                     self.character_name = command[1]
                     self.set_state(Client.STATE_INGAME)
@@ -189,7 +253,7 @@ class Client:
                 # Make sure the character doesn't already exist
                 name = command[1]
 
-                if len(Database.player_db.execute("SELECT (1) FROM players WHERE character_name IS ?", (name,)).fetchall()) > 0:
+                if Database.get_character_account(name) is not None:
                     self.output_text("<+error>That character already exists in this world! Try another name.<-error>")
                     return
 
@@ -202,185 +266,355 @@ class Client:
             # Begin the game!
             self.set_state(Client.STATE_INGAME)
 
+    """Takes a step towards registering. The account checks run in the auth pool, and the state changes once they are
+    done. After sending the password, on_registered is called with whether registering worked"""
     def try_register(self, username, password):
-        try:
+        if self.state == Client.STATE_AUTHENTICATION:
             # Ensure the username doesn't already exist
-            cursor = Database.account_db.execute("SELECT (1) FROM player_accounts WHERE name IS (?)", (username,))
-            values = cursor.fetchall()
-
-            if len(values) > 0:
-                self.output_text("<+error>This account already exists.<-error>")
-                return False
+            self.start_auth_task(AuthPool.check_new_account, (username,),
+                                 lambda salt: self.on_new_account_checked(username, salt))
+
+        elif self.state == Client.STATE_REGISTERING:
+            # We should have a password now
+            if password != None and len(password) > 0:
+                # Add the account to the database
+                self.start_auth_task(AuthPool.add_account, (username, password, self.account_salt), self.on_registered)
             else:
-                if self.state == Client.STATE_AUTHENTICATION:
-                    # Request a password for this new account
-                    self.account_name = username
-                    self.account_salt = bcrypt.gensalt(12)
-                    self.request_password()
-
-                    self.output_text("<+info>Welcome aboard, %s! Please type a password:<-info>" % username)
-
-                    # Advance to the next state
-                    self.set_state(Client.STATE_REGISTERING)
-
-                elif self.state == Client.STATE_REGISTERING:
-                    # We should have a password now
-                    if password != None and len(password) > 0:
-                        # Add the account to the database
-                        Database.account_db.execute("INSERT INTO player_accounts VALUES (?,?,?)", (username, password, self.account_salt))
-                        Database.account_db.commit()
-
-                        # Registration successful!
-                        return True
-                    else:
-                        self.output_text("Invalid password. Please type another.")
-        except sqlite3.Error as err:
-            self.output_text("SQL exception: " + err.args[0])
+                self.output_text("Invalid password. Please type another.")
+                self.on_registered(False)
+
+    """Called when the account name for a registration has been checked
+
+    Attributes:
+        username: The name of the new account
+        salt: The new account's salt, or None if the account already exists
+    """
+    def on_new_account_checked(self, username, salt):
+        if salt is None:
+            self.output_text("<+error>This account already exists.<-error>")
+            return
+
+        # Request a password for this new account
+        self.account_name = username
+        self.account_salt = salt
+        self.request_password()
+
+        self.output_text("<+info>Welcome aboard, %s! Please type a password:<-info>" % username)
 
-        return False
+        # Advance to the next state
+        self.set_state(Client.STATE_REGISTERING)
 
-    """Tries to log the user in"""
+    """Takes a step towards logging the user in. The account checks run in the auth pool, and the state changes once
+    they are done. After sending the password, on_logged_in is called with whether logging in worked"""
     def try_login(self, username, password):
-        try:
-            if self.state == Client.STATE_AUTHENTICATION:
-                # Request the password
-                self.account_name = username
-                self.account_salt = self.get_user_salt(username)
-                self.request_password()
+        if self.state == Client.STATE_AUTHENTICATION:
+            # Request the password
+            self.start_auth_task(AuthPool.get_salt, (username,), lambda salt: self.on_salt_found(username, salt))
 
-                self.output_text("<+info>Please type your password:<-info>")
+        elif self.state == Client.STATE_LOGGING_IN:
+            # Check the password against the account database
+            self.start_auth_task(AuthPool.check_password, (username, password), self.on_password_checked)
 
-                # Advance to logging in state
-                self.set_state(Client.STATE_LOGGING_IN)
+    """Called with the salt of the account being logged in to"""
+    def on_salt_found(self, username, salt):
+        self.account_name = username
+        self.account_salt = salt
+        self.request_password()
 
-            elif self.state == Client.STATE_LOGGING_IN:
-                # Get the password hash from the account database
-                ret = Database.account_db.execute("SELECT (passhash) FROM player_accounts WHERE name IS (?)", (username,))
-                row_info = ret.fetchall()
+        self.output_text("<+info>Please type your password:<-info>")
 
-                # Ensure the account exists
-                if len(row_info) < 1:
-                    return False
+        # Advance to logging in state
+        self.set_state(Client.STATE_LOGGING_IN)
 
-                # Check the password
-                is_password_correct = row_info[0][0] == password
+    """Called with whether the password given for logging in was correct"""
+    def on_password_checked(self, is_password_correct):
+        # Ensure the account isn't already logged in
+        self.on_logged_in(is_password_correct and not self.game.is_account_online(self.account_name))
 
-                # Ensure the account isn't already logged in
-                if is_password_correct:
-                    if len([player for player in self.game.players if player.client.account_name == self.account_name]) > 0:
-                        return False
-                else:
-                    return False
+    """Runs an account step in the auth pool. Inputs wait until it has finished
+
+    Attributes:
+        task: The AuthPool task function
+        args: The arguments for the task
+        on_done: Function called with the task's result during the first update after it finishes
+    """
+    def start_auth_task(self, task, args, on_done):
+        self.auth_task = (self.game.auth_pool.submit(task, *args), on_done)
 
-                # Login was successful!
-                return True
+    """Hands the result of the finished auth task to its function"""
+    def finish_auth_task(self):
+        future, on_done = self.auth_task
+        self.auth_task = None
 
+        try:
+            result = future.result()
         except sqlite3.Error as err:
-            self.output_text("SQL Exception: " + err.args[0])
+            self.output_text("SQL exception: " + str(err))
+            self.set_state(Client.STATE_AUTHENTICATION)
+            return
+        except Exception as err:
+            # Anything else that went wrong in the task stays with this client, instead of stopping the game loop
+            print("Auth task error: %r" % err)
+            self.output_text("<+error>Error checking your account: %s. Please try again.<-error>" % err)
+            self.set_state(Client.STATE_AUTHENTICATION)
+            return
 
-        return False
+        on_done(result)
 
-    """Outputs a string to the client"""
-    def output_text(self, string):
-        # Create the packet
-        packet_data = {
-            "type": "output",
-            "text": string
-        }
+    """Outputs a string to the client. The string is sent with the rest of this tick's output when flush_output is called
+
+    Attributes:
+        string: The string to output
+        priority: OutputQueue.PRIORITY_LOW if the string can be dropped when the client falls behind (e.g. broadcasts)
+    """
+    def output_text(self, string, priority=OutputQueue.PRIORITY_NORMAL):
+        self.pending_output.append(string)
+        self.pending_priority = max(self.pending_priority, priority)
+
+    """Sends all text output since the last flush to the client as a single message, or as one message per text to
+    clients that don't accept batches (see process_hello). Called at the end of a game tick"""
+    def flush_output(self):
+        if len(self.pending_output) == 0:
+            return
 
-        self.output_queue.put(json.dumps(packet_data).encode(), False)
+        if len(self.pending_output) == 1:
+            self.queue_output((Packet.MESSAGE_OUTPUT, self.pending_output[0]), self.pending_priority)
+        elif self.accepts_batches:
+            self.queue_output((Packet.MESSAGE_OUTPUTS, self.pending_output), self.pending_priority)
+        else:
+            for text in self.pending_output:
+                self.queue_output((Packet.MESSAGE_OUTPUT, text), self.pending_priority)
+
+        self.pending_output = []
+        self.pending_priority = OutputQueue.PRIORITY_LOW
 
     # Requests a password from the client
     def request_password(self):
-        packet_data = {
-            "type": "salt",
-            "salt": self.account_salt.decode("utf-8")
+        # Send any earlier output first, so the client receives everything in order
+        self.flush_output()
+
+        self.queue_output((Packet.MESSAGE_SALT, self.account_salt))
+
+    """Marks the client as disconnected, waking up the send thread so that it can finish"""
+    def disconnect(self):
+        self.is_connected = False
+        self.queue_output(None)
+
+    """Queues a (message type, payload) message to be sent to the client, and informs the output listener if there is one.
+    Disconnects the client if its output queue has been full for too long
+    
+    Attributes:
+        message: The message type (Packet.MESSAGE_*) and payload, as accepted by Packet.encode_message
+        priority: The message's priority in the output queue (OutputQueue.PRIORITY_*)"""
+    def queue_output(self, message, priority=OutputQueue.PRIORITY_NORMAL):
+        self.output_queue.put(message, priority)
+        self.check_output_backlog()
+
+        if self.output_listener is not None:
+            self.output_listener()
+
+    """Disconnects the client if its output queue has been full for longer than the grace period. Called whenever output
+    is queued, and every tick in case there's no more output"""
+    def check_output_backlog(self):
+        if self.is_connected and OutputQueue.POLICY_DISCONNECT in Config.output_policies and \
+                self.output_queue.get_full_time() > Config.output_grace_period:
+            print("Client isn't reading its output -- removing client")
+            Client.num_slow_disconnects += 1
+            self.disconnect()
+
+            # The sender is probably stuck sending to the client, so stop the connection under it. Clients without a
+            # socket (e.g. simulated ones) have nothing to stop
+            if self.socket is not None:
+                try:
+                    self.socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    """Returns the initial (unencrypted) security packet containing the encryption info and session/packet ID"""
+    def make_security_packet(self):
+        client_info = {
+            "type": "security",
+            "session_id": self.session_id,
+            "packet_id": self.packet_id,
+            "encryption_key": base64.b64encode(self.encryption_key).decode("utf-8"),
+            "formats": Packet.FORMATS,
+            "ciphers": Packet.CIPHERS,
+            "compressions": Packet.COMPRESSIONS,
+            "bacon_key": base64.b64encode(get_random_bytes(16)).decode("utf-8")
+            # this is bacon. it actually does nothing, it just runs on the theory that a hacker
+            # would, under his assumption that he is being fooled, prefer to grab the bacon instead of the key
+            # it also gives the appearance of some voodoo extra-strong encryption technique, which I am in fact
+            # not smart or magic enough to implement
         }
 
-        self.output_queue.put(json.dumps(packet_data).encode(), False)
+        return json.dumps(client_info).encode()
+
+    """Decrypts a packet received from the client and queues its input
+    
+    Attributes:
+        packet: The received packet data, without its size header
+    Returns: Whether the packet was valid"""
+    def receive_packet(self, packet):
+        start_time = time.perf_counter()
+        self.frames_received += 1
+        self.bytes_received += len(packet)
+
+        if Packet.is_binary(packet):
+            message = Packet.unpack_binary(packet, self.encryption_key, self.session_id, self.packet_id, Packet.SENDER_CLIENT)
+            self.unpack_time += time.perf_counter() - start_time
+
+            if message is None:
+                return False
+
+            message_type, data = message
 
-        """Returns the encoded password salt for a user account, or a random salt if the account doesn't exist"""
+            # The hello's options are applied before its packet is counted, so that the send thread never stamps a JSON
+            # packet with the ID after the hello's, which the client doesn't expect (see pack_output)
+            if message_type == Packet.MESSAGE_HELLO:
+                is_valid = self.process_hello(data)
+                self.packet_id += 1
+                return is_valid
+
+            self.packet_id += 1
+
+            if message_type != Packet.MESSAGE_INPUT:
+                return False
+        else:
+            data = Packet.unpack(packet, self.encryption_key, self.session_id, self.packet_id)
+            self.unpack_time += time.perf_counter() - start_time
+            self.packet_id += 1
+
+            if data is None:
+                return False
+
+        self.input_queue.put(data.decode("utf-8"))
+        return True
+
+    """Applies the connection options a client asks for in its hello message. Only one hello is allowed per session
+    
+    Attributes:
+        data: The hello message data: a JSON object of options
+    Returns: Whether the options were valid"""
+    def process_hello(self, data):
+        if self.has_said_hello:
+            return False
+
+        self.has_said_hello = True
 
-    def get_user_salt(self, username):
         try:
-            # Get the salt for this user
-            cursor = Database.account_db.execute("SELECT (salt) FROM player_accounts WHERE name IS (?)", (username,))
-            values = cursor.fetchall()
+            options = json.loads(data.decode("utf-8"))
+        except ValueError:
+            return False
 
-            if len(values) == 0:
-                # Account doesn't exist, but send a random salt anyway
-                return bcrypt.gensalt(12)
-            else:
-                return values[0][0]
+        if type(options) != dict:
+            return False
 
-        except sqlite3.Error as err:
-            self.output_text("Exception getting salt: " + err.args[0])
+        if options.get("format") in Packet.FORMATS:
+            self.wire_format = options["format"]
+
+        if options.get("cipher") in Packet.CIPHERS:
+            self.cipher = options["cipher"]
+
+        # Every client of the binary format understands batched output. JSON clients have to ask for it
+        if options.get("batches") is True or self.wire_format == Packet.FORMAT_BINARY:
+            self.accepts_batches = True
+
+        # Compression is only available in the binary format, which can flag compressed packets
+        if options.get("compression") == Packet.COMPRESSION_ZLIB and self.wire_format == Packet.FORMAT_BINARY:
+            self.compressor = zlib.compressobj(Config.compression_level)
+
+        return True
+
+    """Encodes and encrypts a queued output message in the client's wire format, returning the packet to send"""
+    def pack_output(self, output):
+        start_time = time.perf_counter()
+        message_type, payload = output
+
+        # The packet ID is read before the format, which a hello changes before its packet is counted (see
+        # receive_packet): a JSON packet is always stamped with the ID the client expects
+        json_packet_id = self.packet_id
+        wire_format = self.wire_format
+        data = Packet.encode_message(message_type, payload, wire_format)
+
+        if wire_format == Packet.FORMAT_BINARY:
+            compressor = self.compressor
+
+            if compressor is not None:
+                # Compress with the session's stream, flushing so the client can decompress this packet right away
+                compression_start_time = time.perf_counter()
+                compressed_data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+                self.compression_time += time.perf_counter() - compression_start_time
+                self.compression_bytes_in += len(data)
+                self.compression_bytes_out += len(compressed_data)
+                data = compressed_data
+
+            packet = Packet.pack_binary(message_type, data, self.encryption_key, self.session_id, self.send_packet_id,
+                                        self.cipher, compressed=compressor is not None)
+            self.send_packet_id += 1
+        else:
+            packet = Packet.pack(data, self.encryption_key, self.session_id, json_packet_id)
+
+        self.pack_time += time.perf_counter() - start_time
+        self.frames_sent += 1
+        self.bytes_sent += len(packet)
+
+        return packet
 
     """Runs the thread used to receive input from this player's client"""
     def recv_thread(self):
+        frame_reader = FrameReader(Config.max_frame_size)
+
         while self.is_connected:
-            # Get the next message from the player
+            # Get the next messages from the player
             try:
-                # Get next message
-                data_header = int.from_bytes(self.socket.recv(2), "little")
-                packet = self.socket.recv(data_header, socket.MSG_WAITALL)
+                if frame_reader.recv_from(self.socket) == 0:
+                    print("Client closed the connection, removing client")
+                    self.disconnect()
+                    break
 
-                if len(packet) == data_header:
+                for packet in frame_reader.frames():
                     # Decrypt packet
-                    data = Packet.unpack(packet, self.encryption_key, self.session_id, self.packet_id)
-                    self.packet_id += 1
-
-                    if data is not None:
-                        self.input_queue.put(data.decode("utf-8"))
-                    else:
+                    if not self.receive_packet(packet):
                         print("Invalid packet received -- removing client")
-                        self.is_connected = False    # I'm just glad
-                else:
-                    print("Partial message received -- removing client")
-                    self.is_connected = False        # we aren't being
+                        self.disconnect()    # I'm just glad
+                        break
+            except ValueError as error:
+                print("Oversized message received -- removing client")
+                self.disconnect()            # we aren't being
             except socket.error as error:
                 print("Client error, removing client")
-                self.is_connected = False            # marked on maintainability
+                self.disconnect()            # marked on maintainability
 
     """Runs the thread used for networked output to this player's client"""
     def send_thread(self):
-        # Send the encryption info and session/packet ID to the player client
-        client_info = {
-            "type": "security",
-            "session_id": self.session_id,
-            "packet_id": self.packet_id,
-            "encryption_key": base64.b64encode(self.encryption_key).decode("utf-8"),
-            "bacon_key": base64.b64encode(get_random_bytes(16)).decode("utf-8")
-            # this is bacon. it actually does nothing, it just runs on the theory that a hacker
-            # would, under his assumption that he is being fooled, prefer to grab the bacon instead of the key
-            # it also gives the appearance of some voodoo extra-strong encryption technique, which I am in fact
-            # not smart or magic enough to implement
-        }
-        initial_packet_packaged = json.dumps(client_info).encode()
+        frame_writer = FrameWriter()
 
-        self.socket.send(len(initial_packet_packaged).to_bytes(2, 'little') + initial_packet_packaged)
+        # Send the encryption info and session/packet ID to the player client
+        frame_writer.add(self.make_security_packet())
 
         # Begin the main message send loop
-        while self.is_connected:
-            # Output the current messages to the player, if possible
+        while True:
+            # Send everything that's been packaged, in as few system calls as possible
             try:
-                # Send any existing player outputs
-                while not self.output_queue.empty():
-                    # Find next message to send
-                    output = self.output_queue.get(False)
-
-                    # Package this message
-                    packet_packaged = Packet.pack(output, self.encryption_key, self.session_id, self.packet_id)
-
-                    # Send the message
-                    self.socket.send(len(packet_packaged).to_bytes(2, 'little') + packet_packaged)
+                frame_writer.send_to(self.socket)
             except socket.error as error:
                 # Disconnect
                 print("Client error, removing client")
-                self.is_connected = False
+                self.disconnect()
+                return
+
+            # Sleep until there's something to send, then take everything else that's pending with it
+            for output in self.output_queue.get_all():
+                # A None output means the client has disconnected
+                if output is None:
+                    return
+
+                # Package this message
+                packet_packaged = self.pack_output(output)
 
-            # Wait a bit
-            time.sleep(0.1)
+                if packet_packaged is not None:
+                    frame_writer.add(packet_packaged)
 
 
 # Functions for handling input in each state
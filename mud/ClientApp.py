@@ -2,51 +2,37 @@ import socket
 import sys
 import threading
 import time
-import queue
 import re
-import json
-import base64
-import bcrypt
 
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 
-from Packet import Packet
+from ClientProtocol import ClientProtocol
 from Global import Global
 
 """
-The client app. Shows client interface and manages interfacing with the server
+The client app. Shows client interface and manages interfacing with the server. The protocol itself is in ClientProtocol
 
 Attributes:
     is_independent (class attribute): Whether the client is being run independently, or is being spawned as a 
                                       thread for testing on the server
-    server_socket: The socket that connects to the server
-    is_connected: Whether the server is connected
     is_closing: Whether the client UI is being closed
-    input_queue: A queue of inputs from the UI
-    output_queue: A queue of outputs to be read by the UI
 """
-class ClientApp:
+class ClientApp(ClientProtocol):
     # This is set to false if the client is spawned as a thread by the server
     is_independent = True
 
-    # Client states
-    STATE_OFFLINE = 0
-    STATE_CONNECTED = 1
-    STATE_AUTHENTICATION = 2
-    STATE_AWAITING_PASSWORD = 3
-    STATE_INGAME = 4
-
     """Initialises the client app thread and all sub-threads"""
     def __init__(self):
+        super().__init__()
+
+        # Setup state variables
+        self.is_closing = False
+
         # Create the UI
         self.gui = GUIThread(self)
 
-        # Init vars
-        self.state = ClientApp.STATE_OFFLINE
-        self.server_socket = None
-
         # Find the local IP that we'll connect to
         ip_finder = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
@@ -58,22 +44,6 @@ class ClientApp:
         finally:
             ip_finder.close()
 
-        # Setup state variables
-        self.is_connected = False
-        self.is_closing = False
-
-        # Declare empty network variables
-        self.session_id = "none"
-        self.packet_id = 0
-        self.encryption_key = b""
-
-        # Declare empty accounting variables
-        self.password_salt = b""
-
-        # Setup queues
-        self.input_queue = queue.Queue()
-        self.output_queue = queue.Queue()
-
         # Run the client!
         self.run()
 
@@ -92,14 +62,11 @@ class ClientApp:
             # Inform the user
             self.push_output("Connecting to %s<br>" % server_ip)
 
-            # Attempt to connect
+            # Attempt to connect, starting the send and receive threads
             try:
-                # Connect to the server
-                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                self.server_socket.connect((server_ip, 9123))
+                self.connect(server_ip, 9123)
 
                 self.push_output("<+info>Connection successful!<-info>")
-                self.is_connected = True
             except socket.error as error:
                 # Print the network error
                 if num_connect_attempts == 0:
@@ -112,137 +79,15 @@ class ClientApp:
 
             # If the connection was successful, begin main loop
             if self.is_connected:
-                # Initialise states
-                self.state = ClientApp.STATE_CONNECTED
-
-                # Startup the send and receive threads
-                threading.Thread(target=ClientApp.send_thread, args=(self,), daemon=True).start()
-                threading.Thread(target=ClientApp.recv_thread, args=(self,), daemon=True).start()
-
                 while self.is_connected is True and self.is_closing is False:
                     time.sleep(1.0)
 
+                # Stop the send thread
+                self.input_queue.put(None)
+
                 # Reset the client
                 num_connect_attempts = 0
-                self.session_id = 0
-                self.packet_id = 0
-                self.encryption_key = b""
-                self.password_salt = b""
-                self.server_socket = None
-
-    """Processes a message received from the server"""
-    def process_message(self, message):
-        # Get message info
-        try:
-            # Unpack the message
-            if self.encryption_key != b"":
-                message_data = json.loads(Packet.unpack(message, self.encryption_key, self.session_id, self.packet_id).decode("utf-8"))
-            else:
-                message_data = json.loads(message.decode("utf-8"))
-
-            message_type = message_data["type"]
-        except:
-            self.push_output("<+info>Invalid message received from the server. Disconnecting.<-info>")
-            self.is_connected = False
-            return
-
-        # Process the actual message
-        if message_type == "security":
-            try:
-                # Collect networking/encryption settings
-                self.encryption_key = base64.b64decode(message_data["encryption_key"])
-                self.session_id = message_data["session_id"]
-                self.packet_id = message_data["packet_id"]
-            except:
-                self.push_output("<+info>Error establishing connection to server. Disconnecting.<-info>")
-                self.is_connected = False
-        elif message_type == "output":
-            try:
-                self.push_output(message_data["text"])
-            except:
-                self.push_output("<+info>Invalid output received from the server. Disconnecting.<-info>")
-                self.is_connected = False
-        elif message_type == "salt":
-            try:
-                self.password_salt = message_data["salt"].encode()
-
-                # Server is probably waiting for our password
-                self.state = ClientApp.STATE_AWAITING_PASSWORD
-            except:
-                self.push_output("<+info>Server's sending weird stuff. Disconnecting.<-info>")
-                self.is_connected = False
-
-    """Pushes a player input to the queue, to be sent to the server
-
-    Attributes:
-        text: the text to send
-    """
-    def process_input(self, text: str):
-        if self.state == ClientApp.STATE_AWAITING_PASSWORD:
-            self.push_output("<+info>Sending password...<-info>")
-
-            # Hash the entered password
-            hashed_password = bcrypt.hashpw(text.encode(), self.password_salt).decode("utf-8")
-
-            # Send the hashed password to the server
-            self.input_queue.put(hashed_password)
-
-            # Send the hashed password and return to the previous state
-            self.state = ClientApp.STATE_AUTHENTICATION
-        else:
-            self.input_queue.put(text, False)
-
-    """Sends outstanding player inputs while connected"""
-    def send_thread(self):
-        while self.is_connected:
-            while not self.input_queue.empty():
-                player_input = self.input_queue.get(False).encode()
-
-                try:
-                    # Send all unsent inputs to the server
-                    packet = Packet.pack(player_input, self.encryption_key, self.session_id, self.packet_id)
-                    self.packet_id += 1
-
-                    # Send message as a size-data pair
-                    self.server_socket.send(len(packet).to_bytes(2, "little") + packet)
-                except socket.error as error:
-                    self.push_output("<+info>You have been disconnected from the server (send error).<-info>")
-                    self.push_output(str(error))
-                    self.is_connected = False
-
-            time.sleep(0.1)
-
-    """Receives player outputs from the server while connected"""
-    def recv_thread(self):
-        # Receive initial encryption key, etc
-
-        # Show all messages received from the server
-        while self.is_connected:
-            try:
-                # Receive the size of the next message
-                data_header = int.from_bytes(self.server_socket.recv(2), 'little')
-
-                # Receive the entire message
-                data = self.server_socket.recv(data_header, socket.MSG_WAITALL)
-
-                # Output the message
-                if len(data) == data_header:
-                    self.process_message(data)
-                else:
-                    self.push_output("Partial message received! Disconnecting")
-                    self.is_connected = False
-            except socket.error as error:
-                self.push_output("<+info>You have been disconnected from the server (receive error).<-info>")
-                self.push_output(str(error))
-                self.is_connected = False
-
-    """Pushes a player output to the queue, to be read by the GUI thread
-    
-    Attributes:
-        text: the text received from the server to be output to the player
-    """
-    def push_output(self, text: str):
-        self.output_queue.put(text, False)
+                self.reset_connection()
 
     """Called when the app window is closed"""
     def on_gui_close(self):
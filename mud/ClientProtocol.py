@@ -0,0 +1,246 @@
+import socket
+import threading
+import queue
+import json
+import base64
+import zlib
+import bcrypt
+
+from Packet import Packet
+from Framing import FrameReader
+from Framing import FrameWriter
+
+"""
+The client's side of the game protocol, without any interface: connecting, the security handshake and hello, the
+password salt exchange, and sending inputs and receiving outputs. Used by ClientApp, and by headless clients such as the
+bot swarm (benchmarks/bench_swarm.py).
+
+Inputs are sent from input_queue by the send thread, and each output text received is put on output_queue.
+
+Attributes:
+    server_socket: The socket that connects to the server
+    state: The client state (STATE_*)
+    is_connected: Whether the server is connected
+    input_queue: A queue of (message type, text) inputs to send to the server. None stops the send thread
+    output_queue: A queue of outputs received from the server
+"""
+
+
+class ClientProtocol:
+    # Largest message accepted from the server, in bytes
+    MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+    # Client states
+    STATE_OFFLINE = 0
+    STATE_CONNECTED = 1
+    STATE_AUTHENTICATION = 2
+    STATE_AWAITING_PASSWORD = 3
+    STATE_INGAME = 4
+
+    def __init__(self):
+        self.state = ClientProtocol.STATE_OFFLINE
+        self.server_socket = None
+        self.is_connected = False
+
+        # Declare empty network and accounting variables
+        self.reset_connection()
+
+        # Setup queues
+        self.input_queue = queue.Queue()
+        self.output_queue = queue.Queue()
+
+    """Connects to a server and starts the send and receive threads. Raises socket.error if the connection fails
+
+    Attributes:
+        server_ip: The IP of the server
+        port: The server's game port
+    """
+    def connect(self, server_ip, port):
+        self.server_socket = socket.create_connection((server_ip, port))
+        self.is_connected = True
+
+        # Initialise states
+        self.state = ClientProtocol.STATE_CONNECTED
+
+        # Startup the send and receive threads
+        threading.Thread(target=ClientProtocol.send_thread, args=(self,), daemon=True).start()
+        threading.Thread(target=ClientProtocol.recv_thread, args=(self,), daemon=True).start()
+
+    """Resets the network and accounting variables, ready for the next connection"""
+    def reset_connection(self):
+        self.session_id = "none"
+        self.packet_id = 0
+        self.encryption_key = b""
+        self.wire_format = Packet.FORMAT_JSON
+        self.cipher = Packet.CIPHER_CBC
+        self.recv_packet_id = 0
+        self.hello_packet_id = 0
+        self.decompressor = None
+        self.password_salt = b""
+        self.server_socket = None
+
+    """Processes a message received from the server"""
+    def process_message(self, message):
+        # Get message info
+        try:
+            # Unpack the message
+            if self.encryption_key != b"" and Packet.is_binary(message):
+                message_data = Packet.decode_message(*Packet.unpack_binary(message, self.encryption_key, self.session_id, self.recv_packet_id,
+                                                                           Packet.SENDER_SERVER, self.decompressor))
+                self.recv_packet_id += 1
+            elif self.encryption_key != b"":
+                # Once we've said hello, the server only sends JSON packets until it receives the hello, so they still carry its ID
+                json_packet_id = self.packet_id if self.wire_format == Packet.FORMAT_JSON else self.hello_packet_id
+                message_data = json.loads(Packet.unpack(message, self.encryption_key, self.session_id, json_packet_id).decode("utf-8"))
+            else:
+                message_data = json.loads(str(message, "utf-8"))
+
+            message_type = message_data["type"]
+        except:
+            self.push_output("<+info>Invalid message received from the server. Disconnecting.<-info>")
+            self.is_connected = False
+            return
+
+        # Process the actual message
+        if message_type == "security":
+            try:
+                # Collect networking/encryption settings
+                self.encryption_key = base64.b64decode(message_data["encryption_key"])
+                self.session_id = message_data["session_id"]
+                self.packet_id = message_data["packet_id"]
+                self.recv_packet_id = message_data["packet_id"]
+
+                # Switch to the binary wire format, AES-GCM and compressed output if the server supports them
+                if Packet.FORMAT_BINARY in message_data.get("formats", []):
+                    self.wire_format = Packet.FORMAT_BINARY
+                    self.hello_packet_id = self.packet_id
+                    compression = Packet.COMPRESSION_NONE
+
+                    if Packet.CIPHER_GCM in message_data.get("ciphers", []):
+                        self.cipher = Packet.CIPHER_GCM
+
+                    if Packet.COMPRESSION_ZLIB in message_data.get("compressions", []):
+                        compression = Packet.COMPRESSION_ZLIB
+                        self.decompressor = zlib.decompressobj()
+
+                    self.input_queue.put((Packet.MESSAGE_HELLO, json.dumps({"format": self.wire_format, "cipher": self.cipher,
+                                                                            "compression": compression, "batches": True})))
+            except:
+                self.push_output("<+info>Error establishing connection to server. Disconnecting.<-info>")
+                self.is_connected = False
+        elif message_type == "output":
+            try:
+                self.push_output(message_data["text"])
+            except:
+                self.push_output("<+info>Invalid output received from the server. Disconnecting.<-info>")
+                self.is_connected = False
+        elif message_type == "outputs":
+            try:
+                for text in message_data["texts"]:
+                    self.push_output(text)
+            except:
+                self.push_output("<+info>Invalid output received from the server. Disconnecting.<-info>")
+                self.is_connected = False
+        elif message_type == "salt":
+            try:
+                self.password_salt = message_data["salt"].encode()
+
+                # Server is probably waiting for our password
+                self.state = ClientProtocol.STATE_AWAITING_PASSWORD
+            except:
+                self.push_output("<+info>Server's sending weird stuff. Disconnecting.<-info>")
+                self.is_connected = False
+        elif message_type == "waiting":
+            try:
+                self.push_output("<+info>The server is full. You are number %d in the queue.<-info>"
+                                 % message_data["position"])
+            except:
+                self.push_output("<+info>Server's sending weird stuff. Disconnecting.<-info>")
+                self.is_connected = False
+        elif message_type == "refused":
+            self.push_output("<+info>Connection refused: %s<-info>" % message_data.get("reason", ""))
+            self.is_connected = False
+
+    """Pushes a player input to the queue, to be sent to the server
+
+    Attributes:
+        text: the text to send
+    """
+    def process_input(self, text: str):
+        if self.state == ClientProtocol.STATE_AWAITING_PASSWORD:
+            self.push_output("<+info>Sending password...<-info>")
+
+            # Hash the entered password
+            hashed_password = bcrypt.hashpw(text.encode(), self.password_salt).decode("utf-8")
+
+            # Send the hashed password to the server
+            self.input_queue.put((Packet.MESSAGE_INPUT, hashed_password))
+
+            # Send the hashed password and return to the previous state
+            self.state = ClientProtocol.STATE_AUTHENTICATION
+        else:
+            self.input_queue.put((Packet.MESSAGE_INPUT, text), False)
+
+    """Sends player inputs as soon as they are entered, until the connection ends"""
+    def send_thread(self):
+        frame_writer = FrameWriter()
+
+        while True:
+            # Wait for the next input. A None input is pushed when the connection ends
+            player_input = self.input_queue.get()
+
+            if player_input is None:
+                return
+
+            try:
+                # Send the input to the server
+                message_type, text = player_input
+                data = Packet.encode_message(message_type, text, self.wire_format)
+
+                if self.wire_format == Packet.FORMAT_BINARY:
+                    packet = Packet.pack_binary(message_type, data, self.encryption_key, self.session_id, self.packet_id, self.cipher, Packet.SENDER_CLIENT)
+                else:
+                    packet = Packet.pack(data, self.encryption_key, self.session_id, self.packet_id)
+                self.packet_id += 1
+
+                # Send message as a size-data pair
+                frame_writer.add(packet)
+                frame_writer.send_to(self.server_socket)
+            except socket.error as error:
+                self.push_output("<+info>You have been disconnected from the server (send error).<-info>")
+                self.push_output(str(error))
+                self.is_connected = False
+
+    """Receives player outputs from the server while connected"""
+    def recv_thread(self):
+        # Receive initial encryption key, etc
+
+        frame_reader = FrameReader(ClientProtocol.MAX_FRAME_SIZE)
+
+        # Show all messages received from the server
+        while self.is_connected:
+            try:
+                # Receive whatever has arrived
+                if frame_reader.recv_from(self.server_socket) == 0:
+                    self.push_output("<+info>You have been disconnected from the server.<-info>")
+                    self.is_connected = False
+                    break
+
+                # Output every complete message
+                for data in frame_reader.frames():
+                    self.process_message(data)
+            except ValueError as error:
+                self.push_output("Oversized message received! Disconnecting")
+                self.is_connected = False
+            except socket.error as error:
+                self.push_output("<+info>You have been disconnected from the server (receive error).<-info>")
+                self.push_output(str(error))
+                self.is_connected = False
+
+    """Pushes a player output to the queue, to be read by the GUI thread
+    
+    Attributes:
+        text: the text received from the server to be output to the player
+    """
+    def push_output(self, text: str):
+        self.output_queue.put(text, False)
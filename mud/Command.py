@@ -1,20 +1,82 @@
+"""A command that players can type
+
+Attributes:
+    name: What the player types to use the command
+    func: The function called with (player, parameters) when the command is used
+    usage: Description shown in the help
+    example_usage: Example shown when the command is used with the wrong number of parameters
+    number_of_parameters: Number of parameters the command takes, or -1 for any number
+    enabled_by_default: Whether players can use the command unless it is disabled for them
+"""
+
+
 class Command:
-    def __init__(self, name, func, usage, example_usage, number_of_parameters):
+    def __init__(self, name, func, usage, example_usage, number_of_parameters, enabled_by_default=True):
         self.name = name
         self.func = func
         self.usage = usage
         self.example_usage = example_usage
         self.number_of_parameters = number_of_parameters
+        self.enabled_by_default = enabled_by_default
+
 
+"""A set of commands shared by every player, built once. Each player can enable or disable commands for themselves.
+
+Besides its full name, a command can be typed as an alias, which may fill in some of its parameters (e.g. 'n' for
+'go north'), or as any abbreviation of its name that no other command shares (e.g. 'inv' for 'inventory'). All of these
+are precomputed into one table, so finding a command is a single dictionary lookup however many commands there are.
+
+Attributes:
+    commands: The commands, indexed by name, in the order they were added
+    aliases: Alternative names for commands, as (command name, parameters to insert) tuples indexed by alias
+    lookup: Everything that can be typed to use a command, as (command, parameters to insert, is exact) tuples. Exact
+            entries are full names and aliases; the rest are abbreviations
 """
-        
-        Abilities desired:
-        * Add command to player, disable command from player
-        * Command which acts on an object
-        * Command which acts on the player
-        
-        
-        :param name: 
-        :param target: 
-        :param type: 
-"""
\ No newline at end of file
+
+
+class CommandRegistry:
+    def __init__(self, commands, aliases=None):
+        self.commands = {}
+        self.aliases = {}
+        self.lookup = {}
+
+        for command in commands:
+            self.commands[command.name] = command
+
+        if aliases is not None:
+            for alias, expansion in aliases.items():
+                # Aliases are given as the text they stand for, e.g. "go north"
+                words = expansion.split(" ")
+                self.aliases[alias] = (words[0], words[1:])
+
+        self.build_lookup()
+
+    """Precomputes the lookup table from the commands and aliases"""
+    def build_lookup(self):
+        self.lookup = {}
+
+        # Find which commands start with each abbreviation
+        prefix_owners = {}
+        for command_name in self.commands:
+            for length in range(1, len(command_name)):
+                prefix_owners.setdefault(command_name[:length], []).append(command_name)
+
+        # Abbreviations shared by several commands are ambiguous, so they're left out
+        for prefix, owners in prefix_owners.items():
+            if len(owners) == 1:
+                self.lookup[prefix] = (self.commands[owners[0]], [], False)
+
+        # Aliases and full names take priority over abbreviations
+        for alias, (command_name, parameters) in self.aliases.items():
+            self.lookup[alias] = (self.commands[command_name], parameters, True)
+
+        for command_name, command in self.commands.items():
+            self.lookup[command_name] = (command, [], True)
+
+    """Finds the command for a typed command name
+
+    Attributes:
+        command_name: The command name as typed, in lower case
+    Returns: A (command, parameters to insert, is exact) tuple, or None if no command matches"""
+    def find(self, command_name):
+        return self.lookup.get(command_name)
@@ -0,0 +1,130 @@
+import collections
+import json
+import time
+
+import Percentiles
+
+"""
+Optional timing of player and item commands. When it's on (Config.command_stats, or the admin command 'timings on'),
+Player runs every command through run, which counts it and records how long it took. Time spent in Player.output during
+a command, including output to other players, is recorded separately from the command's own logic, along with how much
+text it output.
+
+When it's off, the dungeon has no CommandStats and commands run as they always have.
+
+Attributes:
+    entries: The statistics of each command, indexed by name ("go", "item take", ...). Each is a list of
+             [runs, total time, output time, characters output, recent durations]. Times are in seconds
+    is_timing: Whether a command is being timed right now
+"""
+
+
+class CommandStats:
+    # Indexes into an entry
+    RUNS = 0
+    TOTAL_TIME = 1
+    OUTPUT_TIME = 2
+    OUTPUT_SIZE = 3
+    DURATIONS = 4
+
+    def __init__(self, history_size=1000):
+        self.history_size = history_size
+        self.entries = {}
+
+        # The command being timed
+        self.is_timing = False
+        self.output_time = 0.0
+        self.output_size = 0
+
+    """Runs a command, timing it
+
+    Attributes:
+        name: The name to record the command under
+        func: The command function
+        args: The arguments for the function
+    """
+    def run(self, name, func, *args):
+        self.is_timing = True
+        self.output_time = 0.0
+        self.output_size = 0
+        start_time = time.perf_counter()
+
+        try:
+            func(*args)
+        finally:
+            duration = time.perf_counter() - start_time
+            self.is_timing = False
+
+            entry = self.entries.get(name)
+
+            if entry is None:
+                entry = self.entries[name] = [0, 0.0, 0.0, 0, collections.deque(maxlen=self.history_size)]
+
+            entry[CommandStats.RUNS] += 1
+            entry[CommandStats.TOTAL_TIME] += duration
+            entry[CommandStats.OUTPUT_TIME] += self.output_time
+            entry[CommandStats.OUTPUT_SIZE] += self.output_size
+            entry[CommandStats.DURATIONS].append(duration)
+
+    """Outputs a string during a command, timing it
+
+    Attributes:
+        output_text: The function outputting the string, e.g. a client's output_text
+        string: The string
+        priority: The string's output priority
+    """
+    def output(self, output_text, string, priority):
+        start_time = time.perf_counter()
+        output_text(string, priority)
+
+        self.output_time += time.perf_counter() - start_time
+        self.output_size += len(string)
+
+    """Forgets everything recorded so far"""
+    def reset(self):
+        self.entries = {}
+
+    """Returns the statistics of each command as a dictionary indexed by command name, busiest first. Times are in
+    seconds"""
+    def get_stats(self):
+        stats = collections.OrderedDict()
+
+        for name, entry in sorted(self.entries.items(), key=lambda item: item[1][CommandStats.TOTAL_TIME], reverse=True):
+            percentiles = Percentiles.get_percentiles(entry[CommandStats.DURATIONS], [50, 99, 100])
+
+            stats[name] = {
+                "runs": entry[CommandStats.RUNS],
+                "total_time": entry[CommandStats.TOTAL_TIME],
+                "output_time": entry[CommandStats.OUTPUT_TIME],
+                "logic_time": entry[CommandStats.TOTAL_TIME] - entry[CommandStats.OUTPUT_TIME],
+                "output_characters": entry[CommandStats.OUTPUT_SIZE],
+                "p50": percentiles[0],
+                "p99": percentiles[1],
+                "max": percentiles[2]
+            }
+
+        return stats
+
+    """Returns the statistics as lines of text, busiest command first"""
+    def get_report(self):
+        stats = self.get_stats()
+        lines = ["Command timings: %d commands run" % sum([command["runs"] for command in stats.values()])]
+
+        for name, command in stats.items():
+            lines.append("* %s: %d runs, %.2f ms total (%.0f%% output), p50 %.3f ms, p99 %.3f ms, max %.3f ms, "
+                         "%d characters out per run" % (
+                             name, command["runs"], command["total_time"] * 1000.0,
+                             command["output_time"] * 100.0 / command["total_time"] if command["total_time"] > 0 else 0,
+                             command["p50"] * 1000.0, command["p99"] * 1000.0, command["max"] * 1000.0,
+                             command["output_characters"] // command["runs"]))
+
+        return lines
+
+    """Writes the statistics to a file as JSON
+
+    Attributes:
+        file_name: The file to write
+    """
+    def dump(self, file_name):
+        with open(file_name, "w") as dump_file:
+            json.dump({"time": time.time(), "commands": self.get_stats()}, dump_file, indent=2)
@@ -0,0 +1,61 @@
+"""Server settings. The defaults here can be overridden from the command line (see __main__.py)
+
+Attributes:
+    network_mode: "threaded" runs two threads per connected client, "asyncio" runs every client on one event loop
+    bind_ip: The IP the server listens on. If None, the primary network IP is found automatically
+    game_port: The TCP port that the game will run on
+    tick_rate: Game ticks per second
+    max_frame_size: The largest message accepted from a client, in bytes. Clients sending more are disconnected
+    compression_level: zlib level (1-9) used for clients that ask for compressed output
+    admin_accounts: Names of the accounts allowed to use administrator commands
+    database_file: The SQLite database holding accounts, players, rooms and items
+    wal_autocheckpoint: Size the database's write-ahead log grows to, in pages, before it is copied back into the database
+    max_connections: Most clients connected at once. Connections beyond this wait in a queue
+    max_connections_per_ip: Most connections, connected or waiting, from one IP address
+    accept_rate: New connections accepted per second, on average
+    accept_burst: New connections that can be accepted at once before accept_rate applies
+    max_waiting_connections: Most connections waiting for a place. Connections beyond this are refused
+    max_output_messages: Most messages queued for a client that isn't reading them fast enough
+    max_output_size: Most text queued for a client, in characters
+    output_policies: What happens when a client's output queue is full: any of "collapse", "drop" and "disconnect" (see
+                     OutputQueue)
+    output_grace_period: Seconds a client's output queue can stay full before the "disconnect" policy removes the client
+    tick_profile_interval: Seconds between printouts of the tick profile (see TickProfiler). 0 never prints it
+    command_stats: Whether to time every player and item command (see CommandStats). Admins can also turn it on and off
+                   with the 'timings' command
+    command_stats_file: The file 'timings dump' and shutting down write the command timings to
+    metrics_bind_ip: The IP the metrics (see Metrics.py) are served on. Local only by default
+    metrics_port: The HTTP port the metrics are served on, at /metrics. 0 doesn't serve them
+    auth_workers: Threads checking logins and registrations. 0 checks them on the game thread
+    persistence_queue_size: Most saves waiting to be written to the database before saving blocks the game loop
+"""
+
+
+class Config:
+    NETWORK_MODES = ["threaded", "asyncio"]
+
+    network_mode = "threaded"
+    bind_ip = None
+    game_port = 9123
+    tick_rate = 10
+    max_frame_size = 1024 * 1024
+    compression_level = 6
+    admin_accounts = ["LXShadow"]
+    database_file = "world.db"
+    wal_autocheckpoint = 1000
+    max_connections = 500
+    max_connections_per_ip = 16
+    accept_rate = 20
+    accept_burst = 50
+    max_waiting_connections = 200
+    max_output_messages = 1000
+    max_output_size = 1024 * 1024
+    output_policies = ["collapse", "drop", "disconnect"]
+    output_grace_period = 30.0
+    tick_profile_interval = 300
+    command_stats = False
+    command_stats_file = "command_stats.json"
+    metrics_bind_ip = "127.0.0.1"
+    metrics_port = 9124
+    auth_workers = 2
+    persistence_queue_size = 16
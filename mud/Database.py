@@ -1,34 +1,86 @@
+import os
 import sqlite3
 import json
 
 from Item import Item
+from Config import Config
 
-"""Handles persistent data in the game, including accounts, etc"""
+"""Handles persistent data in the game, including accounts, etc
+
+Everything is kept in one database (Config.database_file). Databases from older versions of the server, which kept
+each table in its own file, are migrated into it automatically the first time the server starts (see Migrate.py).
+
+The database runs in WAL mode, so reading (e.g. the character list) never waits for the persistence worker's writes,
+and commits don't wait for the disk with synchronous=NORMAL. A crash can lose the last few commits, but can't corrupt the
+database. The game's queries go through the functions below, which all use constant SQL strings: sqlite3 keeps each
+connection's compiled statements in a cache keyed by the SQL, so every query is compiled only once.
+
+Attributes:
+    connection: The game thread's connection to the database
+    item_definitions: The items that can be spawned, indexed by item ID
+"""
 
 class Database:
-    account_db = None
-    room_db = None
-    player_db = None
-    item_db = None
+    connection = None
 
     item_definitions = {}
 
+    # The number of compiled statements each connection keeps
+    STATEMENT_CACHE_SIZE = 64
+
+    # The game's queries
+    SQL_GET_ACCOUNT = "SELECT passhash, salt FROM player_accounts WHERE name = ?"
+    SQL_ADD_ACCOUNT = "INSERT INTO player_accounts (name, passhash, salt) VALUES (?, ?, ?)"
+    SQL_GET_ACCOUNT_CHARACTERS = "SELECT character_name FROM players WHERE account_name = ? ORDER BY rowid"
+    SQL_GET_CHARACTER_ACCOUNT = "SELECT account_name FROM players WHERE character_name = ?"
+    SQL_GET_PLAYER = "SELECT last_room, inventory FROM players WHERE character_name = ?"
+    SQL_ADD_PLAYER = "INSERT INTO players (account_name, character_name, last_room, inventory) VALUES (?, ?, ?, ?)"
+    SQL_SAVE_PLAYER = "UPDATE players SET last_room = ?, inventory = ? WHERE character_name = ?"
+    SQL_SAVE_ROOM = "UPDATE rooms SET items = ? WHERE title = ?"
+    SQL_GET_ROOMS = "SELECT title, description, connections, items FROM rooms ORDER BY rowid"
+    SQL_GET_ITEMS = "SELECT id, name, entry_description, commands FROM items"
+
+    # The tables and their indexes. Every lookup the game does by name has a primary key or index to use
+    schema = [
+        """CREATE TABLE IF NOT EXISTS player_accounts(
+            name TEXT PRIMARY KEY,
+            passhash TEXT NOT NULL,
+            salt BLOB NOT NULL)""",
+        """CREATE TABLE IF NOT EXISTS players(
+            character_name TEXT PRIMARY KEY,
+            account_name TEXT NOT NULL,
+            last_room TEXT,
+            inventory TEXT NOT NULL DEFAULT '[]')""",
+        "CREATE INDEX IF NOT EXISTS players_by_account ON players(account_name)",
+        """CREATE TABLE IF NOT EXISTS rooms(
+            title TEXT PRIMARY KEY,
+            description TEXT NOT NULL,
+            connections TEXT NOT NULL,
+            items TEXT)""",
+        """CREATE TABLE IF NOT EXISTS items(
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            entry_description TEXT,
+            commands TEXT NOT NULL)"""
+    ]
+
     @staticmethod
     def startup():
-        # Load the SQL databases
-        Database.account_db = sqlite3.connect("accounts.db")
-        Database.room_db = sqlite3.connect("rooms.db")
-        Database.player_db = sqlite3.connect("players.db")
-        Database.item_db = sqlite3.connect("items.db")
-
-        # Create account tables if they don't exist
-        Database.account_db.execute("CREATE TABLE IF NOT EXISTS player_accounts(name, passhash, salt)")
-        Database.room_db.execute("CREATE TABLE IF NOT EXISTS rooms(title, description, connections, items)")
-        Database.player_db.execute("CREATE TABLE IF NOT EXISTS players(account_name, character_name, last_room, inventory)")
-        Database.item_db.execute("CREATE TABLE IF NOT EXISTS items(id, name, entry_description, commands)")
+        is_new_database = not os.path.exists(Config.database_file)
+
+        # Load the SQL database
+        Database.connection = Database.connect()
+
+        # Create the tables if they don't exist
+        Database.create_tables(Database.connection)
+
+        # Bring over the data from the old separate databases, if there are any
+        if is_new_database:
+            from Migrate import Migrate
+            Migrate.migrate(os.path.dirname(os.path.abspath(Config.database_file)), Database.connection)
 
         # Load items into the item definitions
-        cursor = Database.item_db.execute("SELECT * FROM items")
+        cursor = Database.connection.execute(Database.SQL_GET_ITEMS)
         items = cursor.fetchall()
 
         for item in items:
@@ -36,18 +88,85 @@ class Database:
 
     @staticmethod
     def shutdown():
-        # Save and disconnect databases
-        Database.account_db.commit()
-        Database.account_db.close()
+        # Save and disconnect the database
+        Database.connection.commit()
+        Database.connection.close()
+
+    """Opens a connection to the database with the server's settings. Each thread using the database needs its own
+
+    Returns: The connection"""
+    @staticmethod
+    def connect():
+        connection = sqlite3.connect(Config.database_file, cached_statements=Database.STATEMENT_CACHE_SIZE)
+
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA wal_autocheckpoint = %d" % Config.wal_autocheckpoint)
+        connection.execute("PRAGMA busy_timeout = 5000")
+
+        return connection
+
+    """Returns an account's (password hash, salt), or None if the account doesn't exist
+
+    Attributes:
+        connection: The connection to use, if not the game thread's
+    """
+    @staticmethod
+    def get_account(name, connection=None):
+        connection = connection or Database.connection
 
-        Database.room_db.commit()
-        Database.room_db.close()
+        return connection.execute(Database.SQL_GET_ACCOUNT, (name,)).fetchone()
 
-        Database.player_db.commit()
-        Database.player_db.close()
+    """Adds an account and commits it
 
-        Database.item_db.commit()
-        Database.item_db.close()
+    Attributes:
+        connection: The connection to use, if not the game thread's
+    """
+    @staticmethod
+    def add_account(name, passhash, salt, connection=None):
+        connection = connection or Database.connection
+
+        with connection:
+            connection.execute(Database.SQL_ADD_ACCOUNT, (name, passhash, salt))
+
+    """Returns the names of an account's characters, oldest first"""
+    @staticmethod
+    def get_account_characters(account_name):
+        return [row[0] for row in Database.connection.execute(Database.SQL_GET_ACCOUNT_CHARACTERS, (account_name,))]
+
+    """Returns the name of the account a character belongs to, or None if there is no such character"""
+    @staticmethod
+    def get_character_account(character_name):
+        row = Database.connection.execute(Database.SQL_GET_CHARACTER_ACCOUNT, (character_name,)).fetchone()
+
+        return row[0] if row is not None else None
+
+    """Returns a player's saved (last room, inventory as JSON), or None if the player has never been saved"""
+    @staticmethod
+    def get_player(character_name):
+        return Database.connection.execute(Database.SQL_GET_PLAYER, (character_name,)).fetchone()
+
+    """Adds a player and commits it"""
+    @staticmethod
+    def add_player(account_name, character_name, last_room, inventory):
+        with Database.connection:
+            Database.connection.execute(Database.SQL_ADD_PLAYER, (account_name, character_name, last_room, inventory))
+
+    """Returns every room as (title, description, connections, items) tuples, in the order they were created"""
+    @staticmethod
+    def get_rooms():
+        return Database.connection.execute(Database.SQL_GET_ROOMS).fetchall()
+
+    """Creates the tables and indexes in a database, if they don't exist already
+
+    Attributes:
+        connection: The connection to the database
+    """
+    @staticmethod
+    def create_tables(connection):
+        with connection:
+            for statement in Database.schema:
+                connection.execute(statement)
 
     """Provides a safe method to dump json from the database"""
     @staticmethod
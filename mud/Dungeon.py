@@ -1,13 +1,15 @@
-import socket
 from Room import Room
-from Item import Item
 from Player import Player
 from Client import Client
 from Database import Database
+from Persistence import Persistence
+from AuthPool import AuthPool
+from Config import Config
+from OutputQueue import OutputQueue
+from TickProfiler import TickProfiler
+from CommandStats import CommandStats
 
 import queue
-import json
-import sqlite3
 import datetime
 
 """A dungeon containing players, and a map of hazardous precarious rooms or 'zones' to survive.
@@ -15,19 +17,38 @@ import datetime
 Attributes:
     entry_room: The name of the room players begin in when they enter the game
     rooms: A name-indexed map of rooms in this dungeon
+    dirty_rooms: The rooms that have changed since the last save
+    persistence: The worker writing saved rooms and players to the databases
+    auth_pool: The workers checking logins and registrations for the clients
+    admission: The server's admission control for new connections, if there is one. Set by the server
+    tick_scheduler: The TickScheduler running the game loop, if there is one
+    profiler: Measures how long each phase of the tick takes
+    command_stats: Times every player and item command, if it's on (see Config.command_stats). Otherwise None
+    departed_traffic: The traffic statistics (Client.TRAFFIC_STATS) of the clients that have left, summed
     
     player: The list of players in this dungeon
+    players_by_account: Online players indexed by account name
+    players_by_name: Lists of online players indexed by case-folded character name. Names can be shared after a rename
 """
 
 
 class Dungeon:
     def __init__(self):
         # Load the rooms from the database
-        cursor = Database.room_db.execute("SELECT * FROM rooms")
-        room_list = cursor.fetchall()
+        room_list = Database.get_rooms()
 
         self.last_backup_time = 0
         self.rooms = {}
+        self.dirty_rooms = set()
+        self.persistence = Persistence(Config.persistence_queue_size)
+        self.auth_pool = AuthPool(Config.auth_workers)
+        self.admission = None
+
+        # The scheduler running the dungeon's ticks, if any. Set by the game
+        self.tick_scheduler = None
+        self.profiler = TickProfiler(1.0 / Config.tick_rate, Config.tick_profile_interval)
+        self.command_stats = CommandStats() if Config.command_stats else None
+        self.departed_traffic = {name: 0 for name in Client.TRAFFIC_STATS}
 
         for index, room in enumerate(room_list):
             try:
@@ -60,6 +81,8 @@ class Dungeon:
 
         # Create player and client list
         self.players = []
+        self.players_by_account = {}
+        self.players_by_name = {}
         self.clients = []
         self.incoming_clients = queue.Queue()
 
@@ -73,22 +96,33 @@ class Dungeon:
     Updates all necessary objects, players, etc in the dungeon
     """
     def update(self):
+        profiler = self.profiler
+        profiler.start_tick()
+
         # Add new queued clients
         while not self.incoming_clients.empty():
             self.clients.append(self.incoming_clients.get(False))
 
+        profiler.end_phase(TickProfiler.PHASE_INCOMING)
+
         # Update clients
         for client in self.clients:
             client.update()
 
+        profiler.end_phase(TickProfiler.PHASE_CLIENTS)
+
         # Update room events
         for index, room in self.rooms.items():
             room.update()
 
+        profiler.end_phase(TickProfiler.PHASE_ROOMS)
+
         # Update players
         for player in self.players:
             player.update()
 
+        profiler.end_phase(TickProfiler.PHASE_PLAYERS)
+
         # Remove disconnected clients
         client_id = 0
         while client_id < len(self.clients):
@@ -97,22 +131,41 @@ class Dungeon:
                     # Inform the world that the player is leaving
                     self.broadcast("<+info>%s has left the game.<-info>" % self.clients[client_id].player.name)
 
-                    # Remove the player from the player list
+                    # Remove the player from the dungeon
                     self.clients[client_id].player.destroy()
-                    self.players.remove(self.clients[client_id].player)
+                    self.remove_player(self.clients[client_id].player)
+
+                # Remove the client, keeping its traffic in the totals
+                for name in Client.TRAFFIC_STATS:
+                    self.departed_traffic[name] += getattr(self.clients[client_id], name)
+
+                if self.clients[client_id].on_removed is not None:
+                    self.clients[client_id].on_removed()
 
-                # Remove the client
                 self.clients.remove(self.clients[client_id])
             else:
                 client_id += 1
 
+        profiler.end_phase(TickProfiler.PHASE_PRUNE)
+
         # Backup the dungeon every so often
         if datetime.datetime.now().minute != self.last_backup_time:
-            print("Backing up dungeon...")
             self.last_backup_time = datetime.datetime.now().minute
-            self.save()
+            num_players_saved, num_rooms_saved = self.save()
+
+            if num_players_saved > 0 or num_rooms_saved > 0:
+                print("Backed up dungeon: %d players and %d rooms changed" % (num_players_saved, num_rooms_saved))
+
+            profiler.end_phase(TickProfiler.PHASE_BACKUP)
+
+        # Send everything output during this tick, one message per client
+        for client in self.clients:
+            client.flush_output()
+
+        profiler.end_phase(TickProfiler.PHASE_FLUSH)
+        profiler.end_tick()
 
-    """Destroys the dungeon and saves everything. In that order."""
+    """Destroys the dungeon and saves everything. In that order. Returns once everything has been written"""
     def destroy(self):
         self.save()
 
@@ -120,16 +173,41 @@ class Dungeon:
             if client.player is not None:
                 client.player.destroy()
 
-    """Saves everything in the dungeon"""
+        self.auth_pool.shutdown()
+        self.persistence.stop()
+
+        if self.command_stats is not None:
+            self.command_stats.dump(Config.command_stats_file)
+
+    """Saves everything in the dungeon that has changed since the last save. The changes are snapshotted here and
+    written in the background, in one batch
+
+    Returns: A (players saved, rooms saved) tuple"""
     def save(self):
-        # Save clients
+        # Snapshot players
+        snapshots = []
         for client in self.clients:
             if client.player is not None:
-                client.player.save()
+                snapshot = client.player.make_snapshot()
+
+                if snapshot is not None:
+                    snapshots.append(snapshot)
+
+        num_players_saved = len(snapshots)
+
+        # Snapshot rooms
+        for room in self.dirty_rooms:
+            snapshot = room.make_snapshot()
+
+            if snapshot is not None:
+                snapshots.append(snapshot)
 
-        # Save rooms
-        for room in self.rooms:
-            self.rooms[room].save()
+        self.dirty_rooms.clear()
+
+        # Hand them to the persistence worker
+        self.persistence.save(snapshots)
+
+        return num_players_saved, len(snapshots) - num_players_saved
 
     """Adds a player to the dungeon
     
@@ -141,15 +219,72 @@ class Dungeon:
         new_player = Player(self, client)
 
         self.players.append(new_player)
+        self.players_by_account[client.account_name] = new_player
+        self.players_by_name.setdefault(new_player.name.casefold(), []).append(new_player)
 
         return new_player
 
+    """Removes a player from the dungeon and their room
+
+    Attributes:
+        player: The player to remove
+    """
+    def remove_player(self, player):
+        player.room.remove_player(player)
+        self.players.remove(player)
+
+        if self.players_by_account.get(player.client.account_name) is player:
+            del self.players_by_account[player.client.account_name]
+
+        self.remove_player_name(player)
+
+    """Changes a player's name, keeping the name index up to date
+
+    Attributes:
+        player: The player to rename
+        new_name: The player's new name
+    """
+    def rename_player(self, player, new_name):
+        self.remove_player_name(player)
+        player.name = new_name
+        self.players_by_name.setdefault(new_name.casefold(), []).append(player)
+
+    """Removes a player from the name index under their current name"""
+    def remove_player_name(self, player):
+        players_with_name = self.players_by_name.get(player.name.casefold())
+
+        if players_with_name is not None and player in players_with_name:
+            players_with_name.remove(player)
+
+            if len(players_with_name) == 0:
+                del self.players_by_name[player.name.casefold()]
+
+    """Finds online players by character name, ignoring case
+
+    Attributes:
+        name: The name to look for
+    Returns: A list of the players with that name"""
+    def find_players(self, name):
+        return self.players_by_name.get(name.casefold(), [])
+
+    """Returns whether a player is already in the game on the given account"""
+    def is_account_online(self, account_name):
+        return account_name in self.players_by_account
+
     """Adds a new client to the dungeon. Thread-safe
     
     Attributes:
-        client_socket: The socket of the player joining the dungeon"""
-    def add_client(self, client_socket):
-        self.incoming_clients.put(Client(self, client_socket))
+        client_socket: The socket of the player joining the dungeon
+        use_threads: Whether the client runs its own networking threads. False if the caller does the networking
+        on_removed: Function called once the client has left and been removed from the dungeon
+    Returns: The new client"""
+    def add_client(self, client_socket, use_threads=True, on_removed=None):
+        new_client = Client(self, client_socket, use_threads)
+        new_client.on_removed = on_removed
+
+        self.incoming_clients.put(new_client)
+
+        return new_client
 
     """Broadcasts a text to all players in the dungeon
     
@@ -160,4 +295,59 @@ class Dungeon:
     def broadcast(self, text_to_broadcast, exclude_players = None):
         for player in self.players:
             if exclude_players is None or player not in exclude_players:
-                player.output(text_to_broadcast)
+                player.output(text_to_broadcast, OutputQueue.PRIORITY_LOW)
+
+    """Returns output queue statistics, summed over the connected clients
+
+    Attributes:
+        num_deepest: The number of clients with the most output queued to list
+    Returns: A dictionary with the number of messages and characters queued, messages dropped and collapsed in total,
+             clients disconnected for not keeping up, and the clients with the most output queued as (name, messages,
+             characters) tuples"""
+    def get_output_queue_stats(self, num_deepest=5):
+        depths = []
+
+        for client in list(self.clients):
+            messages, size = client.output_queue.get_depth()
+
+            if messages > 0:
+                name = client.player.name if client.player is not None else "Session %d" % client.session_id
+                depths.append((name, messages, size))
+
+        depths.sort(key=lambda depth: depth[2], reverse=True)
+
+        return {
+            "messages": sum([depth[1] for depth in depths]),
+            "size": sum([depth[2] for depth in depths]),
+            "dropped": sum([client.output_queue.num_dropped for client in self.clients]),
+            "collapsed": sum([client.output_queue.num_collapsed for client in self.clients]),
+            "slow_disconnects": Client.num_slow_disconnects,
+            "deepest": depths[:num_deepest]
+        }
+
+    """Returns output compression statistics, summed over the connected clients
+    
+    Returns: A dictionary with the number of clients compressing, bytes before and after compression, and the CPU time
+             spent compressing in seconds"""
+    def get_compression_stats(self):
+        compressing_clients = [client for client in list(self.clients) if client.compressor is not None]
+
+        return {
+            "clients": len(compressing_clients),
+            "bytes_in": sum([client.compression_bytes_in for client in compressing_clients]),
+            "bytes_out": sum([client.compression_bytes_out for client in compressing_clients]),
+            "time": sum([client.compression_time for client in compressing_clients])
+        }
+
+    """Returns traffic statistics, summed over every client since the server started
+
+    Returns: A dictionary with the packets received and sent, their size in bytes, and the time spent unpacking and
+             packing them in seconds (see Client.TRAFFIC_STATS)"""
+    def get_traffic_stats(self):
+        stats = dict(self.departed_traffic)
+
+        for client in list(self.clients):
+            for name in Client.TRAFFIC_STATS:
+                stats[name] += getattr(client, name)
+
+        return stats
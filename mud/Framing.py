@@ -0,0 +1,189 @@
+import collections
+import itertools
+import struct
+
+"""
+Message framing on the TCP stream. Every packet is preceded by its size:
+
+    size (2 bytes, little endian), or for packets of LONG_FRAME bytes and over:
+    LONG_FRAME (2 bytes), size (4 bytes, little endian)
+
+Packets under LONG_FRAME bytes are framed exactly as they always were, so old clients still understand them.
+"""
+
+LONG_FRAME = 0xFFFF
+
+short_header = struct.Struct("<H")
+long_header = struct.Struct("<HI")
+
+
+"""Returns the size header to send before a packet
+
+Attributes:
+    size: The size of the packet in bytes
+"""
+def encode_header(size):
+    if size < LONG_FRAME:
+        return short_header.pack(size)
+    else:
+        return long_header.pack(LONG_FRAME, size)
+
+
+"""
+Receive buffer that splits the TCP stream back into packets. Data is received straight into one reusable buffer with
+recv_into, and every complete packet in it is parsed after each receive.
+
+Attributes:
+    buffer: The receive buffer. Grows if a packet doesn't fit into it
+    start: Where the unparsed data starts in the buffer
+    end: Where the received data ends in the buffer
+    max_frame_size: The largest packet accepted, in bytes. Larger packets raise a ValueError
+"""
+
+
+class FrameReader:
+    def __init__(self, max_frame_size, buffer_size=65536):
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+        self.max_frame_size = max_frame_size
+
+    """Receives whatever data is available on a socket, blocking until there is some
+
+    Attributes:
+        sock: The socket to receive from
+    Returns: The number of bytes received. 0 means the connection was closed"""
+    def recv_from(self, sock):
+        self.make_space()
+
+        num_bytes = sock.recv_into(self.view[self.end:])
+        self.end += num_bytes
+
+        return num_bytes
+
+    """Makes room at the end of the buffer for more data, by moving the unparsed data to the front or growing the buffer"""
+    def make_space(self):
+        if self.start == self.end:
+            # Everything has been parsed, start again from the front
+            self.start = self.end = 0
+        elif self.end == len(self.buffer):
+            unparsed_size = self.end - self.start
+
+            if self.start > 0:
+                # Move the unparsed data to the front (through a copy, as the two areas may overlap)
+                self.buffer[0:unparsed_size] = bytes(self.view[self.start:self.end])
+            else:
+                # The buffer is full of one incomplete packet, so make a bigger one
+                bigger_buffer = bytearray(len(self.buffer) * 2)
+                bigger_buffer[0:unparsed_size] = self.view[0:unparsed_size]
+
+                self.buffer = bigger_buffer
+                self.view = memoryview(self.buffer)
+
+            self.start = 0
+            self.end = unparsed_size
+
+    """Yields every complete packet received so far, without its size header. Each packet is a memoryview into the
+    buffer, so it must be used before the next call to recv_from"""
+    def frames(self):
+        while True:
+            available = self.end - self.start
+
+            # Read the size header
+            if available < short_header.size:
+                return
+
+            header_size = short_header.size
+            frame_size = short_header.unpack_from(self.buffer, self.start)[0]
+
+            if frame_size == LONG_FRAME:
+                if available < long_header.size:
+                    return
+
+                header_size = long_header.size
+                frame_size = long_header.unpack_from(self.buffer, self.start)[1]
+
+            if frame_size > self.max_frame_size:
+                raise ValueError("Packet of %d bytes is larger than the limit of %d" % (frame_size, self.max_frame_size))
+
+            # Wait for the rest of the packet
+            if available < header_size + frame_size:
+                return
+
+            frame_start = self.start + header_size
+            self.start = frame_start + frame_size
+
+            yield self.view[frame_start:self.start]
+
+
+"""
+Per-connection write buffer. Packets and their size headers are queued as separate buffers, without being joined
+together, and sent with as few sendmsg calls as possible. Partial writes resume where they left off.
+
+Attributes:
+    buffers: The queued buffers, oldest first. The first one may have been partly sent already
+    size: The number of bytes waiting to be sent
+"""
+
+
+class FrameWriter:
+    # Most buffers handed to one sendmsg call (kept well under the usual IOV_MAX of 1024)
+    MAX_BUFFERS_PER_SEND = 64
+
+    def __init__(self):
+        self.buffers = collections.deque()
+        self.size = 0
+
+    """Queues a packet to be sent, framed with its size header
+
+    Attributes:
+        packet: The packet as bytes
+    """
+    def add(self, packet):
+        self.add_buffer(encode_header(len(packet)))
+        self.add_buffer(packet)
+
+    """Queues raw data to be sent"""
+    def add_buffer(self, data):
+        self.buffers.append(memoryview(data))
+        self.size += len(data)
+
+    """Sends everything queued, blocking until it has all been sent
+
+    Attributes:
+        sock: The (blocking) socket to send to
+    """
+    def send_to(self, sock):
+        while self.size > 0:
+            buffers = list(itertools.islice(self.buffers, 0, FrameWriter.MAX_BUFFERS_PER_SEND))
+            self.consume(FrameWriter.send_some(sock, buffers))
+
+    """Removes sent bytes from the front of the queue
+
+    Attributes:
+        num_bytes: The number of bytes that were sent
+    """
+    def consume(self, num_bytes):
+        self.size -= num_bytes
+
+        while num_bytes > 0:
+            first_buffer = self.buffers[0]
+
+            if num_bytes >= len(first_buffer):
+                num_bytes -= len(first_buffer)
+                self.buffers.popleft()
+            else:
+                # Partly sent: keep the rest
+                self.buffers[0] = first_buffer[num_bytes:]
+                num_bytes = 0
+
+    """Sends as much of a list of buffers as the socket will take in one call, returning the number of bytes sent"""
+    @staticmethod
+    def send_some(sock, buffers):
+        if hasattr(sock, "sendmsg"):
+            return sock.sendmsg(buffers)
+        else:
+            # No scatter/gather on this platform (Windows), so join the buffers instead
+            return sock.send(b"".join(buffers))
+
@@ -1,12 +1,15 @@
-import time
 import threading
 
 from Dungeon import Dungeon
 from Player import Player
 from Room import Room
 from Server import Server
+from AsyncServer import AsyncServer
+from Config import Config
+from TickScheduler import TickScheduler
 from Global import Global
 from Database import Database
+from Metrics import MetricsExporter
 
 """The game! This is where everything runs.
 
@@ -14,6 +17,7 @@ Creating it runs it
 
 Attributes:
     dungeon: The dungeon the game takes place in!
+    metrics: Serves the server's metrics over HTTP, if Config.metrics_port is set
     player: The local player; this will change when this game is translated to a MUD.
     do_shutdown: If there is a local client for testing, closing the local client will close the server for convenience.
 """
@@ -33,7 +37,14 @@ class Game:
         self.dungeon = Dungeon()
 
         # Create the server interface
-        self.server = Server(self.dungeon)
+        if Config.network_mode == "asyncio":
+            self.server = AsyncServer(self.dungeon)
+        else:
+            self.server = Server(self.dungeon)
+
+        # Serve the metrics
+        self.metrics = MetricsExporter(self.dungeon, Config.metrics_bind_ip, Config.metrics_port) \
+            if Config.metrics_port > 0 else None
 
         # Create a client for the local player (for testing).
         self.do_shutdown = False
@@ -45,13 +56,13 @@ class Game:
         # Shut down the database
         Database.shutdown()
 
-    """The main game loop. This updates the dungeons and all player events"""
+    """The main game loop. This updates the dungeons and all player events at the configured tick rate"""
     def game_loop(self):
-        while not self.do_shutdown:
-            # Update the game
-            self.dungeon.update()
+        self.tick_scheduler = TickScheduler(Config.tick_rate)
+        self.dungeon.tick_scheduler = self.tick_scheduler
 
-            time.sleep(0.1)
+        # Update the game until shutdown
+        self.tick_scheduler.run(self.dungeon.update, lambda: self.do_shutdown)
 
         self.dungeon.destroy()
 
@@ -71,7 +71,7 @@ class Item:
 
     def cmd_give(self, player, parameters):
         if len(parameters) > 0:
-            target_player = [p for p in player.dungeon.players if p.room == player.room and p.name.lower() == parameters[0].lower()]
+            target_player = [p for p in player.dungeon.find_players(parameters[0]) if p.room == player.room]
 
             if len(target_player) > 0:
                 player.output("<event>You forcibly give the <+item>%s<-item> to <+player>%s<-player><-event><br>" % (self.name, target_player[0].name))
@@ -102,6 +102,7 @@ class Item:
             text = " ".join(parameters)
             player.output("<+event>You whisper to the <+item>%s<-item>...it will remember that.<-event><br>" % (self.name))
             self.custom_data["message"] = text
+            self.mark_dirty()
         else:
             player.output("<+info>Usage: whisper [item] [message]<-info><br>")
 
@@ -111,6 +112,13 @@ class Item:
         else:
             player.output("<+event>You squeak the <+item>%s<-item>. It makes a light, wheezing sound<-event><br>" % self.name)
 
+    """Marks whatever holds this item as needing to be saved. Call this whenever custom_data changes"""
+    def mark_dirty(self):
+        if self.room is not None:
+            self.room.mark_dirty()
+        elif self.player is not None:
+            self.player.is_dirty = True
+
     """Called when a player quits the game
     
     Attributes:
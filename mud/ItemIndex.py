@@ -0,0 +1,52 @@
+"""
+Index of a collection of items (the items in a room, or a player's inventory), so that the items a player types can be
+found without searching through them all. Keep it up to date by calling add and remove whenever an item enters or
+leaves the collection.
+
+Attributes:
+    by_name: Lists of items indexed by case-folded item name. Several items can share a name
+    by_command: Lists of items indexed by the item commands they support
+"""
+
+
+class ItemIndex:
+    def __init__(self, items=None):
+        self.by_name = {}
+        self.by_command = {}
+
+        if items is not None:
+            for item in items:
+                self.add(item)
+
+    """Adds an item to the index"""
+    def add(self, item):
+        self.by_name.setdefault(item.name.casefold(), []).append(item)
+
+        for command_name in item.commands:
+            self.by_command.setdefault(command_name, []).append(item)
+
+    """Removes an item from the index"""
+    def remove(self, item):
+        ItemIndex.remove_from(self.by_name, item.name.casefold(), item)
+
+        for command_name in item.commands:
+            ItemIndex.remove_from(self.by_command, command_name, item)
+
+    """Returns the list of items with a name, ignoring case. The list must not be modified"""
+    def find_by_name(self, name):
+        return self.by_name.get(name.casefold(), [])
+
+    """Returns the list of items supporting a command. The list must not be modified"""
+    def find_by_command(self, command_name):
+        return self.by_command.get(command_name, [])
+
+    """Removes an item from one of the index's lists, removing the list when it becomes empty"""
+    @staticmethod
+    def remove_from(index, key, item):
+        items = index.get(key)
+
+        if items is not None and item in items:
+            items.remove(item)
+
+            if len(items) == 0:
+                del index[key]
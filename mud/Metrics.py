@@ -0,0 +1,241 @@
+import collections
+import http.server
+import threading
+
+from Client import Client
+import Percentiles
+from TickProfiler import TickProfiler
+
+"""
+Serves the server's health as metrics in the Prometheus text format, over HTTP at /metrics, for monitoring to scrape.
+
+Nothing is counted for the exporter: the game loop and the network threads keep their statistics as they always do (see
+Dungeon.get_traffic_stats, TickProfiler, Persistence.get_stats, ...), each in variables only its own thread writes, and
+the exporter reads them on its own thread whenever it's scraped, one scrape at a time. Reading them without a lock can
+catch a client halfway through leaving and count its traffic twice for one scrape, so counters never report less than
+they have before.
+
+Attributes:
+    dungeon: The dungeon to report on
+    counter_values: The highest value reported for each counter, indexed by name and labels
+    http_server: The HTTP server, once it's running
+"""
+
+
+class MetricsExporter:
+    # Names of the client states, indexed by Client.STATE_*
+    STATE_NAMES = {
+        Client.STATE_INIT: "init",
+        Client.STATE_AUTHENTICATION: "authentication",
+        Client.STATE_REGISTERING: "registering",
+        Client.STATE_LOGGING_IN: "logging_in",
+        Client.STATE_CHARACTER_CREATION: "character_creation",
+        Client.STATE_INGAME: "ingame"
+    }
+
+    # Quantiles reported for durations
+    QUANTILES = [50, 90, 99, 100]
+
+    def __init__(self, dungeon, bind_ip, port):
+        self.dungeon = dungeon
+        self.counter_values = {}
+        self.http_server = None
+
+        # Start the HTTP thread
+        threading.Thread(name="metrics_thread", target=lambda: self.serve_thread(bind_ip, port), daemon=True).start()
+
+    """Thread running the HTTP server"""
+    def serve_thread(self, bind_ip, port):
+        try:
+            self.http_server = http.server.HTTPServer((bind_ip, port), MetricsRequestHandler)
+        except OSError as err:
+            print("Could not serve metrics on %s:%d: %s. Carrying on without them." % (bind_ip, port, err))
+            return
+
+        self.http_server.exporter = self
+
+        print("Serving metrics at http://%s:%d/metrics" % (bind_ip, port))
+        self.http_server.serve_forever()
+
+    """Returns every metric in the Prometheus text format"""
+    def get_metrics(self):
+        dungeon = self.dungeon
+        clients = list(dungeon.clients)
+        lines = []
+
+        # Clients and players
+        self.add_metric(lines, "mud_clients", "gauge", "Clients connected", len(clients))
+        self.add_metric(lines, "mud_players", "gauge", "Players in the game", len(dungeon.players))
+
+        states = collections.Counter([client.state for client in clients])
+        self.add_metric(lines, "mud_clients_by_state", "gauge", "Clients connected in each state",
+                        [({"state": name}, states[state])
+                         for state, name in sorted(MetricsExporter.STATE_NAMES.items())])
+
+        if dungeon.admission is not None:
+            admission = dungeon.admission.get_stats()
+
+            self.add_metric(lines, "mud_connections_waiting", "gauge", "Connections waiting for a place",
+                            admission["waiting"])
+            self.add_metric(lines, "mud_connections_refused_total", "counter", "Connections refused",
+                            admission["refused"])
+
+        # Queues
+        self.add_metric(lines, "mud_input_queue_messages", "gauge", "Inputs waiting for the game loop",
+                        sum([client.input_queue.qsize() + (client.player.input_queue.qsize()
+                                                           if client.player is not None else 0)
+                             for client in clients]))
+
+        output_queues = dungeon.get_output_queue_stats(0)
+
+        self.add_metric(lines, "mud_output_queue_messages", "gauge", "Messages waiting to be sent",
+                        output_queues["messages"])
+        self.add_metric(lines, "mud_output_queue_characters", "gauge", "Characters of text waiting to be sent",
+                        output_queues["size"])
+        self.add_metric(lines, "mud_output_dropped_total", "counter", "Messages dropped because a client fell behind",
+                        output_queues["dropped"])
+        self.add_metric(lines, "mud_slow_disconnects_total", "counter",
+                        "Clients disconnected for not reading their output", output_queues["slow_disconnects"])
+
+        # Traffic
+        traffic = dungeon.get_traffic_stats()
+
+        self.add_metric(lines, "mud_received_frames_total", "counter", "Packets received", traffic["frames_received"])
+        self.add_metric(lines, "mud_received_bytes_total", "counter", "Bytes of packets received",
+                        traffic["bytes_received"])
+        self.add_metric(lines, "mud_sent_frames_total", "counter", "Packets sent", traffic["frames_sent"])
+        self.add_metric(lines, "mud_sent_bytes_total", "counter", "Bytes of packets sent", traffic["bytes_sent"])
+        self.add_metric(lines, "mud_unpack_seconds_total", "counter", "Time spent decrypting received packets",
+                        traffic["unpack_time"])
+        self.add_metric(lines, "mud_pack_seconds_total", "counter", "Time spent encoding and encrypting sent packets",
+                        traffic["pack_time"])
+
+        # Ticks
+        # The profiler's lifetime counts, which 'profile reset' leaves alone
+        profiler = dungeon.profiler
+        scheduler = dungeon.tick_scheduler
+
+        if scheduler is not None:
+            self.add_summary(lines, "mud_tick_duration_seconds", "Duration of a game tick", {},
+                             list(scheduler.tick_durations), scheduler.total_tick_time, scheduler.num_ticks)
+        else:
+            self.add_summary(lines, "mud_tick_duration_seconds", "Duration of a game tick", {},
+                             [], sum(profiler.lifetime_phase_totals), profiler.lifetime_ticks)
+
+        self.add_metric(lines, "mud_slow_ticks_total", "counter", "Ticks that took longer than the tick budget",
+                        profiler.lifetime_slow_ticks)
+
+        for phase, name in enumerate(TickProfiler.PHASE_NAMES):
+            self.add_summary(lines, "mud_tick_phase_duration_seconds", "Duration of each phase of a game tick. The "
+                             "backup phase is the backup of the dungeon", {"phase": name},
+                             list(profiler.phase_durations[phase]), profiler.lifetime_phase_totals[phase],
+                             profiler.lifetime_phase_runs[phase], phase == 0)
+
+        if scheduler is not None:
+            ticks = scheduler.get_stats()
+
+            self.add_metric(lines, "mud_tick_overruns_total", "counter", "Ticks that ran past the next tick's start",
+                            ticks["overruns"])
+            self.add_metric(lines, "mud_ticks_skipped_total", "counter", "Ticks skipped to catch up",
+                            ticks["skipped_ticks"])
+
+        # Database writes
+        persistence = dungeon.persistence.get_stats()
+        write_durations = list(dungeon.persistence.write_durations)
+
+        self.add_metric(lines, "mud_sqlite_transactions_total", "counter", "Database transactions committed",
+                        persistence["transactions"])
+        self.add_metric(lines, "mud_sqlite_errors_total", "counter", "Database transactions that failed",
+                        persistence["errors"])
+        self.add_summary(lines, "mud_sqlite_write_seconds", "Duration of a database write", {}, write_durations,
+                         persistence["write_time"], dungeon.persistence.num_writes)
+        self.add_metric(lines, "mud_persistence_queue_batches", "gauge", "Saves waiting to be written to the database",
+                        persistence["queued_batches"])
+
+        return "\n".join(lines) + "\n"
+
+    """Adds a metric to the lines of the output
+
+    Attributes:
+        lines: The lines of the output
+        name: The name of the metric
+        metric_type: "counter" or "gauge"
+        description: What the metric measures
+        values: The value, or a list of (labels dictionary, value) tuples
+    """
+    def add_metric(self, lines, name, metric_type, description, values):
+        if type(values) != list:
+            values = [({}, values)]
+
+        lines.append("# HELP %s %s" % (name, description))
+        lines.append("# TYPE %s %s" % (name, metric_type))
+
+        for labels, value in values:
+            if metric_type == "counter":
+                value = self.get_counter_value(name, labels, value)
+
+            lines.append("%s%s %s" % (name, MetricsExporter.format_labels(labels), repr(value)))
+
+    """Adds a summary of durations to the lines of the output
+
+    Attributes:
+        lines: The lines of the output
+        name: The name of the metric
+        description: What the metric measures
+        labels: The labels of this summary
+        durations: The most recent durations, for the quantiles
+        total: The sum of every duration
+        count: The number of durations
+        add_header: Whether to add the help and type lines, before the first summary of this name
+    """
+    def add_summary(self, lines, name, description, labels, durations, total, count, add_header=True):
+        if add_header:
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s summary" % name)
+
+        percentiles = Percentiles.get_percentiles(durations, MetricsExporter.QUANTILES)
+
+        for percent, value in zip(MetricsExporter.QUANTILES, percentiles):
+            quantile_labels = dict(labels, quantile=repr(percent / 100.0) if percent < 100 else "1")
+            lines.append("%s%s %s" % (name, MetricsExporter.format_labels(quantile_labels), repr(value)))
+
+        lines.append("%s_sum%s %s" % (name, MetricsExporter.format_labels(labels),
+                                      repr(self.get_counter_value(name + "_sum", labels, total))))
+        lines.append("%s_count%s %s" % (name, MetricsExporter.format_labels(labels),
+                                        repr(self.get_counter_value(name + "_count", labels, count))))
+
+    """Returns a counter's value, or the highest value it has reported if that's higher"""
+    def get_counter_value(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        value = max(value, self.counter_values.get(key, value))
+
+        self.counter_values[key] = value
+        return value
+
+    """Returns labels in the text format, e.g. {state="ingame"}, or "" if there are none"""
+    @staticmethod
+    def format_labels(labels):
+        if len(labels) == 0:
+            return ""
+
+        return "{%s}" % ",".join(['%s="%s"' % (name, value) for name, value in sorted(labels.items())])
+
+
+"""Answers scrapes of /metrics"""
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.exporter.get_metrics().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    """Keeps scrapes out of the server log"""
+    def log_message(self, format, *args):
+        pass
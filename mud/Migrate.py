@@ -0,0 +1,90 @@
+import argparse
+import os
+import sqlite3
+
+from Config import Config
+
+"""
+Migrates the databases of older server versions, which kept each table in its own file without types or keys, into
+the single database used now. The server does this automatically when it starts without a database; this script can
+also be run by hand:
+
+    python Migrate.py [--source DIRECTORY] [--database FILE]
+
+Rows are copied as they are, except that players without an account or character name are left out, and where
+several rows share a primary key (an account or character name, room title or item ID) only the first is kept.
+Running it again only adds rows that aren't in the database yet.
+"""
+
+
+class Migrate:
+    # The old database files: (file name, table, columns). The tables keep their names in the new database
+    legacy_tables = [
+        ("accounts.db", "player_accounts", ["name", "passhash", "salt"]),
+        ("players.db", "players", ["account_name", "character_name", "last_room", "inventory"]),
+        ("rooms.db", "rooms", ["title", "description", "connections", "items"]),
+        ("items.db", "items", ["id", "name", "entry_description", "commands"])
+    ]
+
+    """Copies the data from the old database files into a database
+
+    Attributes:
+        source_directory: The directory containing the old database files. Missing files are skipped
+        connection: The connection to the new database. Its tables must already exist (see Database.create_tables)
+    Returns: A dictionary with the number of (rows copied, rows skipped) for each table"""
+    @staticmethod
+    def migrate(source_directory, connection):
+        results = {}
+
+        # Everything is copied in one transaction, so a failed migration leaves the database empty
+        with connection:
+            for file_name, table, columns in Migrate.legacy_tables:
+                file_path = os.path.join(source_directory, file_name)
+
+                if not os.path.exists(file_path):
+                    continue
+
+                legacy_connection = sqlite3.connect(file_path)
+
+                try:
+                    rows = legacy_connection.execute("SELECT %s FROM %s ORDER BY rowid" % (", ".join(columns), table)).fetchall()
+                except sqlite3.Error as err:
+                    print("Migration: couldn't read %s from %s: %s" % (table, file_name, err.args[0]))
+                    continue
+                finally:
+                    legacy_connection.close()
+
+                num_rows = len(rows)
+
+                if table == "players":
+                    # Players need an account and a character name
+                    rows = [row for row in rows if row[0] and row[1]]
+
+                num_copied = 0
+                for row in rows:
+                    num_copied += connection.execute("INSERT OR IGNORE INTO %s (%s) VALUES (%s)" % (
+                        table, ", ".join(columns), ", ".join(["?"] * len(columns))), row).rowcount
+
+                results[table] = (num_copied, num_rows - num_copied)
+                print("Migration: copied %d rows from %s, skipped %d" % (num_copied, file_name, num_rows - num_copied))
+
+        return results
+
+
+def main():
+    from Dungeon import Dungeon  # imported first, like Game does, to resolve the circular imports between modules
+    from Database import Database
+
+    parser = argparse.ArgumentParser(description="Migrate the old separate databases into one")
+    parser.add_argument("--source", default=".", help="directory containing accounts.db, players.db, rooms.db and items.db")
+    parser.add_argument("--database", default=Config.database_file, help="the database to migrate into")
+    args = parser.parse_args()
+
+    connection = sqlite3.connect(args.database)
+    Database.create_tables(connection)
+    Migrate.migrate(args.source, connection)
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
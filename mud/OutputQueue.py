@@ -0,0 +1,205 @@
+import collections
+import threading
+import time
+
+from Packet import Packet
+
+"""
+A client's queue of outgoing messages, bounded in both messages and bytes, so that a client that stops reading can't make
+the server's memory grow. Thread-safe: the game thread puts messages, and the client's sender takes them.
+
+While the queue is full, the policies decide what happens to new messages, in this order:
+* "collapse": a text message identical to the last one queued is counted as a repeat of it, instead of being queued
+* "drop": low-priority messages (broadcasts) are dropped. To make room for another message, the low-priority messages
+  already queued are dropped, oldest first
+* "disconnect": the client is disconnected once its queue has been full for Config.output_grace_period seconds (see
+  Client.queue_output)
+
+Whatever the policies, a full queue never grows: a message that still doesn't fit is dropped, and the client is told how
+many messages it missed once it catches up.
+
+Attributes:
+    entries: The queued messages as [message, priority, size, repeats] lists, oldest first
+    size: The total size of the queued messages, in characters of text
+    num_low_priority: Number of low-priority messages queued
+    full_since: The time (time.perf_counter) the queue became full, or None if it isn't full
+    num_unreported_drops: Number of messages dropped since the client was last told about it
+    num_dropped: Number of messages dropped in total
+    num_collapsed: Number of messages collapsed into a repeat of the message before
+"""
+
+
+class OutputQueue:
+    # Message priorities
+    PRIORITY_LOW = 0
+    PRIORITY_NORMAL = 1
+
+    # Policies for a full queue
+    POLICY_COLLAPSE = "collapse"
+    POLICY_DROP = "drop"
+    POLICY_DISCONNECT = "disconnect"
+    POLICIES = [POLICY_COLLAPSE, POLICY_DROP, POLICY_DISCONNECT]
+
+    def __init__(self, max_messages, max_size, policies):
+        self.max_messages = max_messages
+        self.max_size = max_size
+        self.policies = policies
+
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.entries = collections.deque()
+        self.size = 0
+        self.num_low_priority = 0
+        self.full_since = None
+
+        self.num_unreported_drops = 0
+        self.num_dropped = 0
+        self.num_collapsed = 0
+
+    """Queues a message to be sent
+
+    Attributes:
+        message: A (message type, payload) tuple as accepted by Packet.encode_message, or None to tell the sender to
+                 stop. None is always queued
+        priority: PRIORITY_LOW for messages that can be dropped when the client falls behind, otherwise PRIORITY_NORMAL
+    """
+    def put(self, message, priority=PRIORITY_NORMAL):
+        with self.lock:
+            size = OutputQueue.get_message_size(message)
+
+            if message is not None and self.is_full(size):
+                if self.full_since is None:
+                    self.full_since = time.perf_counter()
+
+                if not self.make_room(message, priority, size):
+                    return
+
+            self.entries.append([message, priority, size, 1])
+            self.size += size
+
+            if priority == OutputQueue.PRIORITY_LOW:
+                self.num_low_priority += 1
+
+            self.not_empty.notify()
+
+    """Takes every queued message
+
+    Attributes:
+        block: Whether to wait for a message if the queue is empty
+    Returns: A list of the messages, oldest first. Repeats are written into the message they repeat"""
+    def get_all(self, block=True):
+        with self.lock:
+            while block and len(self.entries) == 0:
+                self.not_empty.wait()
+
+            messages = [OutputQueue.add_repeats(message, repeats) for message, priority, size, repeats in self.entries]
+
+            # Tell the client what it missed, before the sender is told to stop
+            if self.num_unreported_drops > 0:
+                notice = (Packet.MESSAGE_OUTPUT, "<+error>%d messages to you were dropped because your connection "
+                                                 "couldn't keep up.<-error>" % self.num_unreported_drops)
+                messages.insert(messages.index(None) if None in messages else len(messages), notice)
+                self.num_unreported_drops = 0
+
+            self.entries.clear()
+            self.size = 0
+            self.num_low_priority = 0
+            self.full_since = None
+
+            return messages
+
+    """Returns whether there are no messages queued"""
+    def empty(self):
+        return len(self.entries) == 0
+
+    """Returns the number of seconds the queue has been full, or 0 if it isn't full"""
+    def get_full_time(self):
+        full_since = self.full_since
+
+        return time.perf_counter() - full_since if full_since is not None else 0.0
+
+    """Returns the queue's (number of messages, size)"""
+    def get_depth(self):
+        with self.lock:
+            return len(self.entries), self.size
+
+    """Returns whether a message of the given size doesn't fit. Call with the lock held"""
+    def is_full(self, size):
+        if len(self.entries) == 0:
+            # Always let one message through, however big
+            return False
+
+        return len(self.entries) >= self.max_messages or self.size + size > self.max_size
+
+    """Applies the policies to a message that doesn't fit. Call with the lock held
+
+    Returns: Whether the message should be queued now"""
+    def make_room(self, message, priority, size):
+        # Count the message as a repeat of the last one
+        if OutputQueue.POLICY_COLLAPSE in self.policies and OutputQueue.is_text(message) and \
+                self.entries[-1][0] == message:
+            self.entries[-1][3] += 1
+            self.num_collapsed += 1
+            return False
+
+        if OutputQueue.POLICY_DROP in self.policies:
+            if priority == OutputQueue.PRIORITY_LOW:
+                self.drop()
+                return False
+
+            # Drop queued broadcasts, oldest first, until the message fits
+            if self.num_low_priority > 0:
+                kept_entries = collections.deque()
+                num_entries = len(self.entries)
+
+                for entry in self.entries:
+                    if entry[1] == OutputQueue.PRIORITY_LOW and \
+                            (num_entries >= self.max_messages or self.size + size > self.max_size):
+                        num_entries -= 1
+                        self.size -= entry[2]
+                        self.num_low_priority -= 1
+                        self.drop()
+                    else:
+                        kept_entries.append(entry)
+
+                self.entries = kept_entries
+
+            if not self.is_full(size):
+                return True
+
+        self.drop()
+        return False
+
+    """Counts a dropped message. Call with the lock held"""
+    def drop(self):
+        self.num_unreported_drops += 1
+        self.num_dropped += 1
+
+    """Returns the approximate size of a message: the length of its payload"""
+    @staticmethod
+    def get_message_size(message):
+        if message is None:
+            return 0
+
+        payload = message[1]
+
+        if type(payload) == list:
+            return sum([len(text) for text in payload])
+        else:
+            return len(payload)
+
+    """Returns whether a message is text output"""
+    @staticmethod
+    def is_text(message):
+        return message[0] == Packet.MESSAGE_OUTPUT or message[0] == Packet.MESSAGE_OUTPUTS
+
+    """Returns a message with a note of how many times it was repeated, if it was repeated"""
+    @staticmethod
+    def add_repeats(message, repeats):
+        if repeats == 1:
+            return message
+
+        message_type, payload = message
+        texts = [payload] if message_type == Packet.MESSAGE_OUTPUT else list(payload)
+
+        return Packet.MESSAGE_OUTPUTS, texts + ["<+info>(repeated %d times)<-info>" % repeats]
@@ -1,5 +1,7 @@
 import json
 import base64
+import struct
+import zlib
 
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad
@@ -7,8 +9,65 @@ from Crypto.Util.Padding import unpad
 from Crypto.Random import get_random_bytes
 
 
-"""Packet encryption and validation manager"""
+"""Packet encryption and validation manager
+
+There are two wire formats. The JSON format wraps the base64-encoded IV and ciphertext in a JSON object, and messages
+from the server are JSON objects themselves. The binary format is a fixed header followed by the raw ciphertext:
+
+    magic (1 byte), version (1), message type (1), flags (1), session ID (4), packet ID (4), IV (16)
+
+In the binary format each side counts the packets it sends, and the receiver checks the packet ID against its own count
+of packets received. With the FLAG_GCM flag the data is encrypted with AES-GCM instead of AES-CBC: the nonce is made from
+the sender, session ID and packet ID, the IV field holds the authentication tag instead, and there is no padding.
+With the FLAG_COMPRESSED flag the data was compressed, before encryption, by the sender's zlib stream for the session.
+
+Binary packets start with BINARY_MAGIC, which can never start a JSON packet, so the formats can be told apart on
+receipt. Binary message data is encoded by encode_message: text as UTF-8, lists of text as length-prefixed UTF-8 strings.
+"""
 class Packet:
+    # Wire formats
+    FORMAT_JSON = "json"
+    FORMAT_BINARY = "binary"
+    FORMATS = [FORMAT_JSON, FORMAT_BINARY]
+
+    # Message types
+    MESSAGE_INPUT = 0
+    MESSAGE_OUTPUT = 1
+    MESSAGE_OUTPUTS = 2
+    MESSAGE_SALT = 3
+    MESSAGE_HELLO = 4
+
+    # Names of the message types in JSON messages
+    message_type_names = {
+        MESSAGE_OUTPUT: "output",
+        MESSAGE_OUTPUTS: "outputs",
+        MESSAGE_SALT: "salt"
+    }
+
+    # Ciphers. Both use AES with the session's key
+    CIPHER_CBC = "cbc"
+    CIPHER_GCM = "gcm"
+    CIPHERS = [CIPHER_CBC, CIPHER_GCM]
+
+    # Who sent a packet. Part of the GCM nonce, so that both directions can count packets from the same number
+    SENDER_SERVER = 0
+    SENDER_CLIENT = 1
+
+    # Compression methods for server output
+    COMPRESSION_NONE = "none"
+    COMPRESSION_ZLIB = "zlib"
+    COMPRESSIONS = [COMPRESSION_NONE, COMPRESSION_ZLIB]
+
+    # Binary format header
+    BINARY_MAGIC = 0xB7
+    BINARY_VERSION = 1
+    FLAG_GCM = 0x01
+    FLAG_COMPRESSED = 0x02
+    binary_header = struct.Struct("<BBBBII16s")
+    binary_header_authenticated_size = 12
+    text_length = struct.Struct("<I")
+    nonce = struct.Struct("<BxxxII")
+
     """Packages the packet and returns its data as bytes
 
     Attributes
@@ -34,7 +93,7 @@ class Packet:
             return None
 
     """Unpacks a packet and returns its data as bytes
-    
+
     Attributes
         data: The unencrypted packet data
         decryption_key: The key to decrypt the data with"""
@@ -42,7 +101,7 @@ class Packet:
     def unpack(data, decryption_key, session_id, packet_id):
         try:
             # Reconstruct the packet
-            packet = json.loads(data.decode("utf-8"))
+            packet = json.loads(str(data, "utf-8"))
 
             # Verify the message
             if packet["packet"] != packet_id or packet["session"] != session_id:
@@ -55,6 +114,157 @@ class Packet:
             data = unpad(cipher.decrypt(data), AES.block_size)
 
             return data
-        except err as Exception:
+        except (ValueError, KeyError, TypeError):
+            # Error unpacking packet -- return nothing
+            return None
+
+    """Packages a message in the binary format and returns the packet as bytes
+
+    Attributes
+        message_type: the type of message (Packet.MESSAGE_*)
+        data: the message data as bytes
+        encryption_key: the key to encrypt the data with
+        packet_id: the sender's packet counter. In the binary format, each direction counts its own packets
+        cipher: Packet.CIPHER_CBC or Packet.CIPHER_GCM
+        sender: who is sending the packet, Packet.SENDER_SERVER or Packet.SENDER_CLIENT
+        compressed: whether the data has been compressed by the session's compression stream
+    """
+    @staticmethod
+    def pack_binary(message_type, data, encryption_key, session_id, packet_id, cipher=CIPHER_CBC, sender=SENDER_SERVER,
+                    compressed=False):
+        try:
+            flags = Packet.FLAG_COMPRESSED if compressed else 0
+
+            if cipher == Packet.CIPHER_GCM:
+                # The nonce comes from the header, so only the authentication tag needs to be sent in the IV's place
+                header = Packet.binary_header.pack(Packet.BINARY_MAGIC, Packet.BINARY_VERSION, message_type,
+                                                   flags | Packet.FLAG_GCM, session_id, packet_id, bytes(16))
+                aead = AES.new(encryption_key, AES.MODE_GCM, nonce=Packet.make_nonce(sender, session_id, packet_id))
+                aead.update(header[:Packet.binary_header_authenticated_size])
+                ciphertext, tag = aead.encrypt_and_digest(data)
+
+                return header[:Packet.binary_header_authenticated_size] + tag + ciphertext
+            else:
+                iv = get_random_bytes(AES.block_size)
+                aes = AES.new(encryption_key, AES.MODE_CBC, iv)
+                header = Packet.binary_header.pack(Packet.BINARY_MAGIC, Packet.BINARY_VERSION, message_type, flags,
+                                                   session_id, packet_id, iv)
+
+                return header + aes.encrypt(pad(data, AES.block_size))
+        except Exception as err:
+            # Error encrypting packet
+            print("Encryption error: " + str(err))
+            return None
+
+    """Unpacks a binary packet. The cipher is read from the packet's flags
+
+    Attributes
+        packet: The packet as received
+        decryption_key: The key to decrypt the data with
+        packet_id: The packet counter expected from the sender
+        sender: who sent the packet, Packet.SENDER_SERVER or Packet.SENDER_CLIENT
+        decompressor: the session's zlib decompression stream, if compression is in use
+    Returns: A (message type, data as bytes) tuple, or None if the packet is invalid"""
+    @staticmethod
+    def unpack_binary(packet, decryption_key, session_id, packet_id, sender=SENDER_SERVER, decompressor=None):
+        try:
+            magic, version, message_type, flags, packet_session, packet_packet, iv = \
+                Packet.binary_header.unpack_from(packet)
+
+            # Verify the message
+            if magic != Packet.BINARY_MAGIC or version != Packet.BINARY_VERSION:
+                return None
+            if packet_packet != packet_id or packet_session != session_id:
+                return None
+
+            # Decrypt the message
+            if flags & Packet.FLAG_GCM:
+                # GCM also verifies that the header and data haven't been tampered with
+                aead = AES.new(decryption_key, AES.MODE_GCM, nonce=Packet.make_nonce(sender, session_id, packet_id))
+                aead.update(packet[:Packet.binary_header_authenticated_size])
+                data = aead.decrypt_and_verify(packet[Packet.binary_header.size:], iv)
+            else:
+                aes = AES.new(decryption_key, AES.MODE_CBC, iv)
+                data = unpad(aes.decrypt(packet[Packet.binary_header.size:]), AES.block_size)
+
+            # Decompress the message
+            if flags & Packet.FLAG_COMPRESSED:
+                if decompressor is None:
+                    return None
+
+                data = decompressor.decompress(data)
+
+            return message_type, data
+        except (ValueError, KeyError, struct.error, zlib.error):
             # Error unpacking packet -- return nothing
             return None
+
+    """Returns the GCM nonce for a packet. The key is unique to the session and the packet counter never repeats in a
+    direction, so the nonce is never reused with the same key"""
+    @staticmethod
+    def make_nonce(sender, session_id, packet_id):
+        return Packet.nonce.pack(sender, session_id, packet_id)
+
+    """Returns whether a received packet is in the binary format"""
+    @staticmethod
+    def is_binary(packet):
+        return len(packet) > 0 and packet[0] == Packet.BINARY_MAGIC
+
+    """Encodes a message's data for sending in the given wire format
+
+    Attributes
+        message_type: the type of message (Packet.MESSAGE_*)
+        payload: the message contents: a string for input and output, a list of strings for outputs, bytes for a salt
+        wire_format: Packet.FORMAT_JSON or Packet.FORMAT_BINARY
+    Returns: The encoded message as bytes, ready to be packed"""
+    @staticmethod
+    def encode_message(message_type, payload, wire_format):
+        if wire_format == Packet.FORMAT_BINARY:
+            if message_type == Packet.MESSAGE_OUTPUTS:
+                return b"".join([Packet.text_length.pack(len(text)) + text for text in
+                                 [text.encode() for text in payload]])
+            elif type(payload) == str:
+                return payload.encode()
+            else:
+                return payload
+        else:
+            # Player inputs are sent as plain text in the JSON format
+            if message_type == Packet.MESSAGE_INPUT:
+                return payload.encode()
+
+            packet_data = {"type": Packet.message_type_names[message_type]}
+
+            if message_type == Packet.MESSAGE_OUTPUT:
+                packet_data["text"] = payload
+            elif message_type == Packet.MESSAGE_OUTPUTS:
+                packet_data["texts"] = payload
+            elif message_type == Packet.MESSAGE_SALT:
+                packet_data["salt"] = payload.decode("utf-8")
+
+            return json.dumps(packet_data).encode()
+
+    """Decodes the data of a binary message sent by the server into the same form as a JSON message
+
+    Attributes
+        message_type: the type of message (Packet.MESSAGE_*)
+        data: the decrypted message data as bytes
+    Returns: A dictionary like those sent in the JSON format"""
+    @staticmethod
+    def decode_message(message_type, data):
+        if message_type == Packet.MESSAGE_OUTPUT:
+            return {"type": "output", "text": data.decode("utf-8")}
+        elif message_type == Packet.MESSAGE_OUTPUTS:
+            texts = []
+            position = 0
+
+            while position < len(data):
+                length = Packet.text_length.unpack_from(data, position)[0]
+                position += Packet.text_length.size
+                texts.append(data[position:position + length].decode("utf-8"))
+                position += length
+
+            return {"type": "outputs", "texts": texts}
+        elif message_type == Packet.MESSAGE_SALT:
+            return {"type": "salt", "salt": data.decode("utf-8")}
+        else:
+            return {"type": "unknown"}
@@ -0,0 +1,19 @@
+"""
+Percentiles of recent measurements, shared by everything that keeps a rolling window of durations (TickScheduler,
+TickProfiler, CommandStats, Persistence...) and by the benchmarks.
+"""
+
+
+"""Returns percentiles of some values, e.g. durations
+
+Attributes:
+    values: The values, in any order
+    percents: The percentiles to return, from 0 to 100. 100 is the largest value
+Returns: A list with the value at each percentile. All 0 if there are no values"""
+def get_percentiles(values, percents):
+    ordered = sorted(values)
+
+    if len(ordered) == 0:
+        return [0.0 for percent in percents]
+
+    return [ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))] for percent in percents]
@@ -0,0 +1,249 @@
+import collections
+import queue
+import sqlite3
+import threading
+import time
+
+from Database import Database
+import Percentiles
+
+"""
+Write-behind persistence. The game thread hands over snapshots of whatever needs saving, and a worker thread writes them
+to the database, so the game loop never waits for SQLite.
+
+A snapshot is a (snapshot type, parameters) tuple holding only strings, so the worker never touches live game objects.
+Every batch of snapshots waiting when the worker wakes up is written in one transaction, so a save of the dungeon
+reaches the database all at once or not at all. The queue of batches is bounded: when the worker falls that far behind,
+save blocks the game thread until there is room again.
+
+The worker has its own database connection, as SQLite connections can't be shared between threads.
+
+The game forgets what has changed once it's snapshotted, so a batch must not be lost when its transaction fails. If the
+database is busy or locked (sqlite3.OperationalError), the batches are kept and written again every RETRY_DELAY seconds,
+together with any newer batches after them. Other errors would fail the same way again, so those batches are dropped
+and reported. flush only returns once everything has been written or dropped.
+
+Attributes:
+    batch_queue: Batches of snapshots waiting to be written. None tells the worker to stop
+    num_batches: Number of batches written
+    num_snapshots: Number of snapshots written
+    num_transactions: Number of transactions committed
+    num_errors: Number of transactions that failed, and were rolled back
+    num_dropped_snapshots: Number of snapshots dropped after an error that retrying can't fix
+    write_time: Total time spent writing, in seconds
+    max_write_time: The longest time spent writing one group of batches, in seconds
+    write_durations: The durations of the most recent writes of a group of batches, in seconds
+    num_writes: Number of writes of a group of batches, including the ones that failed
+"""
+
+
+class Persistence:
+    # Snapshot types
+    SNAPSHOT_ROOM = 0
+    SNAPSHOT_PLAYER = 1
+
+    # The statement writing each snapshot type. The statement takes the snapshot's parameters
+    statements = {
+        SNAPSHOT_ROOM: Database.SQL_SAVE_ROOM,
+        SNAPSHOT_PLAYER: Database.SQL_SAVE_PLAYER
+    }
+
+    # Seconds between attempts at writing batches that failed
+    RETRY_DELAY = 1.0
+
+    # Attempts at writing failed batches when stopping, before giving up on them
+    MAX_STOP_RETRIES = 5
+
+    def __init__(self, max_queued_batches):
+        self.batch_queue = queue.Queue(max_queued_batches)
+
+        self.num_batches = 0
+        self.num_snapshots = 0
+        self.num_transactions = 0
+        self.num_errors = 0
+        self.num_dropped_snapshots = 0
+        self.write_time = 0.0
+        self.max_write_time = 0.0
+        self.write_durations = collections.deque(maxlen=1000)
+        self.num_writes = 0
+
+        self.thread = threading.Thread(target=self.worker_thread, daemon=True)
+        self.thread.start()
+
+    """Queues a batch of snapshots to be written. Blocks if the queue is full. Raises a RuntimeError if the worker has
+    died, rather than blocking forever once the queue fills up
+
+    Attributes:
+        snapshots: A list of (snapshot type, parameters) tuples
+    """
+    def save(self, snapshots):
+        if not self.thread.is_alive():
+            raise RuntimeError("The persistence worker has stopped, so nothing can be saved")
+
+        if len(snapshots) > 0:
+            self.batch_queue.put(snapshots)
+
+    """Blocks until every batch queued so far has been written"""
+    def flush(self):
+        self.batch_queue.join()
+
+    """Writes everything still queued and stops the worker. Batches that still can't be written after MAX_STOP_RETRIES
+    attempts are lost"""
+    def stop(self):
+        if not self.thread.is_alive():
+            print("Persistence error: the worker had already stopped. %d saves were NOT written" %
+                  self.get_queue_length())
+            return
+
+        self.batch_queue.put(None)
+        self.thread.join()
+
+    """Returns the number of batches waiting to be written"""
+    def get_queue_length(self):
+        return self.batch_queue.qsize()
+
+    """Worker thread writing queued batches to the database"""
+    def worker_thread(self):
+        # Connected in the loop, so that failing to connect is retried like any other error
+        connection = None
+
+        # Batches that failed to be written, to be written again before the newer ones
+        failed_batches = []
+        num_taken = 0  # Batches (and the stop) taken from the queue and not yet marked done
+        do_stop = False
+        num_stop_retries = 0
+
+        while True:
+            batches = []
+
+            if not do_stop:
+                # Wait for a batch, then take every other batch waiting too. With failed batches to retry, only wait
+                # for so long
+                try:
+                    batches.append(self.batch_queue.get(timeout=Persistence.RETRY_DELAY if failed_batches else None))
+
+                    while not self.batch_queue.empty():
+                        batches.append(self.batch_queue.get(False))
+                except queue.Empty:
+                    pass
+
+                num_taken += len(batches)
+                do_stop = None in batches
+                batches = [batch for batch in batches if batch is not None]
+            else:
+                num_stop_retries += 1
+                time.sleep(Persistence.RETRY_DELAY)
+
+            batches = failed_batches + batches
+
+            # Whatever goes wrong, the worker must keep going, or the game thread would block forever once the queue
+            # fills up
+            try:
+                if connection is None:
+                    connection = Database.connect()
+
+                start_time = time.perf_counter()
+                is_done = self.write(batches, connection)
+                duration = time.perf_counter() - start_time
+
+                self.num_writes += 1
+                self.write_time += duration
+                self.max_write_time = max(self.max_write_time, duration)
+                self.write_durations.append(duration)
+            except Exception as err:
+                self.num_errors += 1
+
+                if connection is None:
+                    print("Persistence error: couldn't connect to the database: %r. Retrying in %.1f s" % (
+                        err, Persistence.RETRY_DELAY))
+                    is_done = False
+                else:
+                    # Anything but an SQLite error means the batches themselves are bad, and would fail again
+                    self.drop(batches, repr(err))
+                    is_done = True
+
+                    # Start again with a new connection
+                    connection.close()
+                    connection = None
+
+            if is_done:
+                failed_batches = []
+            else:
+                failed_batches = batches
+
+                if do_stop and num_stop_retries >= Persistence.MAX_STOP_RETRIES:
+                    self.drop(failed_batches, "the database is still unavailable")
+                    failed_batches = []
+
+            # Everything taken so far has been written or dropped
+            if len(failed_batches) == 0:
+                for i in range(num_taken):
+                    self.batch_queue.task_done()
+
+                num_taken = 0
+
+                if do_stop:
+                    break
+
+        if connection is not None:
+            connection.close()
+
+    """Writes batches of snapshots in one transaction
+
+    Attributes:
+        batches: The batches to write
+        connection: The worker's database connection
+    Returns: Whether the batches are done with: written, or dropped after an error that retrying can't fix. False if
+             they should be written again later"""
+    def write(self, batches, connection):
+        if len(batches) == 0:
+            return True
+
+        try:
+            with connection:
+                for batch in batches:
+                    for snapshot_type, parameters in batch:
+                        connection.execute(Persistence.statements[snapshot_type], parameters)
+
+            self.num_transactions += 1
+        except sqlite3.OperationalError as err:
+            print("Persistence error: %s. Retrying in %.1f s" % (err.args[0], Persistence.RETRY_DELAY))
+            self.num_errors += 1
+            return False
+        except sqlite3.Error as err:
+            self.num_errors += 1
+            self.drop(batches, err.args[0])
+            return True
+
+        self.num_batches += len(batches)
+        self.num_snapshots += sum([len(batch) for batch in batches])
+        return True
+
+    """Gives up on writing batches, reporting the loss
+
+    Attributes:
+        batches: The batches
+        reason: Why they can't be written
+    """
+    def drop(self, batches, reason):
+        num_snapshots = sum([len(batch) for batch in batches])
+        self.num_dropped_snapshots += num_snapshots
+
+        print("Persistence error, %d saved rooms and players were NOT written: %s" % (num_snapshots, reason))
+
+    """Returns the persistence statistics as a dictionary. Times are in seconds"""
+    def get_stats(self):
+        percentiles = Percentiles.get_percentiles(self.write_durations, [50, 99])
+
+        return {
+            "queued_batches": self.get_queue_length(),
+            "batches": self.num_batches,
+            "snapshots": self.num_snapshots,
+            "transactions": self.num_transactions,
+            "errors": self.num_errors,
+            "dropped_snapshots": self.num_dropped_snapshots,
+            "write_time": self.write_time,
+            "max_write_time": self.max_write_time,
+            "write_time_p50": percentiles[0],
+            "write_time_p99": percentiles[1]
+        }
@@ -1,9 +1,15 @@
 import queue
 import random
-import cgi  # for html-escape
+import html  # for html-escape
 from Item import Item
+from ItemIndex import ItemIndex
 from Command import Command
+from Command import CommandRegistry
 from Database import Database
+from Config import Config
+from Persistence import Persistence
+from OutputQueue import OutputQueue
+from CommandStats import CommandStats
 
 # TEMP
 import sqlite3
@@ -12,15 +18,20 @@ import json
 """A player in the game!
 
 Attributes:
-    name: The name of this player
+    name: The name of this player. Changed by the name command
+    character_name: The name the character is stored under in the database, which the name command doesn't change
     client: The Client attached to this player. This should not be None
     
     input_queue: Queue for player input. Filled by the recv thread and read by the update thread
     output_queue: Queue for player output. Filled by self.output, and read by the send thread.
     
-    commands: List of commands available to this player
+    command_registry: The commands shared by every player
+    command_overrides: Commands enabled or disabled for this player only, as flags indexed by command name
     
     room: The room this player is currently in
+    inventory: List of items the player is carrying
+    inventory_index: Index of the inventory by item name and command
+    is_dirty: Whether the player's room or inventory have changed since they were last saved
 """
 
 
@@ -40,29 +51,23 @@ class Player:
 
         # Initialise player variables
         self.inventory = []
+        self.inventory_index = ItemIndex()
+        self.is_dirty = False
 
-        # Initialise player commands
-        self.commands = {
-            "help": Command("help", Player.cmd_help, "Get a list of all usable commands", "help", 0),
-            "look": Command("look", Player.cmd_look, "Re-assess your surroundings", "look", 0),
-            "name": Command("name", Player.cmd_rename, "Change your name", "name Doodyhead", 1),
-            "say": Command("say", Player.cmd_say, "Say something to the current room", "say Hello, I'm a doofhead.", -1),
-            "go": Command("go", Player.cmd_go, "<north, east, south, west> Go to another room", "go west", 1),
-            "sql": Command("sql", Player.cmd_sql_test, "Do an SQL test", "sql drop tables; etc", -1),
-            "inventory": Command("inventory", Player.cmd_inventory, "Displays your inventory", "inventory", 0)
-        }
+        # Per-player changes to the shared commands, as enabled/disabled flags indexed by command name
+        self.command_overrides = {}
 
         # Load player state from the database
-        cursor = Database.player_db.execute("SELECT last_room, inventory FROM players WHERE character_name IS (?)", (client.character_name,))
-        values = cursor.fetchall()
+        values = Database.get_player(client.character_name)
 
         starting_room = dungeon.entry_room
         self.name = client.character_name
+        self.character_name = client.character_name
 
-        if len(values) > 0:
+        if values is not None:
             # Load the player
-            starting_room = values[0][0]
-            inventory_list = json.loads(values[0][1])
+            starting_room = values[0]
+            inventory_list = json.loads(values[1])
 
             for item in inventory_list:
                 new_item = Database.spawn_item(item[0])
@@ -72,12 +77,14 @@ class Player:
                     self.add_to_inventory(new_item)
         else:
             # Add the new player to the database
-            Database.player_db.execute("INSERT INTO players (account_name, character_name, last_room, inventory) VALUES (?, ?, ?, ?)",
-                                       (self.client.account_name, self.name, dungeon.entry_room, "{}"))
+            Database.add_player(self.client.account_name, self.character_name, dungeon.entry_room, "[]")
 
             # Give them an inventory with a useful item
             #self.inventory = [Item("rubberduck", "Rubberduck", "It's a rubber duck. If you squeak it, it will tell you your fortune.", {"squeak": ""})]
 
+        # The player has just been loaded, so there's nothing new to save yet
+        self.is_dirty = False
+
         # Broadcast entry message
         self.dungeon.broadcast("<i><font color='green'><+player>%s<-player> has entered the game!</font></i>" % self.name)
 
@@ -86,6 +93,7 @@ class Player:
 
         # Spawn in the given room
         self.room = dungeon.rooms[starting_room]
+        self.room.add_player(self)
 
         self.output("<+action>You enter <+room>%s<-room><-action>" % self.room.title)
         self.room.on_enter(self)
@@ -95,7 +103,10 @@ class Player:
 
     """Destroys the player, saving progress"""
     def destroy(self):
-        self.save()
+        snapshot = self.make_snapshot()
+
+        if snapshot is not None:
+            self.dungeon.persistence.save([snapshot])
 
     """Updates the player, flushing all inputs and outputs"""
     def update(self):
@@ -107,10 +118,16 @@ class Player:
 
     Attributes:
         string: the string to output to the player
+        priority: OutputQueue.PRIORITY_LOW if the string can be dropped when the player's client falls behind
     """
-    def output(self, string):
+    def output(self, string, priority=OutputQueue.PRIORITY_NORMAL):
+        command_stats = self.dungeon.command_stats
+
         # Send the string to the output stack for the next update
-        self.client.output_text(string)
+        if command_stats is not None and command_stats.is_timing:
+            command_stats.output(self.client.output_text, string, priority)
+        else:
+            self.client.output_text(string, priority)
 
     """Sends an input to this player. This will be processed during the next update.
     
@@ -128,45 +145,45 @@ class Player:
     """
     def process_input(self, user_input):
         # Sanitise the input
-        user_input = cgi.escape(user_input)
+        user_input = html.escape(user_input, quote=False)
 
         # Check the command
         parameters = user_input.split(" ")
         command_name = parameters[0].lower()
 
-        # Find and call the command function
-        for command_n, command in self.commands.items():
-            if command_n == command_name:
-                # Ensure the correct number of parameters is supplied
-                if len(parameters) - 1 == command.number_of_parameters or command.number_of_parameters == -1:
-                    # Call the command function!
-                    command.func(self, parameters[1:])
-                    return
-                else:
-                    # Show example usage because player doesn't know what they're doing
-                    self.output("Invalid input. Example usage: '%s'" % command.example_usage)
-                    return
+        # Find the command
+        match = Player.command_registry.find(command_name)
+
+        if match is not None and not self.can_use_command(match[0]):
+            match = None
+
+        if match is not None and match[2]:
+            self.run_command(match[0], match[1] + parameters[1:])
+            return
 
         # That didn't work. Try item commands
         if len(parameters) > 1:
-            target_object_name = parameters[1].lower()
-            target_object = [x for x in self.room.items if x.name.lower() == target_object_name]
+            target_object_name = parameters[1]
+            target_object = self.room.item_index.find_by_name(target_object_name)
 
             if len(target_object) == 0:
-                target_object = [x for x in self.inventory if x.name.lower() == target_object_name]
+                target_object = self.inventory_index.find_by_name(target_object_name)
 
             if len(target_object) > 0:
                 if command_name in target_object[0].commands:
-                    self.output(target_object[0].commands[command_name])
-                    target_object[0].do_command(command_name, self, parameters[2:])
+                    if self.dungeon.command_stats is None:
+                        self.run_item_command(target_object[0], command_name, parameters[2:])
+                    else:
+                        self.dungeon.command_stats.run("item " + command_name, self.run_item_command,
+                                                       target_object[0], command_name, parameters[2:])
                     return
                 else:
                     self.output("%s does not have the command '%s'" % (target_object[0].name, command_name))
                     return
         elif len(parameters) == 1:
             # See which item(s) has this command
-            compatible_items = [item for item in self.room.items if command_name in item.commands]
-            compatible_items.extend([item for item in self.inventory if command_name in item.commands])
+            compatible_items = self.room.item_index.find_by_command(command_name) + \
+                               self.inventory_index.find_by_command(command_name)
 
             if len(compatible_items) > 0:
                 # Display all items which can use this
@@ -179,9 +196,56 @@ class Player:
                 self.output(info_message)
                 return
 
+        # Last, try the command as an abbreviation
+        if match is not None:
+            self.run_command(match[0], match[1] + parameters[1:])
+            return
+
         # If all fails, the command wasn't processed
         self.output("Unknown command: %s" % command_name)
 
+    """Calls a command function, if the right number of parameters were supplied
+
+    Attributes:
+        command: The command to call
+        parameters: The parameters typed after the command name
+    """
+    def run_command(self, command, parameters):
+        # Ensure the correct number of parameters is supplied
+        if len(parameters) == command.number_of_parameters or command.number_of_parameters == -1:
+            # Call the command function!
+            if self.dungeon.command_stats is None:
+                command.func(self, parameters)
+            else:
+                self.dungeon.command_stats.run(command.name, command.func, self, parameters)
+        else:
+            # Show example usage because player doesn't know what they're doing
+            self.output("Invalid input. Example usage: '%s'" % command.example_usage)
+
+    """Calls an item's command, after the item's message for it
+
+    Attributes:
+        item: The item
+        command_name: The name of the item command
+        parameters: The parameters typed after the item name
+    """
+    def run_item_command(self, item, command_name, parameters):
+        self.output(item.commands[command_name])
+        item.do_command(command_name, self, parameters)
+
+    """Returns whether this player can use a command"""
+    def can_use_command(self, command):
+        return self.command_overrides.get(command.name, command.enabled_by_default)
+
+    """Enables or disables a command for this player only
+
+    Attributes:
+        command_name: The name of the command
+        enabled: Whether the player can use the command
+    """
+    def set_command_enabled(self, command_name, enabled):
+        self.command_overrides[command_name] = enabled
+
     """Displays the room entry message, updated with regard to items, players, etc"""
     def cmd_look(self, parameters):
         self.output("Refreshing room information...<br>")
@@ -214,7 +278,10 @@ class Player:
             self.room.on_exit(self, direction)
 
             # Into the new room!
+            self.room.remove_player(self)
             self.room = new_room
+            self.room.add_player(self)
+            self.is_dirty = True
             self.output("<i>You enter <+room>%s<-room></i>" % self.room.title)
 
             # Enter the new room
@@ -239,7 +306,7 @@ class Player:
         elif randomizer == 3:
             name_message = "Wait, <+player>" + self.name + "<-player> changed their mind. Call them <+player>" + parameters[0] + "<-player> from now on."
 
-        self.name = parameters[0]
+        self.dungeon.rename_player(self, parameters[0])
         self.room.dungeon.broadcast("<+event>" + name_message + "<-event>")
 
     """
@@ -249,21 +316,24 @@ class Player:
         # Display general commands
         self.output("<+info>General commands:<-info><br>")
 
-        for command_name, command in self.commands.items():
+        for command_name, command in Player.command_registry.commands.items():
+            if not self.can_use_command(command):
+                continue
+
             self.output("<+command>%s:<-command> <i>%s</i>" % (command_name, command.usage))
 
+        # Display the shortcuts
+        self.output("<br><+info>Shortcuts (commands can also be shortened, e.g. <+command>he<-command> for help):<-info><br>")
+
+        for alias, (command_name, parameters) in Player.command_registry.aliases.items():
+            if self.can_use_command(Player.command_registry.commands[command_name]):
+                self.output("<+command>%s:<-command> %s" % (alias, " ".join([command_name] + parameters)))
+
         # Display item-specific commands and their usages
         self.output("<br><+info>Item commands:<-info><br>")
 
-        item_commands = {}
-        for item in self.room.items:
-            for command in item.commands.keys():
-                if command not in item_commands:
-                    item_commands[command] = []
-                item_commands[command].append(item.name)
-
-        for command in item_commands:
-            self.output("<+command>%s:<-command> %s" % (command, "<-item>, <+item>".join(item_commands[command])))
+        for command, items in self.room.item_index.by_command.items():
+            self.output("<+command>%s:<-command> %s" % (command, "<-item>, <+item>".join([item.name for item in items])))
 
     """
     Displays the inventory
@@ -279,8 +349,120 @@ class Player:
             # Display 'you have nothing'
             self.output("You currently possess.....<br><br>Nothing. ¯\_(ツ)_/¯<br>")
 
+    """
+    Outputs server statistics (admin only)
+    """
+    def cmd_stats(self, parameters):
+        if not self.is_admin():
+            self.output("<+error>Only administrators can view the server statistics.<-error><br>")
+            return
+
+        compression = self.dungeon.get_compression_stats()
+
+        self.output("<+info>Server statistics:<-info><br>")
+        self.output("%d clients connected, %d players in game" % (len(self.dungeon.clients), len(self.dungeon.players)))
+
+        if self.dungeon.tick_scheduler is not None:
+            ticks = self.dungeon.tick_scheduler.get_stats()
+
+            self.output("Ticks: %d at %d/s, %d overruns, %d late, %d skipped. Duration p50 %.2f ms, p90 %.2f ms, "
+                        "p99 %.2f ms, max %.2f ms" % (
+                            ticks["ticks"], ticks["tick_rate"], ticks["overruns"], ticks["late_ticks"],
+                            ticks["skipped_ticks"], ticks["p50"] * 1000.0, ticks["p90"] * 1000.0,
+                            ticks["p99"] * 1000.0, ticks["max"] * 1000.0))
+
+        self.output("Auth pool: %d login and registration steps run, %d in progress" % (
+            self.dungeon.auth_pool.num_tasks, self.dungeon.auth_pool.get_queue_length()))
+
+        if self.dungeon.admission is not None:
+            admission = self.dungeon.admission.get_stats()
+
+            self.output("Admission: %d connected from %d addresses, %d waiting. %d admitted, %d waited, %d refused" % (
+                admission["connections"], admission["addresses"], admission["waiting"], admission["admitted"],
+                admission["waited"], admission["refused"]))
+
+        persistence = self.dungeon.persistence.get_stats()
+
+        self.output("Persistence: %d saves queued, %d written (%d rows) in %d transactions, %d errors, %d rows lost. "
+                    "Write time %.1f ms total, %.1f ms max" % (
+                        persistence["queued_batches"], persistence["batches"], persistence["snapshots"],
+                        persistence["transactions"], persistence["errors"], persistence["dropped_snapshots"],
+                        persistence["write_time"] * 1000.0, persistence["max_write_time"] * 1000.0))
+
+        output_queues = self.dungeon.get_output_queue_stats()
+
+        self.output("Output queues: %d messages (%d characters) queued, %d dropped, %d collapsed, %d slow clients "
+                    "disconnected" % (output_queues["messages"], output_queues["size"], output_queues["dropped"],
+                                      output_queues["collapsed"], output_queues["slow_disconnects"]))
+
+        for name, messages, size in output_queues["deepest"]:
+            self.output("* %s: %d messages (%d characters) queued" % (name, messages, size))
+
+        if compression["bytes_out"] > 0:
+            self.output("Compression: %d clients, %d bytes compressed to %d (%.1fx), %.1f ms CPU (%.1f us per KB)" % (
+                compression["clients"], compression["bytes_in"], compression["bytes_out"],
+                compression["bytes_in"] / compression["bytes_out"], compression["time"] * 1000.0,
+                compression["time"] * 1e6 / (compression["bytes_in"] / 1024.0)))
+        else:
+            self.output("Compression: no compressed output yet")
+
+    """
+    Outputs how long each phase of the tick takes, and the recent slow ticks (admin only). 'profile reset' starts over
+    """
+    def cmd_profile(self, parameters):
+        if not self.is_admin():
+            self.output("<+error>Only administrators can view the tick profile.<-error><br>")
+            return
+
+        if len(parameters) > 0 and parameters[0].lower() == "reset":
+            self.dungeon.profiler.reset()
+            self.output("<+info>Tick profile reset.<-info>")
+            return
+
+        for line in self.dungeon.profiler.get_report():
+            self.output(line)
+
+    """
+    Outputs how often each command runs and how long it takes, logic and output (admin only). 'timings on' and
+    'timings off' start and stop timing commands, 'timings reset' starts over and 'timings dump' writes the timings to
+    Config.command_stats_file
+    """
+    def cmd_timings(self, parameters):
+        if not self.is_admin():
+            self.output("<+error>Only administrators can view the command timings.<-error><br>")
+            return
+
+        option = parameters[0].lower() if len(parameters) > 0 else ""
+
+        if option == "on":
+            if self.dungeon.command_stats is None:
+                self.dungeon.command_stats = CommandStats()
+            self.output("<+info>Timing commands.<-info>")
+            return
+        elif option == "off":
+            self.dungeon.command_stats = None
+            self.output("<+info>Stopped timing commands.<-info>")
+            return
+
+        if self.dungeon.command_stats is None:
+            self.output("<+info>Commands aren't being timed. Start with 'timings on'.<-info>")
+            return
+
+        if option == "reset":
+            self.dungeon.command_stats.reset()
+            self.output("<+info>Command timings reset.<-info>")
+        elif option == "dump":
+            try:
+                self.dungeon.command_stats.dump(Config.command_stats_file)
+                self.output("<+info>Command timings written to %s.<-info>" % Config.command_stats_file)
+            except OSError as error:
+                self.output("<+error>Couldn't write the command timings: %s<-error>" % error)
+        else:
+            for line in self.dungeon.command_stats.get_report():
+                self.output(line)
+
     def cmd_sql_test(self, parameters):
-        if self.client.account_name != "LXShadow":
+        if not self.is_admin():
             self.output("<+error>That would be really fun, but only administrators are allowed to use this feature for testing.<-error><br>")
             return
 
@@ -288,7 +470,7 @@ class Player:
 
         # Execute an SQL database thing
         # Open the database
-        connection = sqlite3.connect("players.db")
+        connection = sqlite3.connect(Config.database_file)
 
         # Grab a database cursor
         cursor = connection.cursor()
@@ -308,6 +490,10 @@ class Player:
         # Close the database
         connection.close()
 
+    """Returns whether this player is allowed to use administrator commands"""
+    def is_admin(self):
+        return self.client.account_name in Config.admin_accounts
+
     """Adds an item to the player's inventory and removes it from the room if applicable"""
     def add_to_inventory(self, item):
         if item.room is not None:
@@ -315,12 +501,16 @@ class Player:
 
         item.player = self
         self.inventory.append(item)
+        self.inventory_index.add(item)
+        self.is_dirty = True
 
     """Removes the item from the player's inventory and drops it in the room"""
     def remove_from_inventory(self, item):
         item.player = None
         self.room.add_item(item)
         self.inventory.remove(item)
+        self.inventory_index.remove(item)
+        self.is_dirty = True
 
     """Generates a player name
     
@@ -333,23 +523,43 @@ class Player:
         fourth = ["glubber", "slipper", "ribbster", "zonky", "drizzle", "blimey"]
         return random.choice(first) + random.choice(second) + " " + random.choice(third) + random.choice(fourth)
 
-    """Saves the player's state to the database"""
-    def save(self):
+    """Takes a snapshot of the player's state for saving, if it has changed
+
+    Returns: A Persistence snapshot, or None if there is nothing to save"""
+    def make_snapshot(self):
+        if not self.is_dirty:
+            return None
+
         # Convert items into a dictionary
         item_list = []
         for item in self.inventory:
             item_list.append((item.id, item.custom_data))
 
-        Database.player_db.execute("""
-            UPDATE players
-            SET last_room = (?),
-            inventory = (?)
-                
-            WHERE character_name IS (?)""",
-            (self.room.title, json.dumps(item_list), self.name))
-        Database.player_db.commit()
+        self.is_dirty = False
+        return Persistence.SNAPSHOT_PLAYER, (self.room.title, json.dumps(item_list), self.character_name)
 
     """Loads the player's state from the database"""
     def load(self):
         # Todo
         pass
+
+
+# The commands available to players. Built once and shared by every player
+Player.command_registry = CommandRegistry([
+    Command("help", Player.cmd_help, "Get a list of all usable commands", "help", 0),
+    Command("look", Player.cmd_look, "Re-assess your surroundings", "look", 0),
+    Command("name", Player.cmd_rename, "Change your name", "name Doodyhead", 1),
+    Command("say", Player.cmd_say, "Say something to the current room", "say Hello, I'm a doofhead.", -1),
+    Command("go", Player.cmd_go, "<north, east, south, west> Go to another room", "go west", 1),
+    Command("sql", Player.cmd_sql_test, "Do an SQL test", "sql drop tables; etc", -1),
+    Command("inventory", Player.cmd_inventory, "Displays your inventory", "inventory", 0),
+    Command("stats", Player.cmd_stats, "(Admin) Show server statistics", "stats", 0),
+    Command("profile", Player.cmd_profile, "(Admin) Show where the tick time goes", "profile", -1),
+    Command("timings", Player.cmd_timings, "(Admin) Show how long each command takes", "timings", -1)
+], {
+    "n": "go north",
+    "e": "go east",
+    "s": "go south",
+    "w": "go west",
+    "inv": "inventory"
+})
@@ -1,5 +1,7 @@
 from Player import Player
-from Database import Database
+from ItemIndex import ItemIndex
+from Persistence import Persistence
+from OutputQueue import OutputQueue
 
 import json
 
@@ -12,6 +14,9 @@ Attributes:
     description: The description of the room displayed to players when they enter.
     connections: A dictionary of rooms "east", "west", "north" or "south" of this room
     items: List of active items in the room
+    item_index: Index of the items in the room by name and command
+    is_dirty: Whether the room's items have changed since it was last saved
+    players: List of players in the room
 """
 
 
@@ -21,6 +26,7 @@ class Room:
         self.description = description
         self.connections = connections
         self.items = items
+        self.players = []
         self.dungeon = None
 
         if items is None:
@@ -28,6 +34,9 @@ class Room:
             # BUG FIXED: items was originally a default parameter, items=[], but this was being shared across all rooms!
             self.items = []
 
+        self.item_index = ItemIndex(self.items)
+        self.is_dirty = False
+
     """Called whenever a player enters the room
     
     Attributes:
@@ -82,8 +91,8 @@ class Room:
             room_info += "* %s (<+command>%s<-command>)<br>" % (item.entry_description, "<-command>, <+command>".join(list(item.commands.keys())))
 
         # Display names of other players in this room
-        for other_player in self.dungeon.players:
-            if other_player is not player and other_player.room is self:
+        for other_player in self.players:
+            if other_player is not player:
                 room_info += "* <+player>%s<-player> is here.<br>" % other_player.name
 
         # Send to the player
@@ -92,24 +101,39 @@ class Room:
 
     """Broadcasts some text to every player in the room"""
     def broadcast(self, text_to_broadcast, exclude_players = None):
-        for player in self.dungeon.players:
+        for player in self.players:
             # Broadcast to every player in the room, except excluded players
-            if player.room is self and (exclude_players is None or player not in exclude_players):
-                player.output(text_to_broadcast)
+            if exclude_players is None or player not in exclude_players:
+                player.output(text_to_broadcast, OutputQueue.PRIORITY_LOW)
 
     """Called during game update. Overridable"""
     def update(self):
         pass
 
-    def save(self):
-        # Save the item list
-        Database.room_db.execute("""
-            UPDATE rooms
-            SET items = (?)
+    """Takes a snapshot of the room's items for saving, if they have changed
+
+    Returns: A Persistence snapshot, or None if there is nothing to save"""
+    def make_snapshot(self):
+        if not self.is_dirty:
+            return None
+
+        self.is_dirty = False
+        return Persistence.SNAPSHOT_ROOM, (json.dumps([(x.id, x.custom_data) for x in self.items]), self.title)
+
+    """Marks the room as needing to be saved. Call this whenever its items change"""
+    def mark_dirty(self):
+        # Rooms being loaded aren't in a dungeon yet, and don't need saving
+        if not self.is_dirty and self.dungeon is not None:
+            self.is_dirty = True
+            self.dungeon.dirty_rooms.add(self)
+
+    """Adds a player to the room's player list. Call this whenever a player's room is set"""
+    def add_player(self, player):
+        self.players.append(player)
 
-            WHERE title IS (?)""",
-                (json.dumps([(x.id, x.custom_data) for x in self.items]), self.title))
-        Database.player_db.commit()
+    """Removes a player from the room's player list, when they leave the room or the game"""
+    def remove_player(self, player):
+        self.players.remove(player)
 
     """Adds an item to the room"""
     def add_item(self, item):
@@ -117,9 +141,13 @@ class Room:
             item.player.remove_from_inventory(item)
 
         self.items.append(item)
+        self.item_index.add(item)
         item.room = self
+        self.mark_dirty()
 
     """Removes an item from the room"""
     def remove_item(self, item):
         self.items.remove(item)
+        self.item_index.remove(item)
         item.room = None
+        self.mark_dirty()
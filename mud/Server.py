@@ -1,6 +1,10 @@
 import socket
 import threading
-import sys
+import time
+
+from Config import Config
+from Admission import AdmissionControl
+import Framing
 
 """
 Server handles network communications between players and the server
@@ -9,6 +13,7 @@ Attributes:
     game: reference to the game; used to add players
     game_port: the TCP port that the game will run on
     listening_socket: the socket listening for TCP connections
+    admission: decides which connections can join, and when
 """
 
 
@@ -18,8 +23,10 @@ class Server:
     def __init__(self, game):
         # Initialise vars
         self.game = game
-        self.game_port = 9123
+        self.game_port = Config.game_port
         self.listening_socket = None
+        self.admission = Server.create_admission_control()
+        self.game.admission = self.admission
 
         # Start the player-accepting thread
         threading.Thread(name="accept_thread", target=lambda: self.accept_thread(), daemon=True).start()
@@ -31,18 +38,7 @@ class Server:
 
         # Bind the server socket
         try:
-            # Find the primary IP to bind to
-            bind_ip = "localhost"
-            ip_finder = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-            try:
-                ip_finder.connect(('10.255.255.255', 1))
-                bind_ip = ip_finder.getsockname()[0]
-            finally:
-                ip_finder.close()
-
-            # Bind to it
-            self.listening_socket.bind((bind_ip, self.game_port))
+            self.listening_socket.bind((Server.find_bind_ip(), self.game_port))
         except socket.error as err:
             print("Could not create server socket. The server could be running already. Shutting down.")
             return
@@ -55,10 +51,117 @@ class Server:
 
         # Connect any new players to the dungeon
         while True:
+            # Limit the accept rate. Connections arriving meanwhile wait in the listen backlog
+            delay = self.admission.take_token()
+
+            if delay > 0:
+                time.sleep(delay)
+
             # Accept incoming players
             client_socket, address = self.listening_socket.accept()
 
-            print("Got new connection! Adding client.")
+            self.admit_connection(client_socket, address[0])
+
+    """Lets a new connection into the game, queues it, or refuses it
+
+    Attributes:
+        client_socket: The socket of the connection
+        ip: The IP address of the connection
+    """
+    def admit_connection(self, client_socket, ip):
+        # Connections that aren't admitted are only sent small messages, which mustn't block whoever is sending them.
+        # add_client makes the socket blocking again
+        client_socket.settimeout(0)
+
+        on_admitted = lambda: self.add_client(client_socket, ip)
+        result, value = self.admission.admit(ip, on_admitted,
+                                             lambda position: Server.send_position(client_socket, position))
+
+        if result == AdmissionControl.ADMITTED:
+            self.add_client(client_socket, ip)
+        elif result == AdmissionControl.WAITING:
+            print("Server full, connection from %s is waiting at position %d." % (ip, value))
+
+            if not Server.send_position(client_socket, value):
+                self.admission.cancel(ip, on_admitted)
+        else:
+            print("Refused connection from %s: %s" % (ip, value))
+
+            Server.send_plain_message(client_socket, "refused", value)
+            client_socket.close()
+
+    """Creates the client for an admitted connection"""
+    def add_client(self, client_socket, ip):
+        # The connection may have been closed while it was waiting
+        if not Server.is_open(client_socket):
+            print("Connection from %s left while waiting." % ip)
+
+            client_socket.close()
+            self.admission.release(ip)
+            return
+
+        client_socket.settimeout(None)
+
+        print("Got new connection! Adding client.")
 
-            # Create the client
-            self.game.add_client(client_socket)
+        # Create the client
+        self.game.add_client(client_socket, on_removed=lambda: self.admission.release(ip))
+
+    """Returns admission control with the configured limits"""
+    @staticmethod
+    def create_admission_control():
+        return AdmissionControl(Config.max_connections, Config.max_connections_per_ip, Config.accept_rate,
+                                Config.accept_burst, Config.max_waiting_connections)
+
+    """Sends a plain JSON message (see AdmissionControl.make_message) to a connection that isn't in the game yet. The
+    socket doesn't block, so a message that only partly fits in the send buffer fails, leaving a partial frame: the
+    connection is no use after a failure
+
+    Returns: Whether the message was sent"""
+    @staticmethod
+    def send_plain_message(client_socket, message_type, value):
+        message = AdmissionControl.make_message(message_type, value)
+
+        try:
+            client_socket.sendall(Framing.encode_header(len(message)) + message)
+            return True
+        except OSError:
+            return False
+
+    """Tells a waiting connection its place in the queue, closing the connection if that fails
+
+    Returns: Whether the connection is still there"""
+    @staticmethod
+    def send_position(client_socket, position):
+        if Server.send_plain_message(client_socket, "waiting", position):
+            return True
+
+        client_socket.close()
+        return False
+
+    """Returns whether a connection that isn't in the game yet is still open. The socket mustn't block"""
+    @staticmethod
+    def is_open(client_socket):
+        try:
+            # It has nothing to send yet, so anything but data not being ready means the connection has ended
+            client_socket.recv(1, socket.MSG_PEEK)
+            return False
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    """Returns the IP the server should listen on: the configured one, or else the primary network IP"""
+    @staticmethod
+    def find_bind_ip():
+        if Config.bind_ip is not None:
+            return Config.bind_ip
+
+        # Find the primary IP to bind to
+        ip_finder = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        try:
+            ip_finder.connect(('10.255.255.255', 1))
+            return ip_finder.getsockname()[0]
+        finally:
+            ip_finder.close()
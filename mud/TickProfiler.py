@@ -0,0 +1,182 @@
+import collections
+import time
+
+import Percentiles
+
+"""
+Measures where the time goes in each tick of Dungeon.update, phase by phase. Recent durations of each phase are kept in
+rolling windows for percentiles; those of whole ticks are kept by TickScheduler. Ticks that take longer than the tick
+budget are logged with the phase that took most of the time, and the profile is printed every so often (see
+Config.tick_profile_interval).
+
+Dungeon.update calls start_tick, then end_phase as each phase finishes, then end_tick. A phase that didn't run during a
+tick (e.g. the backup) is left out of that phase's window.
+
+Attributes:
+    tick_budget: How long a tick may take, in seconds. Longer ticks are slow
+    phase_durations: The durations of the most recent runs of each phase, in seconds, indexed by phase
+    phase_totals: Total time spent in each phase, in seconds, indexed by phase
+    slow_ticks: The most recent slow ticks, as (tick number, duration, slowest phase, slowest phase duration) tuples
+    num_ticks: Number of ticks profiled
+    num_slow_ticks: Number of ticks that took longer than the budget
+    lifetime_ticks, lifetime_slow_ticks, lifetime_phase_totals, lifetime_phase_runs: The tick, slow tick and phase counts
+        and the time spent in each phase since the server started. Unlike the rest, reset leaves these alone, so that
+        the metrics built on them never go down
+"""
+
+
+class TickProfiler:
+    # The phases of a tick, in the order they run
+    PHASE_INCOMING = 0
+    PHASE_CLIENTS = 1
+    PHASE_ROOMS = 2
+    PHASE_PLAYERS = 3
+    PHASE_PRUNE = 4
+    PHASE_BACKUP = 5
+    PHASE_FLUSH = 6
+    PHASE_NAMES = ["incoming", "clients", "rooms", "players", "prune", "backup", "flush"]
+
+    # Most slow ticks to keep
+    MAX_SLOW_TICKS = 20
+
+    # Shortest time between two slow tick warnings, in seconds
+    WARNING_INTERVAL = 1.0
+
+    def __init__(self, tick_budget, report_interval=0, history_size=1000):
+        self.tick_budget = tick_budget
+        self.report_interval = report_interval
+
+        self.phase_durations = [collections.deque(maxlen=history_size) for phase in TickProfiler.PHASE_NAMES]
+        self.phase_totals = [0.0 for phase in TickProfiler.PHASE_NAMES]
+        self.slow_ticks = collections.deque(maxlen=TickProfiler.MAX_SLOW_TICKS)
+        self.num_ticks = 0
+        self.num_slow_ticks = 0
+
+        self.lifetime_ticks = 0
+        self.lifetime_slow_ticks = 0
+        self.lifetime_phase_totals = [0.0 for phase in TickProfiler.PHASE_NAMES]
+        self.lifetime_phase_runs = [0 for phase in TickProfiler.PHASE_NAMES]
+
+        # The tick being profiled
+        self.tick_start_time = 0.0
+        self.phase_start_time = 0.0
+        self.tick_phases = []
+
+        self.last_warning_time = 0.0
+        self.num_unwarned_slow_ticks = 0
+        self.last_report_time = time.perf_counter()
+
+    """Starts profiling a tick"""
+    def start_tick(self):
+        self.tick_start_time = self.phase_start_time = time.perf_counter()
+        self.tick_phases = []
+
+    """Ends a phase of the tick. The next phase starts now
+
+    Attributes:
+        phase: The phase that has finished (PHASE_*)
+    """
+    def end_phase(self, phase):
+        now = time.perf_counter()
+
+        self.tick_phases.append((phase, now - self.phase_start_time))
+        self.phase_start_time = now
+
+    """Ends the tick, recording its phases, and prints the profile if it is due"""
+    def end_tick(self):
+        now = time.perf_counter()
+        duration = now - self.tick_start_time
+
+        self.num_ticks += 1
+        self.lifetime_ticks += 1
+
+        for phase, phase_duration in self.tick_phases:
+            self.phase_durations[phase].append(phase_duration)
+            self.phase_totals[phase] += phase_duration
+            self.lifetime_phase_totals[phase] += phase_duration
+            self.lifetime_phase_runs[phase] += 1
+
+        if duration > self.tick_budget:
+            self.record_slow_tick(duration, now)
+
+        if self.report_interval > 0 and now - self.last_report_time >= self.report_interval:
+            self.last_report_time = now
+
+            for line in self.get_report():
+                print(line)
+
+    """Logs a tick that took longer than the budget, and warns about it unless there was a warning very recently"""
+    def record_slow_tick(self, duration, now):
+        slowest_phase, slowest_duration = max(self.tick_phases, key=lambda tick_phase: tick_phase[1])
+
+        self.num_slow_ticks += 1
+        self.lifetime_slow_ticks += 1
+        self.slow_ticks.append((self.num_ticks, duration, slowest_phase, slowest_duration))
+
+        if now - self.last_warning_time >= TickProfiler.WARNING_INTERVAL:
+            print("Slow tick %d: %.1f ms (budget %.1f ms), mostly %s (%.1f ms). %d more slow ticks since the last "
+                  "warning" % (self.num_ticks, duration * 1000.0, self.tick_budget * 1000.0,
+                               TickProfiler.PHASE_NAMES[slowest_phase], slowest_duration * 1000.0,
+                               self.num_unwarned_slow_ticks))
+            self.last_warning_time = now
+            self.num_unwarned_slow_ticks = 0
+        else:
+            self.num_unwarned_slow_ticks += 1
+
+    """Forgets everything recorded so far, except the lifetime counts"""
+    def reset(self):
+        for durations in self.phase_durations:
+            durations.clear()
+
+        self.phase_totals = [0.0 for phase in TickProfiler.PHASE_NAMES]
+        self.slow_ticks.clear()
+        self.num_ticks = 0
+        self.num_slow_ticks = 0
+        self.num_unwarned_slow_ticks = 0
+
+    """Returns the profile as lines of text: the percentiles of each phase and the most recent slow ticks"""
+    def get_report(self):
+        total_time = sum(self.phase_totals)
+
+        lines = ["Tick profile: %d ticks, %d over the %.1f ms budget. Ticks take %.2f ms on average" % (
+            self.num_ticks, self.num_slow_ticks, self.tick_budget * 1000.0,
+            total_time * 1000.0 / self.num_ticks if self.num_ticks > 0 else 0.0)]
+
+        for phase, name in enumerate(TickProfiler.PHASE_NAMES):
+            if len(self.phase_durations[phase]) == 0:
+                lines.append("* %s: not run yet" % name)
+                continue
+
+            percentiles = Percentiles.get_percentiles(self.phase_durations[phase], [50, 99, 100])
+
+            lines.append("* %s: p50 %.3f ms, p99 %.3f ms, max %.3f ms, %.1f%% of the time" % (
+                name, percentiles[0] * 1000.0, percentiles[1] * 1000.0, percentiles[2] * 1000.0,
+                self.phase_totals[phase] * 100.0 / total_time if total_time > 0 else 0.0))
+
+        for tick_number, duration, slowest_phase, slowest_duration in self.slow_ticks:
+            lines.append("Slow tick %d: %.1f ms, mostly %s (%.1f ms)" % (
+                tick_number, duration * 1000.0, TickProfiler.PHASE_NAMES[slowest_phase], slowest_duration * 1000.0))
+
+        return lines
+
+    """Returns the profile as a dictionary. Durations are in seconds"""
+    def get_stats(self):
+        stats = {
+            "ticks": self.num_ticks,
+            "slow_ticks": self.num_slow_ticks,
+            "tick_budget": self.tick_budget,
+            "phases": {}
+        }
+
+        for phase, name in enumerate(TickProfiler.PHASE_NAMES):
+            percentiles = Percentiles.get_percentiles(self.phase_durations[phase], [50, 99, 100])
+
+            stats["phases"][name] = {
+                "runs": len(self.phase_durations[phase]),
+                "total": self.phase_totals[phase],
+                "p50": percentiles[0],
+                "p99": percentiles[1],
+                "max": percentiles[2]
+            }
+
+        return stats
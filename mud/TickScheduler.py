@@ -0,0 +1,102 @@
+import collections
+import time
+
+import Percentiles
+
+"""
+Runs the game tick at a fixed rate. The sleep between ticks is shortened by however long the tick took, so the tick rate
+doesn't drift as the server gets busier. Ticks that take longer than the tick period (overruns) and ticks that start
+late are counted, and recent tick durations are kept for percentiles.
+
+If the server falls more than a whole tick behind, the missed ticks are skipped rather than run back to back.
+
+Attributes:
+    tick_rate: Ticks per second
+    tick_period: Time between the start of each tick, in seconds
+    tick_durations: The durations of the most recent ticks, in seconds
+    num_ticks: Number of ticks run
+    total_tick_time: Time spent running ticks, in seconds
+    num_overruns: Number of ticks that took longer than the tick period
+    num_late_ticks: Number of ticks that started more than late_tolerance after they were due
+    num_skipped_ticks: Number of ticks skipped to catch up after falling behind
+"""
+
+
+class TickScheduler:
+    # How late a tick can start, as a fraction of the tick period, before it counts as late
+    LATE_TOLERANCE = 0.1
+
+    def __init__(self, tick_rate, history_size=1000):
+        self.tick_rate = tick_rate
+        self.tick_period = 1.0 / tick_rate
+        self.late_tolerance = self.tick_period * TickScheduler.LATE_TOLERANCE
+
+        self.tick_durations = collections.deque(maxlen=history_size)
+        self.num_ticks = 0
+        self.total_tick_time = 0.0
+        self.num_overruns = 0
+        self.num_late_ticks = 0
+        self.num_skipped_ticks = 0
+
+    """Runs ticks until told to stop
+
+    Attributes:
+        tick: Function called every tick
+        should_stop: Function returning True when the loop should end. Checked before every tick
+    """
+    def run(self, tick, should_stop):
+        next_tick_time = time.perf_counter()
+
+        while not should_stop():
+            # Run the tick
+            start_time = time.perf_counter()
+
+            if start_time - next_tick_time > self.late_tolerance:
+                self.num_late_ticks += 1
+
+            tick()
+
+            self.record_tick(time.perf_counter() - start_time)
+
+            # Schedule the next one
+            next_tick_time += self.tick_period
+            now = time.perf_counter()
+
+            if now >= next_tick_time + self.tick_period:
+                # We're more than a tick behind, so skip the ticks we missed
+                num_missed_ticks = int((now - next_tick_time) / self.tick_period)
+
+                self.num_skipped_ticks += num_missed_ticks
+                next_tick_time += num_missed_ticks * self.tick_period
+
+            if next_tick_time > now:
+                time.sleep(next_tick_time - now)
+
+    """Records the duration of a tick
+
+    Attributes:
+        duration: How long the tick took, in seconds
+    """
+    def record_tick(self, duration):
+        self.num_ticks += 1
+        self.total_tick_time += duration
+        self.tick_durations.append(duration)
+
+        if duration > self.tick_period:
+            self.num_overruns += 1
+
+    """Returns the scheduler's statistics as a dictionary. Durations are in seconds"""
+    def get_stats(self):
+        percentiles = Percentiles.get_percentiles(self.tick_durations, [50, 90, 99, 100])
+
+        return {
+            "tick_rate": self.tick_rate,
+            "ticks": self.num_ticks,
+            "overruns": self.num_overruns,
+            "late_ticks": self.num_late_ticks,
+            "skipped_ticks": self.num_skipped_ticks,
+            "p50": percentiles[0],
+            "p90": percentiles[1],
+            "p99": percentiles[2],
+            "max": percentiles[3]
+        }
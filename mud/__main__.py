@@ -1,10 +1,30 @@
+import argparse
+
+from Config import Config
 from Game import Game
 
 
 def main():
+    # Read server settings from the command line
+    parser = argparse.ArgumentParser(description="Stuck in the MUD server")
+    parser.add_argument("--network-mode", choices=Config.NETWORK_MODES, default=Config.network_mode,
+                        help="threaded: two threads per client. asyncio: one event loop for all clients")
+    parser.add_argument("--bind-ip", default=Config.bind_ip, help="IP to listen on (default: primary network IP)")
+    parser.add_argument("--port", type=int, default=Config.game_port, help="TCP port to listen on")
+    parser.add_argument("--tick-rate", type=int, default=Config.tick_rate, help="game ticks per second")
+    parser.add_argument("--metrics-port", type=int, default=Config.metrics_port,
+                        help="HTTP port serving Prometheus metrics on localhost (0: off)")
+    args = parser.parse_args()
+
+    Config.network_mode = args.network_mode
+    Config.bind_ip = args.bind_ip
+    Config.game_port = args.port
+    Config.tick_rate = args.tick_rate
+    Config.metrics_port = args.metrics_port
+
     Game()  # Create the game
 
 
 # Call the main function!
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
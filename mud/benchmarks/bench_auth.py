@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Dungeon import Dungeon  # imported first, like Game does, to resolve the circular imports between modules
+from Client import Client
+from Database import Database
+from Config import Config
+
+"""
+Game tick duration while many clients log in at once, with the account checks on the game thread (0 workers, as before)
+and in the auth pool. Every client sends its login name and then its password hash, and ticks are run until all of them
+are in character selection.
+
+Usage, from the mud directory:
+    python benchmarks/bench_auth.py [--clients 500] [--accounts 100000] [--workers 0,2,4] [--json]
+"""
+
+
+"""Creates a database in the current directory with the given number of accounts"""
+def create_database(num_accounts):
+    connection = sqlite3.connect(Config.database_file)
+    Database.create_tables(connection)
+
+    with connection:
+        connection.executemany(Database.SQL_ADD_ACCOUNT, [("Account%d" % index, "hash%d" % index, b"salt")
+                                                          for index in range(num_accounts)])
+
+    connection.close()
+
+
+"""Logs the given number of clients in at once
+
+Returns: A dictionary with the number of ticks taken and tick durations in milliseconds"""
+def run_login_burst(dungeon, num_clients):
+    clients = [Client(dungeon, None, use_threads=False) for index in range(num_clients)]
+    dungeon.clients.extend(clients)
+
+    # The first tick sends the welcome message
+    dungeon.update()
+
+    for index, client in enumerate(clients):
+        client.input_queue.put("login Account%d" % index)
+
+    durations = []
+    while not all([client.state == Client.STATE_CHARACTER_CREATION for client in clients]):
+        # Send the password as soon as it is asked for
+        for index, client in enumerate(clients):
+            if client.state == Client.STATE_LOGGING_IN and client.input_queue.empty() and client.auth_task is None:
+                client.input_queue.put("hash%d" % index)
+
+        start_time = time.perf_counter()
+        dungeon.update()
+        durations.append(time.perf_counter() - start_time)
+
+        # Leave the workers some time, as the tick scheduler would
+        time.sleep(0.001)
+
+    for client in clients:
+        dungeon.clients.remove(client)
+
+    durations.sort()
+    return {
+        "ticks": len(durations),
+        "p50_ms": round(durations[len(durations) // 2] * 1000.0, 3),
+        "max_ms": round(durations[-1] * 1000.0, 3),
+        "total_ms": round(sum(durations) * 1000.0, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tick duration during a burst of logins")
+    parser.add_argument("--clients", type=int, default=500, help="clients logging in at once")
+    parser.add_argument("--accounts", type=int, default=100000, help="accounts in the database")
+    parser.add_argument("--workers", default="0,%d,4" % Config.auth_workers,
+                        help="comma-separated auth pool sizes to compare. The default includes Config.auth_workers")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    create_database(args.accounts)
+    Database.startup()
+
+    results = {}
+    for num_workers in [int(count) for count in args.workers.split(",")]:
+        Config.auth_workers = num_workers
+        dungeon = Dungeon()
+
+        results[num_workers] = run_login_burst(dungeon, args.clients)
+        dungeon.destroy()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for num_workers, result in results.items():
+            print("%d auth workers: %d ticks, tick p50 %.3f ms, max %.3f ms, %.1f ms of ticks in total" % (
+                num_workers, result["ticks"], result["p50_ms"], result["max_ms"], result["total_ms"]))
+
+
+if __name__ == "__main__":
+    main()
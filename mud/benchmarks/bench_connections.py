@@ -0,0 +1,183 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MUD_DIR)
+
+import Percentiles
+
+"""
+Connection count versus memory and tick latency, for each network mode.
+
+Each measurement runs a real server (on a copy of the databases) in a fresh process, connects the given number of idle
+clients to it and then times dungeon ticks. Usage, from the mud directory:
+    python benchmarks/bench_connections.py [--counts 50,100,200,400] [--ticks 50] [--json]
+"""
+
+# Seconds to wait for the dungeon to let every client in
+CONNECT_TIMEOUT = 60
+
+
+"""Returns the resident memory of this process in MB"""
+def resident_memory_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+
+    # Not Linux: fall back to the peak memory use
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+"""Runs one server with the given network mode and number of clients, and returns its measurements"""
+def measure(network_mode, num_clients, num_ticks):
+    # Run against a throwaway copy of the databases
+    work_dir = tempfile.mkdtemp()
+    for database_file in glob.glob(os.path.join(MUD_DIR, "*.db")):
+        shutil.copy(database_file, work_dir)
+    os.chdir(work_dir)
+
+    from Dungeon import Dungeon  # imported first, like Game does, to resolve the circular imports between modules
+    from Config import Config
+    from Database import Database
+    from Server import Server
+    from AsyncServer import AsyncServer
+
+    # Find a free port
+    port_finder = socket.socket()
+    port_finder.bind(("127.0.0.1", 0))
+    Config.game_port = port_finder.getsockname()[1]
+    port_finder.close()
+
+    Config.bind_ip = "127.0.0.1"
+    Config.network_mode = network_mode
+
+    # Every client connects from the same address, all at once
+    Config.max_connections = max(Config.max_connections, num_clients)
+    Config.max_connections_per_ip = Config.max_connections
+    Config.accept_rate = Config.accept_burst = max(Config.accept_burst, num_clients)
+
+    Database.startup()
+    dungeon = Dungeon()
+    dungeon.last_backup_time = time.localtime().tm_min  # don't let a backup land in the middle of the measurements
+
+    if network_mode == "asyncio":
+        AsyncServer(dungeon)
+    else:
+        Server(dungeon)
+
+    # Wait for the server to start listening
+    for attempt in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", Config.game_port)).close()
+            break
+        except socket.error:
+            time.sleep(0.1)
+
+    # Let the probe connection come and go
+    for tick in range(5):
+        dungeon.update()
+        time.sleep(0.1)
+
+    base_memory = resident_memory_mb()
+    base_threads = threading.active_count()
+
+    # Connect the clients and wait until the dungeon has them all
+    connections = [socket.create_connection(("127.0.0.1", Config.game_port)) for i in range(num_clients)]
+
+    deadline = time.perf_counter() + CONNECT_TIMEOUT
+
+    while len(dungeon.clients) < num_clients:
+        if time.perf_counter() > deadline:
+            sys.stderr.write("Only %d of %d clients were let in after %d seconds, measuring those\n" % (
+                len(dungeon.clients), num_clients, CONNECT_TIMEOUT))
+            break
+
+        dungeon.update()
+        time.sleep(0.1)
+
+    # Time some ticks, including how late the sleep between ticks wakes up
+    update_times = []
+    wake_delays = []
+
+    for tick in range(num_ticks):
+        start_time = time.perf_counter()
+        dungeon.update()
+        update_times.append((time.perf_counter() - start_time) * 1000.0)
+
+        sleep_start = time.perf_counter()
+        time.sleep(0.1)
+        wake_delays.append((time.perf_counter() - sleep_start - 0.1) * 1000.0)
+
+    result = {
+        "mode": network_mode,
+        "clients": num_clients,
+        "connected": len([client for client in dungeon.clients if client.is_connected]),
+        "threads": threading.active_count() - base_threads,
+        "memory_mb": round(resident_memory_mb() - base_memory, 2),
+        "tick_ms_mean": round(sum(update_times) / len(update_times), 3),
+        "tick_ms_p99": round(Percentiles.get_percentiles(update_times, [99])[0], 3),
+        "wake_delay_ms_mean": round(sum(wake_delays) / len(wake_delays), 3),
+        "wake_delay_ms_p99": round(Percentiles.get_percentiles(wake_delays, [99])[0], 3)
+    }
+
+    for connection in connections:
+        connection.close()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connection count versus memory and tick latency")
+    parser.add_argument("--counts", default="50,100,200,400", help="comma-separated client counts to measure")
+    parser.add_argument("--ticks", type=int, default=50, help="ticks to time per measurement")
+    parser.add_argument("--modes", default="threaded,asyncio", help="comma-separated network modes to measure")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "CLIENTS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: do a single measurement
+    if args.child is not None:
+        result = measure(args.child[0], int(args.child[1]), args.ticks)
+        sys.stdout.write("\nRESULT " + json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+        # Exit without tearing down the still-running server
+        os._exit(0)
+
+    # Parent process: run every measurement in its own process, so that leftover threads and memory don't leak across
+    results = []
+
+    for network_mode in args.modes.split(","):
+        for num_clients in [int(count) for count in args.counts.split(",")]:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--ticks", str(args.ticks),
+                                     "--child", network_mode, str(num_clients)],
+                                    stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+            result_line = [line for line in output.splitlines() if line.startswith("RESULT ")][0]
+            results.append(json.JSONDecoder().raw_decode(result_line[7:])[0])
+
+            if not args.json:
+                result = results[-1]
+                print("%-9s %5d clients: %4d threads, %7.2f MB, tick %7.3f ms (p99 %7.3f), wake delay %7.3f ms (p99 %7.3f)" % (
+                    result["mode"], result["clients"], result["threads"], result["memory_mb"], result["tick_ms_mean"],
+                    result["tick_ms_p99"], result["wake_delay_ms_mean"], result["wake_delay_ms_p99"]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Dungeon import Dungeon  # imported first, like Game does, to resolve the circular imports between modules
+from Database import Database
+from Config import Config
+
+"""
+Latency of the database operations the server does most: saving a player (one UPDATE and commit, as the persistence
+worker does) and looking up an account (as login does), comparing SQLite's default settings with the server's.
+
+    default: rollback journal, synchronous=FULL, no statement cache
+    server: the settings from Database.connect (WAL, synchronous=NORMAL, cached statements)
+
+Usage, from the mud directory:
+    python benchmarks/bench_database.py [--players 10000] [--number 2000] [--json]
+"""
+
+
+"""Opens a connection with SQLite's default settings and no statement cache"""
+def connect_default():
+    return sqlite3.connect(Config.database_file, cached_statements=0)
+
+
+"""Fills a new database with the given number of accounts and players"""
+def create_database(num_players):
+    connection = sqlite3.connect(Config.database_file)
+    Database.create_tables(connection)
+
+    with connection:
+        connection.executemany(Database.SQL_ADD_ACCOUNT, [("Account%d" % index, "hash", b"salt")
+                                                          for index in range(num_players)])
+        connection.executemany(Database.SQL_ADD_PLAYER, [("Account%d" % index, "Player%d" % index, "The Foyer", "[]")
+                                                         for index in range(num_players)])
+
+    connection.close()
+
+
+"""Times the operations on a connection
+
+Returns: A dictionary with the average time of each operation, in microseconds"""
+def time_operations(connection, num_players, number):
+    # Player saves, committed one at a time
+    start_time = time.perf_counter()
+    for index in range(number):
+        with connection:
+            connection.execute(Database.SQL_SAVE_PLAYER, ("The Library", "[]", "Player%d" % (index % num_players)))
+    save_time = time.perf_counter() - start_time
+
+    # Account lookups
+    start_time = time.perf_counter()
+    for index in range(number):
+        connection.execute(Database.SQL_GET_ACCOUNT, ("Account%d" % (index % num_players),)).fetchone()
+    lookup_time = time.perf_counter() - start_time
+
+    return {
+        "save_us": round(save_time / number * 1e6, 2),
+        "lookup_us": round(lookup_time / number * 1e6, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database save and lookup latency with default and server settings")
+    parser.add_argument("--players", type=int, default=10000, help="accounts and players in the database")
+    parser.add_argument("--number", type=int, default=2000, help="operations to time")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+
+    results = {}
+    for name, connect in [("default", connect_default), ("server", Database.connect)]:
+        # Start each from a fresh database
+        for file_name in os.listdir("."):
+            os.remove(file_name)
+
+        create_database(args.players)
+        connection = connect()
+        results[name] = time_operations(connection, args.players, args.number)
+        connection.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print("%-8s player save %8.2f us, account lookup %6.2f us" % (name, result["save_us"], result["lookup_us"]))
+
+
+if __name__ == "__main__":
+    main()
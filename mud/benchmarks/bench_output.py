@@ -0,0 +1,117 @@
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Dungeon import Dungeon  # imported first, like Game does, to resolve the circular imports between modules
+from Client import Client
+from Config import Config
+from OutputQueue import OutputQueue
+
+"""
+Output held for a client that has stopped reading while it sits in a busy room. The client's connection is a socket
+pair whose other end is never read. Every tick the client is sent a few broadcasts, which are the same every other tick
+(someone spamming the room), and every tenth tick a direct message.
+
+"unbounded" has limits too high to ever be reached, which is how the output queue used to behave; "bounded" uses the
+configured limits and policies, with a short grace period. Usage, from the mud directory:
+    python benchmarks/bench_output.py [--ticks 2000] [--broadcasts 20] [--grace 0.5] [--json]
+"""
+
+
+"""Runs a stuck client through the given number of ticks
+
+Returns: A dictionary with the output still held for the client at the end, what was dropped and collapsed, whether the
+         client was disconnected, and the time spent queueing output per tick"""
+def run(num_ticks, num_broadcasts, tick_time):
+    server_socket, client_socket = socket.socketpair()
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+    client = Client(None, server_socket)
+    queue_time = 0.0
+    disconnect_tick = None
+
+    for tick in range(num_ticks):
+        start_time = time.perf_counter()
+
+        for index in range(num_broadcasts):
+            client.output_text("<+player>Player%d<-player> says: <+speech>%s<-speech>" % (
+                index, "Hello!" if tick % 2 == 0 else "Message %d of tick %d" % (index, tick)),
+                OutputQueue.PRIORITY_LOW)
+
+        if tick % 10 == 0:
+            client.output_text("<+info>Something only for you, on tick %d<-info>" % tick)
+
+        client.flush_output()
+
+        queue_time += time.perf_counter() - start_time
+
+        if not client.is_connected and disconnect_tick is None:
+            disconnect_tick = tick
+
+        time.sleep(tick_time)
+
+    messages, size = client.output_queue.get_depth()
+    result = {
+        "queued_messages": messages,
+        "queued_characters": size,
+        "dropped": client.output_queue.num_dropped,
+        "collapsed": client.output_queue.num_collapsed,
+        "disconnected_on_tick": disconnect_tick,
+        "queue_us_per_tick": round(queue_time * 1e6 / num_ticks, 2)
+    }
+
+    client.disconnect()
+    server_socket.close()
+    client_socket.close()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Output held for a client that has stopped reading")
+    parser.add_argument("--ticks", type=int, default=2000, help="ticks to run")
+    parser.add_argument("--broadcasts", type=int, default=20, help="broadcasts the client gets each tick")
+    parser.add_argument("--tick-time", type=float, default=0.0005, help="seconds to sleep between ticks")
+    parser.add_argument("--grace", type=float, default=0.5, help="grace period for the bounded queue, in seconds")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    limits = Config.max_output_messages, Config.max_output_size
+
+    # The client's threads print what happens to it, which mustn't get mixed up with the results
+    with contextlib.redirect_stdout(sys.stderr):
+        # How the queue used to behave: never full
+        Config.max_output_messages = 1 << 62
+        Config.max_output_size = 1 << 62
+        results["unbounded"] = run(args.ticks, args.broadcasts, args.tick_time)
+
+        # The configured limits, without disconnecting
+        Config.max_output_messages, Config.max_output_size = limits
+        Config.output_policies = [OutputQueue.POLICY_COLLAPSE, OutputQueue.POLICY_DROP]
+        results["bounded"] = run(args.ticks, args.broadcasts, args.tick_time)
+
+        # ...and disconnecting after the grace period
+        Config.output_policies = OutputQueue.POLICIES
+        Config.output_grace_period = args.grace
+        results["bounded_disconnect"] = run(args.ticks, args.broadcasts, args.tick_time)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print("Stuck client over %d ticks with %d broadcasts each:" % (args.ticks, args.broadcasts))
+        for name, result in results.items():
+            print("  %-20s %6d messages %10d characters held, %6d dropped, %6d collapsed, disconnected on tick %s, "
+                  "%.2f us per tick" % (name, result["queued_messages"], result["queued_characters"], result["dropped"],
+                                        result["collapsed"], result["disconnected_on_tick"],
+                                        result["queue_us_per_tick"]))
+
+
+if __name__ == "__main__":
+    main()
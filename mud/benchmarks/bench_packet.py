@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Crypto.Random import get_random_bytes
+from Packet import Packet
+
+"""
+Bytes on the wire and pack/unpack time for each wire format and cipher, with typical server messages.
+
+Pack time covers encoding the message and encrypting it; unpack time covers decrypting and decoding it back into a
+message dictionary, as ClientApp does. Throughput is message bytes packed (or unpacked) per second on one core.
+Usage, from the mud directory:
+    python benchmarks/bench_packet.py [--number 2000] [--json]
+"""
+
+
+# Typical messages: (name, message type, payload)
+MESSAGES = [
+    ("say", Packet.MESSAGE_OUTPUT, "<+player>Engleborg Pastaslipper<-player> says: <+speech>Hello there!<-speech>"),
+    ("room", Packet.MESSAGE_OUTPUTS, [
+        "<i>You enter <+room>The Library<-room></i>",
+        "<+action><+player>Engleborg Pastaslipper<-player> entered the room.<-action><br>",
+        "<+room_title>The Library<-room_title>",
+        "<+room_info>This room appears to be some sort of ancient, physical website. It's filled with reliable "
+        "sources.<br><br>* There is a <+item>GreenRubberDuck<-item> on the floor... (<+command>squeak<-command>, "
+        "<+command>whisper<-command>, <+command>take<-command>)<br><-room_info><br>"]),
+    ("help", Packet.MESSAGE_OUTPUTS, ["<+command>%s:<-command> <i>Some helpful usage text for this command</i>" % name
+                                      for name in ["help", "look", "name", "say", "go", "sql", "inventory"]]),
+    ("salt", Packet.MESSAGE_SALT, b"$2b$12$abcdefghijklmnopqrstuu")
+]
+
+
+# Wire format and cipher combinations to compare
+VARIANTS = [
+    (Packet.FORMAT_JSON, Packet.CIPHER_CBC),
+    (Packet.FORMAT_BINARY, Packet.CIPHER_CBC),
+    (Packet.FORMAT_BINARY, Packet.CIPHER_GCM)
+]
+
+
+"""Packs a message in the given wire format and cipher, like Client.pack_output"""
+def pack(wire_format, cipher, message_type, payload, key):
+    data = Packet.encode_message(message_type, payload, wire_format)
+
+    if wire_format == Packet.FORMAT_BINARY:
+        return Packet.pack_binary(message_type, data, key, 1, 100, cipher)
+    else:
+        return Packet.pack(data, key, 1, 100)
+
+
+"""Unpacks a message in the given wire format, like ClientApp.process_message"""
+def unpack(wire_format, packet, key):
+    if wire_format == Packet.FORMAT_BINARY:
+        return Packet.decode_message(*Packet.unpack_binary(packet, key, 1, 100))
+    else:
+        return json.loads(Packet.unpack(packet, key, 1, 100).decode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wire format size and speed")
+    parser.add_argument("--number", type=int, default=2000, help="packs/unpacks to time per message")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    key = get_random_bytes(16)
+    results = []
+
+    for name, message_type, payload in MESSAGES:
+        message_size = len(Packet.encode_message(message_type, payload, Packet.FORMAT_BINARY))
+
+        for wire_format, cipher in VARIANTS:
+            packet = pack(wire_format, cipher, message_type, payload, key)
+            assert unpack(wire_format, packet, key)["type"] == Packet.message_type_names[message_type]
+
+            pack_time = timeit.timeit(lambda: pack(wire_format, cipher, message_type, payload, key), number=args.number)
+            unpack_time = timeit.timeit(lambda: unpack(wire_format, packet, key), number=args.number)
+
+            results.append({
+                "message": name,
+                "format": wire_format,
+                "cipher": cipher,
+                "bytes": len(packet),
+                "pack_us": round(pack_time / args.number * 1e6, 2),
+                "unpack_us": round(unpack_time / args.number * 1e6, 2),
+                "pack_mb_per_s": round(message_size * args.number / pack_time / 1e6, 2),
+                "unpack_mb_per_s": round(message_size * args.number / unpack_time / 1e6, 2)
+            })
+
+            if not args.json:
+                result = results[-1]
+                print("%-5s %-6s %-3s %5d bytes, pack %7.2f us (%6.2f MB/s), unpack %7.2f us (%6.2f MB/s)" % (
+                    result["message"], result["format"], result["cipher"], result["bytes"], result["pack_us"],
+                    result["pack_mb_per_s"], result["unpack_us"], result["unpack_mb_per_s"]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
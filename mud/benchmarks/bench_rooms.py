@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Dungeon import Dungeon  # imported first, like Game does, to resolve the circular imports between modules
+from Room import Room
+
+"""
+Cost of room-local operations (Room.broadcast and Room.on_player_look) as the server population grows.
+
+Players are spread evenly over the rooms, so the number of people in each room stays the same while the population
+grows. For comparison, "scan" times the old approach of filtering the whole player list by room. Usage, from the mud
+directory:
+    python benchmarks/bench_rooms.py [--players 1000,5000,20000] [--per-room 10] [--json]
+"""
+
+
+"""Stand-in for Player with just what rooms use"""
+class BenchPlayer:
+    def __init__(self, name, room):
+        self.name = name
+        self.room = room
+        self.num_outputs = 0
+
+    def output(self, string):
+        self.num_outputs += 1
+
+
+"""Stand-in for Dungeon with just what rooms use"""
+class BenchDungeon:
+    def __init__(self):
+        self.rooms = {}
+        self.players = []
+
+
+"""The old Room.broadcast: scans every player in the dungeon"""
+def scan_broadcast(room, text_to_broadcast, exclude_players=None):
+    for player in room.dungeon.players:
+        if player.room is room and (exclude_players is None or player not in exclude_players):
+            player.output(text_to_broadcast)
+
+
+"""Builds a dungeon with the given number of players, the given number to a room"""
+def build_dungeon(num_players, players_per_room):
+    dungeon = BenchDungeon()
+
+    for room_index in range(max(1, num_players // players_per_room)):
+        room = Room("Room %d" % room_index, "A room for benchmarking.", {})
+        room.dungeon = dungeon
+        dungeon.rooms[room.title] = room
+
+    rooms = list(dungeon.rooms.values())
+
+    for player_index in range(num_players):
+        player = BenchPlayer("Player%d" % player_index, rooms[player_index % len(rooms)])
+        player.room.add_player(player)
+        dungeon.players.append(player)
+
+    return dungeon
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Room broadcast and look cost versus server population")
+    parser.add_argument("--players", default="1000,5000,20000", help="comma-separated player counts")
+    parser.add_argument("--per-room", type=int, default=10, help="players in each room")
+    parser.add_argument("--number", type=int, default=2000, help="operations to time per measurement")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+
+    for num_players in [int(count) for count in args.players.split(",")]:
+        dungeon = build_dungeon(num_players, args.per_room)
+        room = dungeon.rooms["Room 0"]
+        player = room.players[0]
+
+        timings = {
+            "broadcast": timeit.timeit(lambda: room.broadcast("Hello!", [player]), number=args.number),
+            "look": timeit.timeit(lambda: room.on_player_look(player), number=args.number),
+            "scan_broadcast": timeit.timeit(lambda: scan_broadcast(room, "Hello!", [player]), number=args.number)
+        }
+
+        result = {"players": num_players, "rooms": len(dungeon.rooms)}
+        for name, total_time in timings.items():
+            result[name + "_us"] = round(total_time / args.number * 1e6, 2)
+        results.append(result)
+
+        if not args.json:
+            print("%6d players in %5d rooms: broadcast %8.2f us, look %8.2f us, old scan broadcast %8.2f us" % (
+                num_players, result["rooms"], result["broadcast_us"], result["look_us"], result["scan_broadcast_us"]))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
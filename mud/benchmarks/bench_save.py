@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Dungeon import Dungeon  # imported first, like Game does, to resolve the circular imports between modules
+from Database import Database
+from Config import Config
+
+"""
+Cost of the periodic dungeon backup (Dungeon.save) for a large world, using a database in a temporary directory.
+
+"idle" saves a world where nothing has changed, "some" a world where a few rooms have changed, and "all" a world where
+every room has changed, which is what every backup used to write. The game thread's cost (taking snapshots) is timed
+separately from the time until the persistence worker has written them. Usage, from the mud directory:
+    python benchmarks/bench_save.py [--rooms 10000] [--changed 10] [--json]
+"""
+
+
+"""Creates a database containing the given number of rooms in the current directory"""
+def create_database(num_rooms):
+    Database.connection = sqlite3.connect(Config.database_file)
+    Database.create_tables(Database.connection)
+
+    Database.connection.executemany("INSERT INTO rooms VALUES (?, ?, ?, ?)",
+                                    [("Room %d" % index, "A room for benchmarking.", "{}", "[]")
+                                     for index in range(num_rooms)])
+    Database.connection.commit()
+
+
+"""Times one save of the dungeon after the given number of rooms have changed
+
+Returns: A (time spent in Dungeon.save, time until everything was written) tuple, in seconds"""
+def time_save(dungeon, num_changed_rooms):
+    rooms = list(dungeon.rooms.values())
+
+    for room in rooms[:num_changed_rooms]:
+        room.mark_dirty()
+
+    start_time = time.perf_counter()
+    dungeon.save()
+    save_time = time.perf_counter() - start_time
+
+    dungeon.persistence.flush()
+
+    return save_time, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dungeon backup cost for a large world")
+    parser.add_argument("--rooms", type=int, default=10000, help="rooms in the world")
+    parser.add_argument("--changed", type=int, default=10, help="rooms changed for the 'some' measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="saves to time, the best is reported")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    create_database(args.rooms)
+    dungeon = Dungeon()
+
+    result = {"rooms": args.rooms}
+    for name, num_changed_rooms in [("idle", 0), ("some", args.changed), ("all", args.rooms)]:
+        times = [time_save(dungeon, num_changed_rooms) for repeat in range(args.repeat)]
+
+        result[name + "_save_ms"] = round(min([save_time for save_time, write_time in times]) * 1000.0, 3)
+        result[name + "_written_ms"] = round(min([write_time for save_time, write_time in times]) * 1000.0, 3)
+
+    dungeon.persistence.stop()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print("Saving %d rooms (game thread / until written):" % args.rooms)
+        for name, description in [("idle", "nothing changed"), ("some", "%d changed" % args.changed),
+                                  ("all", "all changed")]:
+            print("  %-16s %10.3f ms / %10.3f ms" % (description, result[name + "_save_ms"],
+                                                     result[name + "_written_ms"]))
+
+
+if __name__ == "__main__":
+    main()
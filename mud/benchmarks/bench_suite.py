@@ -0,0 +1,307 @@
+import argparse
+import contextlib
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+MUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MUD_DIR)
+
+from Dungeon import Dungeon  # imported first, like Game does, to resolve the circular imports between modules
+from Client import Client
+from Config import Config
+from Database import Database
+from Packet import Packet
+from Crypto.Random import get_random_bytes
+
+"""
+Micro-benchmarks of the server's hot paths, for catching performance regressions before deploying.
+
+Runs offline: the world is migrated from the repository's databases into a temporary world.db, and players are played
+by simulated clients with no connection. Every benchmark reports the best time per operation, in microseconds:
+* packet_*: packing and unpacking a typical room message in each wire format
+* client_output: a tick's worth of Client.output_text calls and the flush_output sending them
+* command_*: Player.process_input for player commands and item commands
+* room_look_N, room_broadcast_N: Room.on_player_look and Room.broadcast with N players in the room
+* tick_N: a whole Dungeon.update with N clients, each sending one command, and the senders taking the output
+
+--output saves the results as JSON, and --baseline compares them with saved results, failing (exit code 1) if any
+benchmark got slower by more than --tolerance. Usage, from the mud directory:
+    python benchmarks/bench_suite.py [--quick] [--output results.json] [--baseline results.json] [--tolerance 0.25]
+"""
+
+
+# A typical room message: (message type, payload)
+ROOM_MESSAGE = (Packet.MESSAGE_OUTPUTS, [
+    "<i>You enter <+room>The Library<-room></i>",
+    "<+action><+player>Engleborg Pastaslipper<-player> entered the room.<-action><br>",
+    "<+room_title>The Library<-room_title>",
+    "<+room_info>This room appears to be some sort of ancient, physical website. It's filled with reliable "
+    "sources.<br><br>* There is a <+item>GreenRubberDuck<-item> on the floor... (<+command>squeak<-command>, "
+    "<+command>whisper<-command>, <+command>take<-command>)<br><-room_info><br>"])
+
+
+"""Returns the best time per call of a function, in microseconds
+
+Attributes:
+    func: The function to time
+    number: Calls per timing
+    repeat: Timings to take, the best is reported
+    setup: Function called before each timing, if any
+"""
+def time_call(func, number, repeat, setup=None):
+    times = []
+
+    for index in range(repeat):
+        if setup is not None:
+            setup()
+
+        times.append(timeit.timeit(func, number=number))
+
+    return round(min(times) / number * 1e6, 3)
+
+
+"""Creates the world in a temporary directory and returns the dungeon"""
+def create_dungeon():
+    work_dir = tempfile.mkdtemp()
+    for database_file in glob.glob(os.path.join(MUD_DIR, "*.db")):
+        if os.path.basename(database_file) != Config.database_file:
+            shutil.copy(database_file, work_dir)
+    os.chdir(work_dir)
+
+    # Migrating the world prints a report, which mustn't get mixed up with the results
+    with contextlib.redirect_stdout(sys.stderr):
+        Database.startup()
+        dungeon = Dungeon()
+
+    # Keep the backup out of the timings
+    dungeon.last_backup_time = datetime.datetime.now().minute
+
+    return dungeon
+
+
+"""Adds a simulated client, already in the game, to the dungeon
+
+Returns: The client"""
+def add_client(dungeon, name, room):
+    client = Client(dungeon, None, use_threads=False)
+    client.account_name = name
+    client.character_name = name
+    client.state = Client.STATE_INGAME
+    client.player = dungeon.add_player(client)
+    dungeon.clients.append(client)
+
+    # Put the player in the room
+    client.player.room.remove_player(client.player)
+    client.player.room = room
+    room.add_player(client.player)
+
+    return client
+
+
+"""Sets the number of players in the dungeon's entry room, adding and removing simulated clients
+
+Returns: The clients"""
+def populate(dungeon, num_players):
+    room = dungeon.rooms[dungeon.entry_room]
+
+    while len(dungeon.clients) < num_players:
+        add_client(dungeon, "Bench%d" % len(dungeon.clients), room)
+
+    while len(dungeon.clients) > num_players:
+        client = dungeon.clients.pop()
+        dungeon.remove_player(client.player)
+
+    drain(dungeon)
+    return dungeon.clients
+
+
+"""Throws away everything output so far, as the network would take it"""
+def drain(dungeon):
+    for client in dungeon.clients:
+        client.pending_output = []
+        client.output_queue.get_all(False)
+
+
+"""Times packing and unpacking"""
+def bench_packets(results, number, repeat):
+    key = get_random_bytes(16)
+    message_type, payload = ROOM_MESSAGE
+
+    for wire_format, cipher in [(Packet.FORMAT_JSON, Packet.CIPHER_CBC), (Packet.FORMAT_BINARY, Packet.CIPHER_GCM)]:
+        name = "packet_%s_%s" % (wire_format, cipher)
+
+        if wire_format == Packet.FORMAT_BINARY:
+            pack = lambda: Packet.pack_binary(message_type, Packet.encode_message(message_type, payload, wire_format),
+                                              key, 1, 100, cipher)
+            unpack = lambda: Packet.decode_message(*Packet.unpack_binary(packet, key, 1, 100))
+        else:
+            pack = lambda: Packet.pack(Packet.encode_message(message_type, payload, wire_format), key, 1, 100)
+            unpack = lambda: json.loads(Packet.unpack(packet, key, 1, 100).decode("utf-8"))
+
+        packet = pack()
+        results[name + "_pack"] = time_call(pack, number, repeat)
+        results[name + "_unpack"] = time_call(unpack, number, repeat)
+
+
+"""Times a tick's worth of output to a client"""
+def bench_client_output(results, dungeon, number, repeat):
+    client = populate(dungeon, 1)[0]
+
+    def output_tick():
+        for text in ROOM_MESSAGE[1]:
+            client.output_text(text)
+
+        client.flush_output()
+
+    results["client_output"] = time_call(output_tick, number, repeat, lambda: drain(dungeon))
+
+
+"""Times player and item commands, with a few other players in the room"""
+def bench_commands(results, dungeon, number, repeat):
+    player = populate(dungeon, 10)[0].player
+    room = player.room
+    item_name = room.items[0].name if len(room.items) > 0 else None
+
+    commands = [
+        ("command_look", ["look"]),
+        ("command_say", ["say Hello there!"]),
+        ("command_help", ["help"]),
+        ("command_inventory", ["inventory"]),
+        ("command_alias", ["inv"]),
+        ("command_unknown", ["dance"])
+    ]
+
+    # Moving and items need a way back, so they're timed in pairs
+    directions = {"north": "south", "south": "north", "east": "west", "west": "east"}
+    for direction, room_name in room.connections.items():
+        if direction in directions and dungeon.rooms[room_name].connections.get(directions[direction]) == room.title:
+            commands.append(("command_go", ["go " + direction, "go " + directions[direction]]))
+            break
+
+    if item_name is not None:
+        commands.append(("item_take_drop", ["take " + item_name, "drop " + item_name]))
+        commands.append(("item_usage", [list(room.items[0].commands.keys())[0]]))
+
+    for name, inputs in commands:
+        def run_inputs():
+            for user_input in inputs:
+                player.process_input(user_input)
+
+        results[name] = round(time_call(run_inputs, number, repeat, lambda: drain(dungeon)) / len(inputs), 3)
+        drain(dungeon)
+
+
+"""Times looking and broadcasting in rooms of different sizes"""
+def bench_rooms(results, dungeon, populations, number, repeat):
+    for num_players in populations:
+        player = populate(dungeon, num_players)[0].player
+        room = player.room
+
+        results["room_look_%d" % num_players] = time_call(lambda: room.on_player_look(player), number, repeat,
+                                                          lambda: drain(dungeon))
+        results["room_broadcast_%d" % num_players] = time_call(
+            lambda: room.broadcast("<+player>Bench0<-player> says: <+speech>Hello there!<-speech>"), number, repeat,
+            lambda: drain(dungeon))
+
+
+"""Times whole ticks with every client sending a command"""
+def bench_ticks(results, dungeon, populations, number, repeat):
+    for num_clients in populations:
+        clients = populate(dungeon, num_clients)
+
+        def tick():
+            for index, client in enumerate(clients):
+                client.input_queue.put("look" if index % 2 == 0 else "say Hello there!")
+
+            dungeon.update()
+            drain(dungeon)
+
+        results["tick_%d" % num_clients] = time_call(tick, max(1, number // num_clients), repeat)
+
+
+"""Compares results with a baseline
+
+Returns: A list of (benchmark, baseline time, time) tuples for the benchmarks that got slower than the tolerance"""
+def find_regressions(results, baseline, tolerance):
+    return [(name, baseline[name], time) for name, time in sorted(results.items())
+            if name in baseline and time > baseline[name] * (1.0 + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the server's hot paths")
+    parser.add_argument("--number", type=int, default=1000, help="operations per timing")
+    parser.add_argument("--repeat", type=int, default=5, help="timings per benchmark, the best is reported")
+    parser.add_argument("--populations", default="1,10,100", help="comma-separated room and tick populations")
+    parser.add_argument("--quick", action="store_true", help="fewer operations, for a quick check")
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown allowed against the baseline (0.25 = 25%%)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.number, args.repeat = 100, 3
+
+    populations = [int(count) for count in args.populations.split(",")]
+
+    # The benchmarks run in a temporary directory
+    output_file_name = os.path.abspath(args.output) if args.output is not None else None
+    baseline_file_name = os.path.abspath(args.baseline) if args.baseline is not None else None
+
+    # Outputs are thrown away by drain, so the queues never fill up
+    Config.auth_workers = 0
+
+    dungeon = create_dungeon()
+    results = {}
+
+    bench_packets(results, args.number, args.repeat)
+    bench_client_output(results, dungeon, args.number, args.repeat)
+    bench_commands(results, dungeon, args.number, args.repeat)
+    bench_rooms(results, dungeon, populations, args.number, args.repeat)
+    bench_ticks(results, dungeon, populations, args.number, args.repeat)
+
+    populate(dungeon, 0)
+    dungeon.destroy()
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "us",
+        "results": results
+    }
+
+    if output_file_name is not None:
+        with open(output_file_name, "w") as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        for name, time in sorted(results.items()):
+            print("%-32s %12.3f us" % (name, time))
+
+    if baseline_file_name is not None:
+        with open(baseline_file_name) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+        regressions = find_regressions(results, baseline, args.tolerance)
+
+        for name, baseline_time, time in regressions:
+            print("REGRESSION %s: %.3f us -> %.3f us (%+.0f%%)" % (name, baseline_time, time,
+                                                               (time / baseline_time - 1.0) * 100.0))
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+        print("No regressions against %s (tolerance %.0f%%)" % (args.baseline, args.tolerance * 100.0))
+
+
+if __name__ == "__main__":
+    main()
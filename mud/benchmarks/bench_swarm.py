@@ -0,0 +1,341 @@
+import argparse
+import collections
+import glob
+import json
+import os
+import queue
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MUD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, MUD_DIR)
+
+from ClientProtocol import ClientProtocol
+import Percentiles
+
+"""
+Headless load test: a swarm of scripted bots playing through the real client protocol (ClientProtocol, which ClientApp
+uses too), including the security handshake, the bcrypt salt exchange, registering and character creation.
+
+Every bot registers a new account and creates a character, then until the time is up it walks between rooms, says
+things, looks around and takes and drops items, waiting for the server's reply to each command and then thinking for a
+moment. Reported are the commands per second, the round-trip latency from sending a command to its reply (which includes
+waiting for the next tick), and the failures: bots that couldn't connect or get into the game, commands with no reply,
+error replies (e.g. taking an item someone else just took) and disconnections.
+
+Without --port, a server is started in a child process on a copy of the databases. Usage, from the mud directory:
+    python benchmarks/bench_swarm.py [--bots 50] [--duration 30] [--think 0.2] [--host 127.0.0.1 --port 9123] [--json]
+"""
+
+
+"""
+A scripted player
+
+Attributes:
+    name: The bot's account and character name
+    timeout: Seconds to wait for each reply
+    latencies: The round-trip time of each command, in seconds
+    failures: Number of failures of each kind
+    room_items: Names of the items that can be taken in the bot's room, as of the last look
+    inventory: Names of the items the bot has taken
+    login_time: Seconds the bot took to get into the game, or None if it didn't
+    play_time: Seconds the bot spent playing
+"""
+class Bot(ClientProtocol):
+    PASSWORD = "swarm-password"
+
+    # Replies that mean a command failed
+    ERROR_MARKERS = ["<+error>", "Unknown command", "does not have the command"]
+
+    def __init__(self, name, timeout):
+        super().__init__()
+
+        self.name = name
+        self.timeout = timeout
+        self.latencies = []
+        self.failures = collections.Counter()
+        self.room_items = []
+        self.inventory = []
+        self.login_time = None
+        self.play_time = 0.0
+
+    """Waits for an output containing one of the given markers
+
+    Attributes:
+        markers: The strings to look for
+        is_done: Function returning True if the wait is over without such an output (e.g. the bot's state changed)
+    Returns: The output found, or None if there was none before the timeout or the connection ended"""
+    def wait_for(self, markers, is_done=lambda: False):
+        deadline = time.perf_counter() + self.timeout
+
+        while time.perf_counter() < deadline and self.is_connected and not is_done():
+            try:
+                text = self.output_queue.get(timeout=0.01)
+            except queue.Empty:
+                continue
+
+            self.read_output(text)
+
+            if any([marker in text for marker in markers]):
+                return text
+
+        return None
+
+    """Notes what the bot needs from an output: the items in its room"""
+    def read_output(self, text):
+        if "<+room_info>" in text:
+            self.room_items = [line.split("<+item>")[1].split("<-item>")[0] for line in text.split("<br>")
+                               if line.startswith("* ") and "<+item>" in line and "<+command>take<-command>" in line]
+
+    """Connects, registers and creates a character
+
+    Returns: Whether the bot got into the game"""
+    def join(self, host, port):
+        start_time = time.perf_counter()
+
+        try:
+            self.connect(host, port)
+        except socket.error:
+            self.failures["connect"] += 1
+            return False
+
+        # Wait for the welcome, after the security handshake
+        if self.wait_for(["<+command>register<-command>"]) is None:
+            return self.fail_join()
+
+        # Register: the server replies with the account's salt, then the password is hashed with it and sent
+        self.process_input("register " + self.name)
+        self.wait_for(["already exists"], lambda: self.state == ClientProtocol.STATE_AWAITING_PASSWORD)
+
+        if self.state != ClientProtocol.STATE_AWAITING_PASSWORD:
+            return self.fail_join()
+
+        self.process_input(Bot.PASSWORD)
+
+        if self.wait_for(["Registration complete"]) is None:
+            return self.fail_join()
+
+        # Create the character
+        self.process_input("create " + self.name)
+
+        if self.wait_for(["You awaken into this world"]) is None:
+            return self.fail_join()
+
+        self.login_time = time.perf_counter() - start_time
+        return True
+
+    """Counts a bot that couldn't get into the game
+
+    Returns: False"""
+    def fail_join(self):
+        self.failures["join"] += 1
+        return False
+
+    """Sends a command and waits for its reply, recording the round trip
+
+    Attributes:
+        text: The command
+        reply_markers: Strings, one of which the reply contains
+    Returns: The reply, or None if there wasn't one"""
+    def command(self, text, reply_markers):
+        # Catch up on everything that arrived while thinking
+        while not self.output_queue.empty():
+            self.read_output(self.output_queue.get(False))
+
+        start_time = time.perf_counter()
+        self.process_input(text)
+        reply = self.wait_for(reply_markers + Bot.ERROR_MARKERS)
+
+        if reply is None:
+            self.failures["disconnected" if not self.is_connected else "no_reply"] += 1
+            return None
+
+        self.latencies.append(time.perf_counter() - start_time)
+
+        if any([marker in reply for marker in Bot.ERROR_MARKERS]):
+            self.failures["error_reply"] += 1
+
+        return reply
+
+    """Plays for the given number of seconds, one random command after another"""
+    def play(self, duration, think_time):
+        start_time = time.perf_counter()
+        end_time = start_time + duration
+        num_says = 0
+
+        while time.perf_counter() < end_time and self.is_connected:
+            action = random.choice(["look", "look", "say", "say", "go", "go", "take", "drop"])
+
+            if action == "look":
+                self.command("look", ["<+room_info>"])
+            elif action == "say":
+                num_says += 1
+                self.command("say hello %d" % num_says, ["<+speech>hello %d<-speech>" % num_says])
+            elif action == "go":
+                self.command("go " + random.choice(["north", "east", "south", "west"]),
+                             ["You enter", "unable to go this way"])
+            elif action == "take" and len(self.room_items) > 0:
+                item = random.choice(self.room_items)
+
+                reply = self.command("take " + item, ["You take the"])
+
+                # Someone else may have taken it first
+                if reply is not None and "You take the" in reply:
+                    self.inventory.append(item)
+
+                if item in self.room_items:
+                    self.room_items.remove(item)
+            elif action == "drop" and len(self.inventory) > 0:
+                item = self.inventory.pop()
+                self.command("drop " + item, ["You aggressively drop"])
+
+            time.sleep(think_time * random.uniform(0.5, 1.5))
+
+        self.play_time = time.perf_counter() - start_time
+
+    """Runs the bot: joins the game, plays for the given number of seconds, and leaves"""
+    def run(self, host, port, duration, think_time):
+        if self.join(host, port):
+            self.play(duration, think_time)
+
+        if self.server_socket is not None:
+            try:
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+                self.server_socket.close()
+            except OSError:
+                pass
+
+        self.input_queue.put(None)
+
+
+"""Runs a server on a copy of the databases, for the swarm to play on. Never returns"""
+def run_server(port):
+    work_dir = tempfile.mkdtemp()
+    for database_file in glob.glob(os.path.join(MUD_DIR, "*.db")):
+        shutil.copy(database_file, work_dir)
+    os.chdir(work_dir)
+
+    from Config import Config
+    from Game import Game
+
+    Config.bind_ip = "127.0.0.1"
+    Config.game_port = port
+
+    # Every bot connects from the same address
+    Config.max_connections_per_ip = Config.max_connections
+
+    Game()
+
+
+"""Starts a server in a child process and waits for it to listen
+
+Returns: The server process and its port"""
+def start_server():
+    port_finder = socket.socket()
+    port_finder.bind(("127.0.0.1", 0))
+    port = port_finder.getsockname()[1]
+    port_finder.close()
+
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", str(port)],
+                              stdout=subprocess.DEVNULL)
+
+    for attempt in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except socket.error:
+            time.sleep(0.1)
+
+    return server, port
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless bot swarm load test")
+    parser.add_argument("--bots", type=int, default=50, help="bots to run at once")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to play for, after joining")
+    parser.add_argument("--think", type=float, default=0.2, help="average seconds each bot waits between commands")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for each reply")
+    parser.add_argument("--host", default="127.0.0.1", help="the server to play on")
+    parser.add_argument("--port", type=int, help="the server's port. If not given, a local server is started")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--child", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: run the server
+    if args.child is not None:
+        run_server(args.child)
+        return
+
+    server = None
+    port = args.port
+
+    if port is None:
+        server, port = start_server()
+
+    # Unique names, so that the swarm can be run against the same server again
+    run_id = "%x" % random.getrandbits(24)
+    bots = [Bot("Swarm%s_%d" % (run_id, index), args.timeout) for index in range(args.bots)]
+
+    threads = [threading.Thread(target=bot.run, args=(args.host, port, args.duration, args.think), daemon=True)
+               for bot in bots]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    if server is not None:
+        server.kill()
+
+    latencies = [latency for bot in bots for latency in bot.latencies]
+    login_times = [bot.login_time for bot in bots if bot.login_time is not None]
+    failures = collections.Counter()
+
+    for bot in bots:
+        failures.update(bot.failures)
+
+    # Milliseconds, or None if nothing was measured
+    join_ms = [round(duration * 1000.0, 1) for duration in Percentiles.get_percentiles(login_times, [50])] \
+        if len(login_times) > 0 else [None]
+    latency_ms = [round(duration * 1000.0, 1) for duration in Percentiles.get_percentiles(latencies, [50, 90, 99, 100])] \
+        if len(latencies) > 0 else [None, None, None, None]
+
+    result = {
+        "bots": args.bots,
+        "joined": len(login_times),
+        "commands": len(latencies),
+        "commands_per_second": round(sum([len(bot.latencies) / bot.play_time for bot in bots
+                                          if bot.play_time > 0]), 1),
+        "join_ms_p50": join_ms[0],
+        "latency_ms_p50": latency_ms[0],
+        "latency_ms_p90": latency_ms[1],
+        "latency_ms_p99": latency_ms[2],
+        "latency_ms_max": latency_ms[3],
+        "failures": dict(failures)
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print("%d of %d bots joined (p50 %s ms), %d commands: %.1f commands/s" % (
+            result["joined"], result["bots"], result["join_ms_p50"], result["commands"], result["commands_per_second"]))
+        print("Round trip: p50 %s ms, p90 %s ms, p99 %s ms, max %s ms" % (
+            result["latency_ms_p50"], result["latency_ms_p90"], result["latency_ms_p99"], result["latency_ms_max"]))
+        print("Failures: %s" % (", ".join(["%s %d" % failure for failure in sorted(failures.items())]) or "none"))
+
+    # A server that fails every command still lets the bots join, so say so rather than report a quiet server
+    if result["commands"] == 0:
+        print("WARNING: %d bots joined but no commands completed. Check the server's output for errors" %
+              result["joined"], file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()